@@ -0,0 +1,168 @@
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+# nome -> classe (ver register_analyzer)
+ANALYZER_REGISTRY = {}
+
+
+def register_analyzer(cls):
+    """
+    Decorador que registra um Analyzer pelo seu `name`. build_frame_processor
+    monta o grafo com os analyzers registrados (ou os de --analyzers), então
+    um analyzer novo só precisa ser registrado em um módulo importado
+    (ex: via --analyzer_plugins).
+    """
+    if not cls.name:
+        raise RuntimeError(f"Analyzer sem nome: {cls.__name__}")
+    ANALYZER_REGISTRY[cls.name] = cls
+    return cls
+
+
+def load_plugins(modules: list):
+    """Importa os módulos indicados (cada um registra seus analyzers ao ser importado)."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+class Analyzer:
+    """
+    Nó do grafo de análise por frame.
+
+      - name: identificador (chave da saída em FrameState.outputs)
+      - requires: analyzers cuja saída este usa; rodam antes, no mesmo frame
+      - inputs: representações do FrameFeatures lidas em run() (calculadas
+        antes de rodar o nível, para não serem criadas por duas threads)
+      - needs_frame(): cadência; True se o frame precisa ser decodificado
+        para este analyzer (modo só análise)
+      - due(): se run() roda neste frame
+      - run(): o trabalho pesado; pode rodar em uma thread do pool junto com
+        outros analyzers do mesmo nível, então só mexe no próprio estado
+      - apply(): efeitos colaterais (contexto, estado do FrameProcessor),
+        sempre na thread do loop e na ordem do grafo; chamado em todo frame
+        analisado, com output=None se run() não rodou
+
+    `from_args(processor, args)` cria a instância (None = desligado).
+    """
+
+    name = None
+    requires = ()
+    inputs = ()
+
+    @classmethod
+    def from_args(cls, processor, args):
+        return cls()
+
+    def needs_frame(self, processor, frame_idx: int) -> bool:
+        return False
+
+    def due(self, processor, state) -> bool:
+        return True
+
+    def run(self, processor, state):
+        return None
+
+    def apply(self, processor, state, output):
+        pass
+
+
+class FrameState:
+    """Dados de um frame compartilhados pelos analyzers durante analyze()."""
+
+    __slots__ = ("frame", "frame_idx", "time_sec", "record", "features", "outputs")
+
+    def __init__(self, frame, frame_idx: int, time_sec: float, record: bool, features):
+        self.frame = frame
+        self.frame_idx = frame_idx
+        self.time_sec = time_sec
+        self.record = record
+        self.features = features
+        self.outputs = {}
+
+
+class AnalyzerGraph:
+    """
+    Executa os analyzers de um frame em níveis (ordem topológica de
+    `requires`): os analyzers devidos de um mesmo nível rodam em paralelo
+    em um pool de `threads` threads (0 = em sequência) e, ao fim do nível,
+    os apply() rodam em ordem na thread do loop.
+    """
+
+    def __init__(self, analyzers: list, threads: int = 0):
+        self.analyzers = list(analyzers)
+        self.levels = self._levels(self.analyzers)
+        self.threads = threads
+        self._executor = None
+        self.runs = {a.name: 0 for a in self.analyzers}
+        self.parallel_levels = 0
+
+    def get(self, name: str):
+        for a in self.analyzers:
+            if a.name == name:
+                return a
+        return None
+
+    def needs_frame(self, processor, frame_idx: int) -> bool:
+        return any(a.needs_frame(processor, frame_idx) for a in self.analyzers)
+
+    def run(self, processor, state: FrameState):
+        for level in self.levels:
+            due = [a for a in level if a.due(processor, state)]
+            for a in due:
+                for attr in a.inputs:
+                    getattr(state.features, attr)
+
+            if len(due) > 1 and self.threads > 0:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.threads,
+                                                        thread_name_prefix="analyzer")
+                # o primeiro roda na própria thread do loop
+                futures = [self._executor.submit(a.run, processor, state) for a in due[1:]]
+                outputs = [due[0].run(processor, state)] + [f.result() for f in futures]
+                self.parallel_levels += 1
+            else:
+                outputs = [a.run(processor, state) for a in due]
+
+            for a, output in zip(due, outputs):
+                state.outputs[a.name] = output
+                self.runs[a.name] += 1
+            for a in level:
+                a.apply(processor, state, state.outputs.get(a.name))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "levels": [[a.name for a in level] for level in self.levels],
+            "threads": self.threads,
+            "runs": dict(self.runs),
+            "parallel_levels": self.parallel_levels,
+        }
+
+    @staticmethod
+    def _levels(analyzers: list) -> list:
+        by_name = {a.name: a for a in analyzers}
+        level_of = {}
+
+        def level(a, path=()):
+            if a.name in level_of:
+                return level_of[a.name]
+            if a.name in path:
+                raise RuntimeError(f"Dependência circular entre analyzers: {' -> '.join(path + (a.name,))}")
+            deps = []
+            for dep in a.requires:
+                if dep not in by_name:
+                    raise RuntimeError(f"Analyzer '{a.name}' depende de '{dep}', que não está no grafo")
+                deps.append(level(by_name[dep], path + (a.name,)))
+            level_of[a.name] = 1 + max(deps) if deps else 0
+            return level_of[a.name]
+
+        for a in analyzers:
+            level(a)
+        levels = [[] for _ in range(max(level_of.values()) + 1)] if level_of else []
+        for a in analyzers:  # ordem de registro dentro de cada nível
+            levels[level_of[a.name]].append(a)
+        return levels
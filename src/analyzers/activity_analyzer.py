@@ -1,6 +1,14 @@
 import cv2
 import numpy as np
 
+from labels import ACTIVITY_LABELS
+
+
+# limites do motion_score entre as categorias (still | talking | gesturing)
+STILL_MAX = 0.004
+TALKING_MAX = 0.015
+DIFF_THRESHOLD = 20
+
 
 class ActivityAnalyzer:
     """
@@ -9,12 +17,28 @@ class ActivityAnalyzer:
       - still: praticamente sem movimento
       - talking: movimento leve (ex: boca/cabeça)
       - gesturing: movimento moderado/alto (ex: mãos/braços)
+
+    analyze() trata um frame por vez; analyze_chunk() processa uma pilha de
+    frames já reduzidos de uma vez (mesmos resultados e mesmo estado final).
     """
 
+    LABELS = ACTIVITY_LABELS
+
     def __init__(self, resize_width: int = 320):
         self.resize_width = resize_width
         self.prev_gray = None
 
+        # arrays reaproveitados entre chamadas (mesmo tamanho a cada frame)
+        self._kernel = np.ones((3, 3), np.uint8)
+        self._diff = None
+        self._mask = None
+        self._opened = None
+        self._stack = None  # analyze_chunk
+
+    def preprocess(self, bgr_frame):
+        """Frame BGR -> cinza reduzido e borrado (a entrada de analyze_chunk)."""
+        return self._preprocess(bgr_frame)
+
     def _preprocess(self, bgr_frame):
         h, w = bgr_frame.shape[:2]
         if w > self.resize_width:
@@ -24,38 +48,110 @@ class ActivityAnalyzer:
         gray = cv2.GaussianBlur(gray, (5, 5), 0)
         return gray
 
-    def analyze(self, bgr_frame):
+    def analyze(self, bgr_frame, features=None):
         """
         Retorna (activity_label, motion_score)
         motion_score ~ percentual (0..1) de pixels "em movimento" no frame reduzido.
+
+        features (FrameFeatures, opcional) fornece o frame reduzido/borrado já
+        calculado, se tiver a mesma largura de redução.
         """
-        gray = self._preprocess(bgr_frame)
+        if features is not None and features.resize_width == self.resize_width:
+            gray = features.blurred_gray
+        else:
+            gray = self._preprocess(bgr_frame)
 
-        if self.prev_gray is None:
-            self.prev_gray = gray
+        # gray pode ser um buffer reaproveitado (FrameFeatures): o anterior é copiado
+        if self.prev_gray is None or self.prev_gray.shape != gray.shape:
+            self.prev_gray = gray.copy()
+            self._diff = np.empty_like(gray)
+            self._mask = np.empty_like(gray)
+            self._opened = np.empty_like(gray)
             return "still", 0.0
 
-        diff = cv2.absdiff(self.prev_gray, gray)
-        self.prev_gray = gray
+        diff = cv2.absdiff(self.prev_gray, gray, dst=self._diff)
+        np.copyto(self.prev_gray, gray)
 
         # threshold para movimento
-        _, thresh = cv2.threshold(diff, 20, 255, cv2.THRESH_BINARY)
+        _, thresh = cv2.threshold(diff, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY, dst=self._mask)
 
         # limpa ruído (morfologia)
-        kernel = np.ones((3, 3), np.uint8)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1)
-        thresh = cv2.dilate(thresh, kernel, iterations=1)
+        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, self._kernel, dst=self._opened, iterations=1)
+        thresh = cv2.dilate(thresh, self._kernel, dst=self._mask, iterations=1)
 
         motion_pixels = float(cv2.countNonZero(thresh))
         total_pixels = float(thresh.shape[0] * thresh.shape[1])
         motion_score = motion_pixels / total_pixels if total_pixels > 0 else 0.0
 
         # Heurística de categorias (ajustamos depois com base no vídeo)
-        if motion_score < 0.004:
+        if motion_score < STILL_MAX:
             label = "still"
-        elif motion_score < 0.015:
+        elif motion_score < TALKING_MAX:
             label = "talking"
         else:
             label = "gesturing"
 
         return label, float(motion_score)
+
+    def analyze_chunk(self, grays) -> tuple:
+        """
+        Processa N frames consecutivos de uma vez. `grays` é um array
+        (N, H, W) uint8 com os frames já reduzidos, em cinza e borrados (ver
+        preprocess()); o primeiro é comparado com o último frame visto antes
+        (prev_gray).
+
+        Retorna (labels, scores): array de rótulos (str) e array float64 de
+        motion_scores, iguais aos de N chamadas a analyze(), e deixa o
+        estado como elas deixariam. Usado offline por rescore.py.
+        """
+        grays = np.asarray(grays, dtype=np.uint8)
+        if grays.ndim != 3:
+            raise RuntimeError(f"analyze_chunk espera um array (N, H, W); recebeu {grays.shape}")
+        n, h, w = grays.shape
+        scores = np.zeros(n, dtype=np.float64)
+
+        first = 0
+        if n and (self.prev_gray is None or self.prev_gray.shape != (h, w)):
+            # como em analyze(): o primeiro frame só inicializa o histórico
+            first = 1
+            self.prev_gray = grays[0].copy()
+            self._diff = np.empty((h, w), np.uint8)
+            self._mask = np.empty((h, w), np.uint8)
+            self._opened = np.empty((h, w), np.uint8)
+
+        m = n - first
+        if m > 0:
+            # Os m diffs ficam empilhados em uma imagem alta (m * (h + 1), w),
+            # com uma linha separadora após cada frame, e cada etapa vira uma
+            # única chamada do OpenCV para o bloco inteiro. A linha separadora
+            # faz o papel da borda da imagem: 255 na erosão e 0 na dilatação,
+            # então a morfologia não mistura frames vizinhos.
+            if self._stack is None or self._stack.shape[0] < m or self._stack.shape[1:] != (h + 1, w):
+                self._stack = np.empty((m, h + 1, w), np.uint8)
+            stack = self._stack[:m]
+            tall = stack.reshape(m * (h + 1), w)
+            cur = np.ascontiguousarray(grays[first:]).reshape(m * h, w)
+            if first == 0:
+                prev = np.concatenate([self.prev_gray[None], grays[:-1]]).reshape(m * h, w)
+            else:
+                prev = np.ascontiguousarray(grays[:-1]).reshape(m * h, w)
+            diff = cv2.absdiff(prev, cur)
+            _, thresh = cv2.threshold(diff, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY, dst=diff)
+            stack[:, :h] = thresh.reshape(m, h, w)
+
+            # limpa ruído: abertura (erosão + dilatação) e dilatação
+            stack[:, h] = 255
+            cv2.erode(tall, self._kernel, dst=tall)
+            stack[:, h] = 0
+            cv2.dilate(tall, self._kernel, dst=tall)
+            stack[:, h] = 0
+            cv2.dilate(tall, self._kernel, dst=tall)
+
+            # pixels em movimento por frame: soma das linhas (0/255) de cada frame
+            rows = cv2.reduce(tall, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).reshape(m, h + 1)
+            motion = rows[:, :h].sum(axis=1) // 255
+            scores[first:] = motion / float(h * w)
+            np.copyto(self.prev_gray, grays[-1])
+
+        labels = np.array(self.LABELS)[np.digitize(scores, (STILL_MAX, TALKING_MAX))]
+        return labels, scores
@@ -1,3 +1,4 @@
+import math
 from collections import deque
 import numpy as np
 
@@ -8,26 +9,63 @@ class AnomalyDetector:
     Regra:
       - high_motion_anomaly: motion_score muito acima do padrão recente (z-score)
       - low_motion_anomaly: motion_score muito abaixo do padrão recente (opcional)
+
+    Média e variância da janela são mantidas incrementalmente (somas
+    deslocadas, O(1) por update); as somas são recalculadas a cada
+    `window_size` updates para não acumular erro de arredondamento.
+    update_batch() aplica a mesma regra a um array inteiro de uma vez.
     """
 
+    STD_FLOOR = 1e-9
+
     def __init__(self, window_size: int = 60, z_thresh: float = 3.0, enable_low: bool = True):
         self.window_size = window_size
         self.z_thresh = z_thresh
         self.enable_low = enable_low
         self.hist = deque(maxlen=window_size)
 
+        # somas de (x - shift) e (x - shift)^2 sobre a janela
+        self._shift = 0.0
+        self._s1 = 0.0
+        self._s2 = 0.0
+        self._since_resync = 0
+
+    @property
+    def min_history(self) -> int:
+        return max(15, self.window_size // 4)
+
     def update(self, motion_score: float):
-        self.hist.append(float(motion_score))
+        x = float(motion_score)
+
+        if not self.hist:
+            # até o primeiro _resync, o deslocamento é o primeiro valor (e não 0)
+            self._shift = x
+        if len(self.hist) == self.window_size:
+            old = self.hist[0] - self._shift
+            self._s1 -= old
+            self._s2 -= old * old
+
+        self.hist.append(x)
+        d = x - self._shift
+        self._s1 += d
+        self._s2 += d * d
+
+        self._since_resync += 1
+        if self._since_resync >= self.window_size:
+            self._resync()
 
         # precisa de histórico suficiente
-        if len(self.hist) < max(15, self.window_size // 4):
+        n = len(self.hist)
+        if n < self.min_history:
             return None  # sem decisão
 
-        arr = np.array(self.hist, dtype=float)
-        mean = float(arr.mean())
-        std = float(arr.std()) if float(arr.std()) > 1e-9 else 1e-9
+        m = self._s1 / n
+        mean = self._shift + m
+        var = max(0.0, self._s2 / n - m * m)
+        std = math.sqrt(var)
+        std = std if std > self.STD_FLOOR else self.STD_FLOOR
 
-        z = (motion_score - mean) / std
+        z = (x - mean) / std
 
         if z >= self.z_thresh:
             return {"type": "high_motion", "z": float(z), "mean": mean, "std": std}
@@ -36,3 +74,61 @@ class AnomalyDetector:
             return {"type": "low_motion", "z": float(z), "mean": mean, "std": std}
 
         return None
+
+    def update_batch(self, scores) -> dict:
+        """
+        Processa um array de motion_scores de uma vez (equivalente a chamar
+        update() para cada valor, em ordem) e avança o estado do detector.
+
+        Retorna arrays do mesmo tamanho de `scores`:
+          - z, mean, std: NaN onde ainda não há histórico suficiente
+          - flags: 1 = high_motion, -1 = low_motion, 0 = nenhuma anomalia
+
+        Útil para reavaliar uma série longa com outros window_size/z_thresh:
+            AnomalyDetector(window_size=90, z_thresh=2.5).update_batch(series)
+        """
+        x = np.asarray(scores, dtype=float).ravel()
+        prev = np.fromiter(self.hist, dtype=float, count=len(self.hist))
+        full = np.concatenate([prev, x])
+        p, m = len(prev), len(x)
+
+        shift = float(full.mean()) if len(full) else 0.0
+        c1 = np.concatenate([[0.0], np.cumsum(full - shift)])
+        c2 = np.concatenate([[0.0], np.cumsum((full - shift) ** 2)])
+
+        # janela de cada novo valor: full[start:end], com end exclusivo
+        end = np.arange(p + 1, p + m + 1)
+        start = np.maximum(0, end - self.window_size)
+        n = (end - start).astype(float)
+
+        mean_shifted = (c1[end] - c1[start]) / n
+        var = np.maximum((c2[end] - c2[start]) / n - mean_shifted ** 2, 0.0)
+        std = np.sqrt(var)
+        std = np.where(std > self.STD_FLOOR, std, self.STD_FLOOR)
+        mean = shift + mean_shifted
+        z = (x - mean) / std
+
+        valid = n >= self.min_history
+        flags = np.zeros(m, dtype=np.int8)
+        flags[valid & (z >= self.z_thresh)] = 1
+        if self.enable_low:
+            flags[valid & (z <= -self.z_thresh)] = -1
+
+        # estado final igual ao de updates sucessivos
+        self.hist.extend(x[-self.window_size:].tolist())
+        self._resync()
+
+        return {
+            "z": np.where(valid, z, np.nan),
+            "mean": np.where(valid, mean, np.nan),
+            "std": np.where(valid, std, np.nan),
+            "flags": flags,
+        }
+
+    def _resync(self):
+        # recalcula as somas com o deslocamento na média atual (estabilidade numérica)
+        n = len(self.hist)
+        self._shift = math.fsum(self.hist) / n if n else 0.0
+        self._s1 = math.fsum(v - self._shift for v in self.hist)
+        self._s2 = math.fsum((v - self._shift) ** 2 for v in self.hist)
+        self._since_resync = 0
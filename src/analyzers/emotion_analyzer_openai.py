@@ -1,77 +1,555 @@
 import os
+import re
 import json
+import time
 import base64
+import math
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 import cv2
+import numpy as np
+import openai
 from openai import OpenAI
 
+from labels import EMOTION_LABELS
+from timing import NULL_TIMER
+
 
 class EmotionAnalyzerOpenAI:
-    def __init__(self, model="gpt-4o-mini"):
+    """
+    Classifica a emoção de um recorte de face via OpenAI Vision.
+
+    Dois modos de uso:
+      - analyze(face): chamada síncrona, retorna (emotion, confidence)
+      - submit(face) + poll()/drain(): envio não bloqueante em um pool de
+        threads, com limite de requisições em andamento (max_in_flight).
+        Os resultados são devolvidos na ordem de envio. Com
+        async_batch > 1, os recortes são acumulados e enviados juntos em um
+        mosaico (como em analyze_batch) quando o lote enche ou quando o mais
+        antigo espera `batch_wait` segundos. pending_state()/
+        restore_pending() guardam e reenviam as requisições em andamento
+        (checkpoint).
+
+    Erros 429/5xx, timeouts e falhas de conexão são repetidos com backoff
+    exponencial (max_retries, backoff_base).
+
+    Com `cache` (EmotionCache), recortes quase idênticos a um já analisado
+    são respondidos localmente, sem chamada à API.
+
+    analyze_batch(faces) analisa vários recortes com poucas requisições: os
+    recortes são reduzidos a `tile_size` px e montados em mosaicos de até
+    `batch_tiles` tiles numerados, e o modelo responde um array JSON com um
+    rótulo por tile. Respostas malformadas caem para uma chamada por recorte.
+    """
+
+    EMOTIONS = EMOTION_LABELS
+
+    PROMPT = (
+        "Classifique a emoção facial predominante em UMA das categorias: "
+        "neutral, happy, surprise, sad, fear, disgust. "
+        "Responda apenas com JSON no formato: "
+        "{\"emotion\":\"<label>\",\"confidence\":0.0}"
+    )
+
+    BATCH_PROMPT = (
+        "A imagem é um mosaico de {n} rostos em {rows} linha(s) x {cols} coluna(s), "
+        "numerados de 0 a {last} da esquerda para a direita e de cima para baixo "
+        "(o número está no canto de cada tile). "
+        "Para cada tile, classifique a emoção facial predominante em UMA das categorias: "
+        "neutral, happy, surprise, sad, fear, disgust. "
+        "Responda apenas com um array JSON de {n} objetos, um por tile, no formato: "
+        "[{{\"tile\":0,\"emotion\":\"<label>\",\"confidence\":0.0}}, ...]"
+    )
+
+    def __init__(
+        self,
+        model="gpt-4o-mini",
+        base_url=None,
+        max_in_flight: int = 2,
+        timeout: float = 20.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        cache=None,
+        batch_tiles: int = 9,
+        tile_size: int = 96,
+        async_batch: int = 1,
+        batch_wait: float = 0.5,
+    ):
         self.model = model
+        self.cache = cache
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.batch_tiles = max(1, batch_tiles)
+        self.tile_size = tile_size
+        # lote do modo assíncrono: no máximo um mosaico
+        self.async_batch = max(1, min(async_batch, self.batch_tiles))
+        self.batch_wait = batch_wait
+
         api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key) if api_key else None
+        # os retries ficam a cargo deste módulo (backoff explícito)
+        self.client = (
+            OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+            if api_key
+            else None
+        )
 
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        # (Future, (JPEG em base64 ou recorte do lote, chave do cache)), para reenvio
+        self._pending = deque()
+        self._batch = []  # lote ainda não enviado: (Future, recorte, chave do cache)
+        self._batch_t0 = 0.0
+        self._lock = threading.Lock()
+
+        # latência de cada chamada à API (StageTimer; chamado das threads do pool)
+        self.timer = NULL_TIMER
+
+        # estatísticas do modo assíncrono
+        self.submitted = 0
+        self.dropped = 0
+        self.retries = 0
+
+        # estatísticas de volume (todos os modos)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.batch_requests = 0
+        self.batch_faces = 0
+        self.batch_fallbacks = 0
+
+    # ------------------------------------------------------------------
+    # modo síncrono
+    # ------------------------------------------------------------------
     def analyze(self, face_bgr):
+        if face_bgr is None or face_bgr.size == 0:
+            return None, None
+
+        key, cached = self._cache_lookup(face_bgr)
+        if cached is not None:
+            return cached
+
         if self.client is None:
             return None, None
 
-        if face_bgr is None or face_bgr.size == 0:
+        b64 = self._encode(face_bgr)
+        if b64 is None:
             return None, None
 
-        try:
-            ok, buf = cv2.imencode(".jpg", face_bgr)
-            if not ok:
-                return None, None
+        return self._analyze_and_cache(b64, key)
 
-            b64 = base64.b64encode(buf.tobytes()).decode("utf-8")
+    def analyze_batch(self, faces: list) -> list:
+        """
+        Analisa vários recortes; retorna [(emotion, confidence), ...] na
+        ordem de `faces` ((None, None) para recortes inválidos ou sem
+        resposta). Os que não estão no cache vão em mosaicos de até
+        `batch_tiles` tiles, uma requisição por mosaico; se a resposta de um
+        mosaico não for um array válido, seus recortes são reenviados um a um.
+        """
+        results = [(None, None)] * len(faces)
+        todo = []  # (índice, chave do cache)
+        for i, face in enumerate(faces):
+            if face is None or face.size == 0:
+                continue
+            key, cached = self._cache_lookup(face)
+            if cached is not None:
+                results[i] = cached
+            else:
+                todo.append((i, key))
 
-            prompt = (
-                "Classifique a emoção facial predominante em UMA das categorias: "
-                "neutral, happy, surprise, sad, fear, disgust. "
-                "Responda apenas com JSON no formato: "
-                "{\"emotion\":\"<label>\",\"confidence\":0.0}"
-            )
+        if self.client is None:
+            return results
 
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{b64}"
-                                },
-                            },
-                        ],
-                    }
-                ],
+        for start in range(0, len(todo), self.batch_tiles):
+            group = todo[start:start + self.batch_tiles]
+            labels = self._analyze_group([faces[i] for i, _ in group], [key for _, key in group])
+            for (i, _), result in zip(group, labels):
+                results[i] = result
+        return results
+
+    # ------------------------------------------------------------------
+    # modo assíncrono
+    # ------------------------------------------------------------------
+    def submit(self, face_bgr):
+        """
+        Envia o recorte para análise sem bloquear.
+        Retorna um Future de (emotion, confidence), ou None se o recorte for
+        inválido ou se o limite de requisições em andamento foi atingido
+        (nesse caso a amostra é descartada e contada em `dropped`). Com
+        async_batch > 1, o recorte entra no lote e só é descartado se o lote
+        já estiver cheio esperando um slot.
+        """
+        if face_bgr is None or face_bgr.size == 0:
+            return None
+
+        key, cached = self._cache_lookup(face_bgr)
+        if cached is not None:
+            return self._done(cached)
+
+        if self.client is None:
+            return None
+
+        if self.async_batch > 1:
+            # cópia: o frame original pode ser reutilizado pelo chamador
+            return self._enqueue(face_bgr.copy(), key)
+
+        if not self._slots.acquire(blocking=False):
+            self.dropped += 1
+            return None
+
+        # o JPEG é gerado aqui: o frame original pode ser reutilizado pelo chamador
+        b64 = self._encode(face_bgr)
+        if b64 is None:
+            self._slots.release()
+            return None
+        return self._start(b64, key)
+
+    def poll(self):
+        """
+        Retorna os resultados já concluídos [(emotion, confidence), ...],
+        na ordem de envio, sem bloquear. Envia o lote que passou do prazo.
+        """
+        if self._batch and time.monotonic() - self._batch_t0 >= self.batch_wait:
+            self._flush()
+        results = []
+        while self._pending and self._pending[0][0].done():
+            results.append(self._pending.popleft()[0].result())
+        return results
+
+    def drain(self, timeout=None):
+        """
+        Aguarda as requisições pendentes e retorna seus resultados
+        (mesmo formato de poll()).
+        """
+        self._flush(block=True)
+        if self._pending:
+            wait([future for future, _ in self._pending], timeout=timeout)
+        return self.poll()
+
+    def pending_state(self) -> list:
+        """
+        Requisições ainda não devolvidas por poll(), em ordem: o resultado,
+        se já chegou, ou o JPEG (base64) e a chave do cache para reenviar
+        (para recortes de lote, o próprio recorte no lugar do JPEG).
+        """
+        state = []
+        for future, request in self._pending:
+            if future.done():
+                state.append({"result": future.result()})
+            else:
+                state.append({"request": request})
+        return state
+
+    def restore_pending(self, state: list):
+        """Recoloca as requisições de pending_state() na fila, reenviando as que não terminaram."""
+        for entry in state:
+            if "result" in entry:
+                self._done(tuple(entry["result"]))
+            elif self.client is None:
+                self._done((None, None))
+            else:
+                payload, key = entry["request"]
+                if isinstance(payload, str):
+                    self._slots.acquire()
+                    self._start(payload, key)
+                else:
+                    self._enqueue(payload, key, block=True)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "pending": len(self._pending),
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "batch_requests": self.batch_requests,
+            "batch_faces": self.batch_faces,
+            "batch_fallbacks": self.batch_fallbacks,
+        }
+
+    # ------------------------------------------------------------------
+    # internos
+    # ------------------------------------------------------------------
+    def _done(self, result):
+        future = Future()
+        future.set_result(result)
+        self._pending.append((future, None))
+        return future
+
+    def _start(self, b64: str, key):
+        """Envia o JPEG em uma thread do pool (o slot de max_in_flight já foi reservado)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_in_flight, thread_name_prefix="emotion-openai"
             )
+        future = self._executor.submit(self._analyze_and_cache, b64, key)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append((future, (b64, key)))
+        self.submitted += 1
+        return future
 
-            text = (resp.choices[0].message.content or "").strip()
+    def _enqueue(self, crop, key, block: bool = False):
+        """Coloca o recorte no lote; envia o lote quando ele enche."""
+        if len(self._batch) >= self.async_batch:
+            # lote cheio de uma chamada anterior que não achou slot livre
+            self._flush(block=block)
+            if len(self._batch) >= self.async_batch:
+                self.dropped += 1
+                return None
+        future = Future()
+        if not self._batch:
+            self._batch_t0 = time.monotonic()
+        self._batch.append((future, crop, key))
+        self._pending.append((future, (crop, key)))
+        if len(self._batch) >= self.async_batch:
+            self._flush(block=block)
+        return future
 
-            if not text:
-                return None, None
+    def _flush(self, block: bool = False):
+        """Envia o lote acumulado em uma requisição (mosaico), se houver slot livre."""
+        if not self._batch or not self._slots.acquire(blocking=block):
+            return
+        batch, self._batch = self._batch, []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_in_flight, thread_name_prefix="emotion-openai"
+            )
+        task = self._executor.submit(
+            self._analyze_group, [crop for _, crop, _ in batch], [key for _, _, key in batch]
+        )
 
-            # Tenta JSON puro primeiro
+        def finish(task):
+            self._slots.release()
             try:
-                data = json.loads(text)
-            except Exception:
-                # Fallback: extrai o primeiro objeto JSON {...} encontrado no texto
-                import re
-                m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-                if not m:
-                    print("[WARN] OpenAI returned non-JSON:", text[:200])
-                    return None, None
-                data = json.loads(m.group(0))
+                labels = task.result()
+            except Exception as e:
+                print("[ERROR] EmotionAnalyzerOpenAI:", e)
+                labels = [(None, None)] * len(batch)
+            for (future, _, _), result in zip(batch, labels):
+                future.set_result(result)
+
+        task.add_done_callback(finish)
+        self.submitted += len(batch)
+
+    def _cache_lookup(self, face_bgr):
+        if self.cache is None:
+            return None, None
+        return self.cache.lookup(face_bgr)
+
+    def _analyze_and_cache(self, b64: str, key):
+        emotion, conf = self._analyze_b64(b64)
+        if emotion and key is not None:
+            self.cache.put(key, emotion, conf)
+        return emotion, conf
+
+    @staticmethod
+    def _encode(face_bgr):
+        ok, buf = cv2.imencode(".jpg", face_bgr)
+        if not ok:
+            return None
+        return base64.b64encode(buf.tobytes()).decode("utf-8")
+
+    @staticmethod
+    def _is_retryable(e: Exception) -> bool:
+        if isinstance(e, openai.APIConnectionError):  # inclui APITimeoutError
+            return True
+        if isinstance(e, openai.APIStatusError):
+            return e.status_code == 429 or e.status_code >= 500
+        return False
 
-            emotion = data.get("emotion")
-            conf = data.get("confidence")
-            return emotion, conf
+    def _create(self, b64: str, prompt: str):
+        return self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{b64}"
+                            },
+                        },
+                    ],
+                }
+            ],
+            timeout=self.timeout,
+        )
+
+    def _request(self, b64: str, prompt: str):
+        """Uma requisição (com retries); retorna o texto da resposta ou None."""
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(b64) + len(prompt)
 
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                resp = self._create(b64, prompt)
+                self.timer.record("openai_request", time.perf_counter() - t0)
+                break
+            except Exception as e:
+                self.timer.record("openai_request", time.perf_counter() - t0)
+                if attempt < self.max_retries and self._is_retryable(e):
+                    delay = self.backoff_base * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, self.backoff_base))
+                    attempt += 1
+                    with self._lock:
+                        self.retries += 1
+                    continue
+                print("[ERROR] EmotionAnalyzerOpenAI:", e)
+                return None
+
+        try:
+            return (resp.choices[0].message.content or "").strip()
+        except Exception as e:
+            print("[ERROR] EmotionAnalyzerOpenAI:", e)
+            return None
 
+    def _analyze_b64(self, b64: str):
+        text = self._request(b64, self.PROMPT)
+        if text is None:
+            return None, None
+        try:
+            return self._parse(text)
         except Exception as e:
             print("[ERROR] EmotionAnalyzerOpenAI:", e)
             return None, None
+
+    def _analyze_group(self, crops: list, keys: list) -> list:
+        """Um recorte vai em uma requisição simples; vários, em um mosaico. Guarda as respostas no cache."""
+        if len(crops) == 1:
+            b64 = self._encode(crops[0])
+            labels = [self._analyze_b64(b64)] if b64 is not None else [(None, None)]
+        else:
+            labels = self._analyze_mosaic(crops)
+        for key, (emotion, conf) in zip(keys, labels):
+            if emotion and key is not None:
+                self.cache.put(key, emotion, conf)
+        return labels
+
+    def _analyze_mosaic(self, crops: list) -> list:
+        mosaic, rows, cols = self._mosaic(crops)
+        b64 = self._encode(mosaic)
+        n = len(crops)
+        with self._lock:
+            self.batch_requests += 1
+            self.batch_faces += n
+        if b64 is None:
+            return [(None, None)] * n
+
+        prompt = self.BATCH_PROMPT.format(n=n, rows=rows, cols=cols, last=n - 1)
+        text = self._request(b64, prompt)
+        if text is None:
+            # falha da requisição (já com retries): não adianta repetir por recorte
+            return [(None, None)] * n
+
+        labels = self._parse_batch(text, n, self.EMOTIONS)
+        if labels is not None:
+            return labels
+
+        print("[WARN] Resposta inválida para o mosaico de emoções; analisando recorte a recorte:", text[:200])
+        with self._lock:
+            self.batch_fallbacks += 1
+        results = []
+        for crop in crops:
+            b64 = self._encode(crop)
+            results.append(self._analyze_b64(b64) if b64 is not None else (None, None))
+        return results
+
+    def _mosaic(self, crops: list):
+        """Tiles de tile_size x tile_size em grade quase quadrada, com o índice no canto."""
+        n = len(crops)
+        cols = int(math.ceil(math.sqrt(n)))
+        rows = int(math.ceil(n / float(cols)))
+        t = self.tile_size
+        mosaic = np.zeros((rows * t, cols * t, 3), dtype=np.uint8)
+        for k, crop in enumerate(crops):
+            r, c = divmod(k, cols)
+            tile = mosaic[r * t:(r + 1) * t, c * t:(c + 1) * t]
+            cv2.resize(crop, (t, t), dst=tile, interpolation=cv2.INTER_AREA)
+            cv2.putText(tile, str(k), (3, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(tile, str(k), (3, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+        return mosaic, rows, cols
+
+    @staticmethod
+    def _parse(text: str):
+        if not text:
+            return None, None
+
+        # Tenta JSON puro primeiro
+        try:
+            data = json.loads(text)
+        except Exception:
+            # Fallback: extrai o primeiro objeto JSON {...} encontrado no texto
+            m = re.search(r"\{.*\}", text, flags=re.DOTALL)
+            if not m:
+                print("[WARN] OpenAI returned non-JSON:", text[:200])
+                return None, None
+            data = json.loads(m.group(0))
+
+        emotion = data.get("emotion")
+        conf = data.get("confidence")
+        return emotion, conf
+
+    @staticmethod
+    def _parse_batch(text: str, n: int, emotions=None):
+        """
+        Array JSON de n itens {tile, emotion, confidence} -> [(emotion, conf)]
+        na ordem dos tiles, ou None se a resposta não for válida: não é um
+        array, tamanho diferente de n, tiles repetidos/fora do intervalo ou
+        rótulo fora de `emotions`. Sem "tile", vale a posição no array.
+        """
+        if not text:
+            return None
+        try:
+            data = json.loads(text)
+        except Exception:
+            # ex: array dentro de um bloco ```json ... ``` ou com texto em volta
+            m = re.search(r"\[.*\]", text, flags=re.DOTALL)
+            if not m:
+                return None
+            try:
+                data = json.loads(m.group(0))
+            except Exception:
+                return None
+
+        if isinstance(data, dict):
+            # {"tiles": [...]} ou similar: aceita o único array do objeto
+            arrays = [v for v in data.values() if isinstance(v, list)]
+            data = arrays[0] if len(arrays) == 1 else None
+        if not isinstance(data, list) or len(data) != n:
+            return None
+
+        results = [None] * n
+        for pos, item in enumerate(data):
+            if not isinstance(item, dict):
+                return None
+            tile = item.get("tile", pos)
+            if isinstance(tile, str) and tile.strip().isdigit():
+                tile = int(tile)
+            if not isinstance(tile, int) or isinstance(tile, bool) or not 0 <= tile < n or results[tile] is not None:
+                return None
+            emotion = item.get("emotion")
+            if not isinstance(emotion, str):
+                return None
+            emotion = emotion.strip().lower()
+            if emotions is not None and emotion not in emotions:
+                return None
+            conf = item.get("confidence")
+            try:
+                conf = min(1.0, max(0.0, float(conf))) if conf is not None else None
+            except (TypeError, ValueError):
+                conf = None
+            results[tile] = (emotion, conf)
+        return results
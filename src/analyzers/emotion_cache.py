@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import cv2
+import numpy as np
+
+
+class EmotionCache:
+    """
+    Cache de emoções indexado pelo hash perceptual (pHash) do recorte da face.
+
+    Recortes quase idênticos (mesma pessoa parada) geram hashes próximos;
+    um hash é considerado igual a uma entrada existente se a distância de
+    Hamming for <= max_distance.
+
+    Evicção LRU por quantidade de entradas (max_entries) e por tamanho
+    estimado em bytes (max_bytes). O tamanho de uma entrada é o
+    sys.getsizeof da chave, da tupla, do rótulo e da confiança mais o custo
+    do OrderedDict por entrada; rótulos iguais podem ser o mesmo objeto, então
+    a estimativa fica um pouco acima do uso real. Com `path`, as entradas são
+    carregadas do disco na criação e gravadas em save().
+
+    Para checkpoints frequentes, start_journal() passa a registrar só as
+    mudanças (acertos, que mexem na ordem LRU, e put); journal() devolve as
+    mudanças desde a chamada anterior e replay() as reaplica na retomada.
+    """
+
+    # slot do dict + nó da lista do OrderedDict, por entrada (tracemalloc, CPython 3.11)
+    _NODE_OVERHEAD = 80
+
+    def __init__(
+        self,
+        max_distance: int = 6,
+        max_entries: int = 1024,
+        max_bytes: int = 256 * 1024,
+        path=None,
+        hash_size: int = 8,
+    ):
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.path = path
+        self.hash_size = hash_size
+
+        self._entries = OrderedDict()  # hash -> (emotion, confidence)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._journal = None  # mudanças desde o último journal(); None = sem registro
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path and Path(path).exists():
+            self._load(path)
+
+    # ------------------------------------------------------------------
+    # hash
+    # ------------------------------------------------------------------
+    def phash(self, face_bgr) -> int:
+        """
+        Hash perceptual (DCT) do recorte normalizado: escala de cinza,
+        32x32 e histograma equalizado (reduz efeito de iluminação).
+        """
+        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
+        side = self.hash_size * 4
+        gray = cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(gray)
+
+        dct = cv2.dct(np.float32(gray))
+        low = dct[: self.hash_size, : self.hash_size].flatten()
+        median = np.median(low[1:])  # ignora o componente DC
+
+        bits = low > median
+        value = 0
+        for b in bits:
+            value = (value << 1) | int(b)
+        return value
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def lookup(self, face_bgr):
+        """
+        Retorna (key, result). result é (emotion, confidence) em caso de
+        acerto ou None; key deve ser repassada a put() após a análise.
+        """
+        key = self.phash(face_bgr)
+
+        with self._lock:
+            best = None
+            if key in self._entries:
+                best = key
+            else:
+                best_dist = self.max_distance + 1
+                for k in self._entries:
+                    dist = (k ^ key).bit_count()
+                    if dist < best_dist:
+                        best, best_dist = k, dist
+
+            if best is None:
+                self.misses += 1
+                return key, None
+
+            self._entries.move_to_end(best)
+            self.hits += 1
+            if self._journal is not None:
+                self._journal.append(("hit", best))
+            return key, self._entries[best]
+
+    def put(self, key: int, emotion, confidence) -> None:
+        if not emotion:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entry_bytes(key, self._entries.pop(key))
+
+            value = (emotion, confidence)
+            self._entries[key] = value
+            if self._journal is not None:
+                self._journal.append(("put", key, emotion, confidence))
+            self._bytes += self._entry_bytes(key, value)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(old_key, old)
+                self.evictions += 1
+
+    def entries(self) -> list:
+        """Entradas atuais [(key, emotion, confidence), ...] em ordem LRU."""
+        with self._lock:
+            return [(k, emotion, conf) for k, (emotion, conf) in self._entries.items()]
+
+    def start_journal(self) -> None:
+        with self._lock:
+            self._journal = []
+
+    def journal(self) -> list:
+        """Mudanças desde a chamada anterior (ou start_journal()), em ordem."""
+        with self._lock:
+            if self._journal is None:
+                return []
+            ops, self._journal = self._journal, []
+        return ops
+
+    def replay(self, ops) -> None:
+        """
+        Reaplica mudanças de journal() (retomada de um checkpoint): o cache
+        volta ao mesmo conteúdo e ordem LRU; as estatísticas não mudam.
+        """
+        with self._lock:
+            journal, self._journal = self._journal, None
+        evictions = self.evictions
+        for op in ops:
+            if op[0] == "hit":
+                with self._lock:
+                    if op[1] in self._entries:
+                        self._entries.move_to_end(op[1])
+            else:
+                self.put(*op[1:])
+        self.evictions = evictions
+        with self._lock:
+            self._journal = journal
+
+    def save(self, path=None) -> None:
+        path = path or self.path
+        if not path:
+            return
+
+        with self._lock:
+            payload = {
+                "hash_size": self.hash_size,
+                # ordem LRU preservada (mais antigo primeiro)
+                "entries": [
+                    [format(k, "x"), emotion, conf]
+                    for k, (emotion, conf) in self._entries.items()
+                ],
+            }
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    # ------------------------------------------------------------------
+    # internos
+    # ------------------------------------------------------------------
+    def _entry_bytes(self, key, value) -> int:
+        emotion, conf = value
+        return (self._NODE_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(value)
+                + sys.getsizeof(emotion) + sys.getsizeof(conf))
+
+    def _load(self, path) -> None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception as e:
+            print("[WARN] EmotionCache: falha ao ler cache em disco:", e)
+            return
+
+        if payload.get("hash_size") != self.hash_size:
+            print("[WARN] EmotionCache: hash_size diferente, cache em disco ignorado")
+            return
+
+        for key_hex, emotion, conf in payload.get("entries", []):
+            self.put(int(key_hex, 16), emotion, conf)
+        # carregar não conta como evicção de uso
+        self.evictions = 0
@@ -0,0 +1,220 @@
+import argparse
+import glob
+import json
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from options import add_analysis_args
+
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+
+# FaceDetector carregado uma vez por processo (ver _init_worker)
+_FACE_DETECTOR = None
+
+
+def find_videos(source: str) -> list:
+    """Lista os vídeos de um diretório (recursivo) ou de um padrão glob, em ordem."""
+    path = Path(source)
+    if path.is_dir():
+        candidates = [p for p in path.rglob("*") if p.is_file()]
+    else:
+        candidates = [Path(p) for p in glob.glob(source, recursive=True)]
+    return sorted(str(p) for p in candidates if p.suffix.lower() in VIDEO_EXTENSIONS)
+
+
+def plan_jobs(videos: list, out_dir: str, args) -> list:
+    """
+    Um job por vídeo, com saídas em out_dir/<nome>/. Nomes repetidos
+    (mesmo arquivo em pastas diferentes) recebem sufixo _2, _3, ...
+    """
+    jobs = []
+    used = {}
+    for video in videos:
+        stem = Path(video).stem
+        used[stem] = used.get(stem, 0) + 1
+        name = stem if used[stem] == 1 else f"{stem}_{used[stem]}"
+        job_dir = Path(out_dir) / name
+
+        job_args = argparse.Namespace(**vars(args))
+        job_args.video = video
+        job_args.out_video = str(job_dir / "annotated.mp4")
+        job_args.out_report = str(job_dir / "report.json")
+        job_args.frame_results = str(job_dir / "frames.jsonl") if args.frame_results else None
+        job_args.events = str(job_dir / "events.jsonl")
+        job_args.timeline = str(job_dir / "timeline.json")
+        if args.prometheus_textfile:
+            # um textfile por vídeo (o collector lê todos os .prom do diretório)
+            job_args.prometheus_textfile = str(Path(args.prometheus_textfile).parent / f"{name}.prom")
+
+        jobs.append({"name": name, "video": video, "args": job_args})
+    return jobs
+
+
+class BatchManifest:
+    """
+    Estado do batch em JSON ({vídeo: entrada}), regravado de forma atômica
+    (arquivo temporário + os.replace) a cada vídeo concluído, então uma
+    execução interrompida retoma a partir dos vídeos ainda não concluídos.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.videos = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.videos = json.load(f).get("videos", {})
+
+    def is_done(self, video: str) -> bool:
+        entry = self.videos.get(video)
+        return bool(entry) and entry.get("status") == "done" and Path(entry["report"]).exists()
+
+    def record(self, video: str, entry: dict):
+        self.videos[video] = {**entry, "updated_at": datetime.utcnow().isoformat() + "Z"}
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"videos": self.videos}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _init_worker():
+    # imports tardios (aqui e em _run_job): o processo principal só monta os jobs
+    # e não carrega o MediaPipe nem o pipeline de análise (main)
+    global _FACE_DETECTOR
+    from detectors.face_detector import FaceDetector
+    _FACE_DETECTOR = FaceDetector(min_detection_confidence=0.4, model_selection=1)
+
+
+def _run_job(job: dict) -> dict:
+    from main import analyze_video
+
+    args = job["args"]
+    t0 = time.perf_counter()
+    report = analyze_video(args, face_detector=_FACE_DETECTOR)
+    elapsed = time.perf_counter() - t0
+
+    frames = report["total_frames_analyzed"]
+    duration = report["summary"]["duration_sec"] or 0.0
+    return {
+        "status": "done",
+        "name": job["name"],
+        "report": args.out_report,
+        "output_video": report["output_video"],
+        "frames": frames,
+        "video_duration_sec": duration,
+        "elapsed_sec": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "realtime_factor": duration / elapsed if elapsed > 0 else 0.0,
+        "worker_pid": os.getpid(),
+    }
+
+
+def build_batch_summary(manifest: BatchManifest, videos: list, wall_sec: float, run_frames: int) -> dict:
+    """Throughput por vídeo e agregado (vídeos desta lista, incluindo os de execuções anteriores)."""
+    per_video = []
+    for video in videos:
+        entry = manifest.videos.get(video)
+        if entry is None:
+            continue
+        per_video.append({"video": video, **{k: v for k, v in entry.items() if k != "updated_at"}})
+
+    done = [v for v in per_video if v["status"] == "done"]
+    frames = sum(v["frames"] for v in done)
+    busy = sum(v["elapsed_sec"] for v in done)
+    duration = sum(v["video_duration_sec"] for v in done)
+
+    return {
+        "videos": per_video,
+        "aggregate": {
+            "videos_total": len(videos),
+            "videos_done": len(done),
+            "videos_failed": sum(1 for v in per_video if v["status"] == "failed"),
+            "frames_total": frames,
+            "video_duration_sec": duration,
+            "worker_busy_sec": busy,
+            "fps_per_worker": frames / busy if busy > 0 else 0.0,
+            # vazão desta execução (tempo de parede, todos os workers)
+            "run_wall_sec": wall_sec,
+            "run_frames": run_frames,
+            "run_fps": run_frames / wall_sec if wall_sec > 0 else 0.0,
+        },
+    }
+
+
+def run_batch(args) -> dict:
+    videos = find_videos(args.input)
+    if not videos:
+        raise RuntimeError(f"Nenhum vídeo encontrado em: {args.input}")
+    if args.workers > 1:
+        raise RuntimeError("batch.py paraleliza por vídeo (--jobs); não use --workers")
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = BatchManifest(args.manifest or str(out_dir / "manifest.json"))
+
+    jobs = plan_jobs(videos, args.out_dir, args)
+    pending = [j for j in jobs if not manifest.is_done(j["video"])]
+    print(f"Vídeos: {len(jobs)} | já concluídos: {len(jobs) - len(pending)} | pendentes: {len(pending)}")
+
+    run_frames = 0
+    t0 = time.perf_counter()
+    if pending:
+        workers = max(1, min(args.jobs, len(pending)))
+        # spawn: cada processo inicializa MediaPipe/OpenAI do zero, uma única vez
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker) as ex:
+            futures = {ex.submit(_run_job, j): j for j in pending}
+            for fut in as_completed(futures):
+                job = futures[fut]
+                try:
+                    entry = fut.result()
+                except Exception as e:
+                    print(f"[WARN] Falha ao processar {job['video']}: {e}")
+                    entry = {"status": "failed", "name": job["name"], "error": str(e)}
+                else:
+                    run_frames += entry["frames"]
+                    print(f"OK: {job['video']} ({entry['frames']} frames, {entry['fps']:.1f} fps)")
+                manifest.record(job["video"], entry)
+    wall = time.perf_counter() - t0
+
+    summary = build_batch_summary(manifest, videos, wall, run_frames)
+    summary_path = out_dir / "batch_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    summary["path"] = str(summary_path)
+    return summary
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Analisa vários vídeos (diretório ou glob) em um pool de processos")
+    p.add_argument("--input", required=True, help="Diretório (busca recursiva) ou padrão glob (ex: 'data/*.mp4')")
+    p.add_argument("--out_dir", default="outputs/batch", help="Diretório de saída (uma pasta por vídeo)")
+    p.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                   help="Vídeos processados em paralelo (processos)")
+    p.add_argument("--manifest", default=None,
+                   help="Manifesto de retomada (padrão: <out_dir>/manifest.json)")
+    p.add_argument("--frame_results", action="store_true",
+                   help="Salva os resultados por frame (frames.jsonl) de cada vídeo")
+    add_analysis_args(p)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    summary = run_batch(args)
+    agg = summary["aggregate"]
+    print(f"Concluídos: {agg['videos_done']}/{agg['videos_total']} | falhas: {agg['videos_failed']}")
+    print(f"Vazão desta execução: {agg['run_fps']:.1f} fps ({agg['run_frames']} frames em {agg['run_wall_sec']:.1f}s)")
+    print(f"Resumo do batch: {summary['path']}")
+
+
+if __name__ == "__main__":
+    main()
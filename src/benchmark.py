@@ -0,0 +1,1150 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from io_video import open_video, get_video_props, make_writer
+from frame_loop import FramePool, process_video_frames
+from analyzers.activity_analyzer import ActivityAnalyzer
+from analyzers.anomaly_detector import AnomalyDetector
+from analyzers.emotion_analyzer_openai import EmotionAnalyzerOpenAI
+from dedup import FrameDeduplicator
+from timeline import Timeline, TimelineWriter, summary_from_timeline
+from openai_stub import mosaic_reply_fn, start_stub_server
+from frame_features import FrameFeatures
+from overlay import OverlayCompositor, draw_overlays, overlay_basic
+
+
+def make_synthetic_video(output_path: str, width: int = 1920, height: int = 1080,
+                         num_frames: int = 300, fps: float = 30.0, seed: int = 0, faces: int = 0) -> str:
+    """
+    Gera um vídeo sintético determinístico (formas em movimento sobre fundo
+    com ruído fixo), usado para medir o desempenho do pipeline.
+    faces > 0 acrescenta esse número de rostos sintéticos em movimento.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+
+    writer = make_writer(output_path, fps, width, height)
+    for i in range(num_frames):
+        frame = background.copy()
+        cx = int((width * 0.1) + (width * 0.8) * ((i * 7) % num_frames) / max(1, num_frames))
+        cy = int(height / 2 + (height / 4) * np.sin(i / 15.0))
+        cv2.circle(frame, (cx, cy), max(10, height // 10), (200, 180, 160), -1)
+        cv2.rectangle(frame, (width // 8, height // 8 + (i % 40)),
+                      (width // 4, height // 4 + (i % 40)), (40, 200, 40), -1)
+        for k in range(faces):
+            fx = int(width * (0.3 + 0.5 * k / max(1, faces)) + width * 0.05 * np.sin(i / 20.0 + k))
+            fy = int(height * 0.45 + height * 0.05 * np.cos(i / 25.0 + k))
+            _draw_face(frame, fx, fy, max(16, height // 8))
+        writer.write(frame)
+    writer.release()
+    return output_path
+
+
+def _draw_face(frame, cx: int, cy: int, size: int):
+    # rosto frontal estilizado: pele, cabelo, olhos, nariz e boca
+    w, h = int(size * 0.75), size
+    cv2.ellipse(frame, (cx, cy - h // 3), (w + 4, h // 2), 0, 180, 360, (30, 40, 60), -1)
+    cv2.ellipse(frame, (cx, cy), (w, h), 0, 0, 360, (140, 170, 215), -1)
+    for ex in (cx - w // 2, cx + w // 2):
+        cv2.ellipse(frame, (ex, cy - h // 4), (w // 5, h // 12), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(frame, (ex, cy - h // 4), max(2, h // 16), (40, 30, 20), -1)
+        cv2.line(frame, (ex - w // 4, cy - h // 2 + h // 8), (ex + w // 4, cy - h // 2 + h // 8),
+                 (40, 50, 70), max(2, h // 30))
+    cv2.line(frame, (cx, cy - h // 8), (cx - w // 10, cy + h // 6), (110, 135, 180), max(2, h // 40))
+    cv2.ellipse(frame, (cx, cy + h // 2 - h // 6), (w // 3, h // 12), 0, 0, 180, (60, 60, 160), max(2, h // 30))
+
+
+def _light_on_frame():
+    # processamento leve e representativo: movimento + texto
+    activity = ActivityAnalyzer()
+
+    def on_frame(frame, frame_idx, time_sec):
+        if frame_idx % 5 == 0:
+            activity.analyze(frame)
+        cv2.putText(frame, f"Frame: {frame_idx}", (20, 50),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 0, 255), 3, cv2.LINE_AA)
+        return frame
+
+    return on_frame
+
+
+def bench_frame_loop(video_path: str, pipelined: bool, queue_size: int = 8) -> dict:
+    """
+    Mede a vazão (frames/s) do loop completo decode -> on_frame -> encode.
+    """
+    cap = open_video(video_path)
+    props = get_video_props(cap)
+    fps = props["fps"] or 30.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = make_writer(str(Path(tmp) / "out.mp4"), fps, props["width"], props["height"])
+        t0 = time.perf_counter()
+        processed = process_video_frames(
+            cap=cap,
+            writer=writer,
+            fps=fps,
+            total_frames=props["total_frames"],
+            on_frame=_light_on_frame(),
+            pipelined=pipelined,
+            queue_size=queue_size,
+        )
+        elapsed = time.perf_counter() - t0
+        writer.release()
+    cap.release()
+
+    return {
+        "mode": "pipeline" if pipelined else "serial",
+        "frames": processed,
+        "seconds": elapsed,
+        "fps": processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def compare_frame_loop(video_path: str, queue_size: int = 8) -> dict:
+    serial = bench_frame_loop(video_path, pipelined=False)
+    pipeline = bench_frame_loop(video_path, pipelined=True, queue_size=queue_size)
+    return {
+        "serial": serial,
+        "pipeline": pipeline,
+        "speedup": pipeline["fps"] / serial["fps"] if serial["fps"] > 0 else None,
+    }
+
+
+def bench_emotion(num_requests: int = 20, latency: float = 0.3,
+                  interval: float = 0.1, max_in_flight: int = 4) -> dict:
+    """
+    Compara o tempo em que o loop de frames fica bloqueado pelas chamadas de
+    emoção (síncrono x assíncrono), contra o stub local com latência injetada.
+    Uma amostra é enviada a cada `interval` segundos, como no loop real.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    server, base_url = start_stub_server(latency=latency)
+    crop = np.full((160, 120, 3), 128, dtype=np.uint8)
+
+    try:
+        sync = EmotionAnalyzerOpenAI(base_url=base_url)
+        blocked = 0.0
+        ok = 0
+        for _ in range(num_requests):
+            t0 = time.perf_counter()
+            emotion, _ = sync.analyze(crop)
+            blocked += time.perf_counter() - t0
+            ok += 1 if emotion else 0
+            time.sleep(interval)
+        sync_result = {"blocked_sec": blocked, "results": ok}
+
+        async_analyzer = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=max_in_flight)
+        blocked = 0.0
+        ok = 0
+        for _ in range(num_requests):
+            t0 = time.perf_counter()
+            async_analyzer.submit(crop)
+            ok += sum(1 for e, _ in async_analyzer.poll() if e)
+            blocked += time.perf_counter() - t0
+            time.sleep(interval)
+        ok += sum(1 for e, _ in async_analyzer.drain() if e)
+        async_analyzer.close()
+        async_result = {"blocked_sec": blocked, "results": ok, **async_analyzer.stats()}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "latency_sec": latency,
+        "requests": num_requests,
+        "sync": sync_result,
+        "async": async_result,
+    }
+
+
+def bench_emotion_batch(num_faces: int = 36, batch_tiles: int = 9, tile_size: int = 96,
+                        latency: float = 0.05, malformed_rate: float = 0.0) -> dict:
+    """
+    Emoção recorte a recorte (analyze) x em mosaico (analyze_batch) contra o
+    stub local: requisições, bytes enviados e tempo por face analisada. O
+    stub conta as requisições e os bytes recebidos; com `malformed_rate`,
+    parte dos mosaicos recebe resposta inválida e cai no fallback.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    rng = np.random.default_rng(0)
+    crops = []
+    for i in range(num_faces):
+        crop = rng.integers(60, 120, size=(240, 180, 3), dtype=np.uint8)
+        _draw_face(crop, 90, 125, 80 + (i % 5) * 4)
+        crops.append(crop)
+
+    server, base_url = start_stub_server(
+        latency=latency, reply_fn=mosaic_reply_fn(malformed_rate=malformed_rate)
+    )
+    result = {"faces": num_faces, "batch_tiles": batch_tiles, "tile_size": tile_size}
+    try:
+        for mode in ("per_crop", "batch"):
+            analyzer = EmotionAnalyzerOpenAI(base_url=base_url, batch_tiles=batch_tiles, tile_size=tile_size)
+            requests0, bytes0 = server.requests, server.bytes_received
+            t0 = time.perf_counter()
+            if mode == "per_crop":
+                labels = [analyzer.analyze(c) for c in crops]
+            else:
+                labels = analyzer.analyze_batch(crops)
+            elapsed = time.perf_counter() - t0
+            requests = server.requests - requests0
+            sent = server.bytes_received - bytes0
+            result[mode] = {
+                "requests": requests,
+                "bytes_sent": sent,
+                "requests_per_face": requests / float(num_faces),
+                "bytes_per_face": sent / float(num_faces),
+                "ms_per_face": 1000.0 * elapsed / num_faces,
+                "results": sum(1 for e, _ in labels if e),
+                "fallbacks": analyzer.batch_fallbacks,
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    result["request_reduction"] = result["per_crop"]["requests"] / max(1, result["batch"]["requests"])
+    result["bytes_reduction"] = result["per_crop"]["bytes_sent"] / max(1, result["batch"]["bytes_sent"])
+    return result
+
+
+def bench_timeline(num_frames: int = 216_000, fps: float = 30.0) -> dict:
+    """
+    Timeline colunar: custo de gravação por frame e tempo das consultas
+    (resumo, trecho de 2 minutos com 2+ faces) sobre o timeline x sobre o
+    JSONL de --frame_results com os mesmos resultados. O padrão equivale
+    a 2h de vídeo a 30 fps.
+    """
+    rng = np.random.default_rng(0)
+    activities = ActivityAnalyzer.LABELS
+    emotions = EmotionAnalyzerOpenAI.EMOTIONS
+    results = []
+    for i in range(1, num_frames + 1):
+        faces = [{"x1": 100 + k * 200, "y1": 80, "x2": 220 + k * 200, "y2": 230, "track_id": k}
+                 for k in range(int(rng.integers(0, 4)))]
+        results.append({
+            "frame": i, "time_sec": i / fps, "faces": faces,
+            "emotion": emotions[(i // 300) % len(emotions)], "emotion_conf": 0.8,
+            "activity": activities[(i // 90) % len(activities)], "motion": float(rng.random() * 0.02),
+            "anomaly": None,
+        })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.timeline.json")
+        writer = TimelineWriter(path, fps)
+        t0 = time.perf_counter()
+        for i, r in enumerate(results):
+            writer.append(r)
+            if i % 30 == 0:
+                writer.activity(r["frame"])
+            if i % 300 == 0:
+                writer.emotion(r["frame"], r["emotion"], r["emotion_conf"])
+            if i % 5000 == 0:
+                writer.anomaly({"frame": r["frame"], "type": "high_motion", "z": 3.5})
+        writer.close()
+        write_sec = time.perf_counter() - t0
+
+        jsonl = os.path.join(tmp, "frames.jsonl")
+        t0 = time.perf_counter()
+        with open(jsonl, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        jsonl_write_sec = time.perf_counter() - t0
+        del results
+
+        start, end = 3600.0, 3720.0
+        t0 = time.perf_counter()
+        timeline = Timeline.load(path)
+        summary = summary_from_timeline(timeline)
+        summary_sec = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        query = Timeline.load(path).between(start, end).with_faces(2).aggregate()
+        query_sec = time.perf_counter() - t0
+
+        # mesma consulta relendo o JSONL
+        t0 = time.perf_counter()
+        frames = faces = 0
+        with open(jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                r = json.loads(line)
+                if start <= r["time_sec"] <= end and len(r["faces"]) >= 2:
+                    frames += 1
+                    faces += len(r["faces"])
+        jsonl_query_sec = time.perf_counter() - t0
+
+        return {
+            "frames": num_frames,
+            "timeline_bytes": os.path.getsize(writer.data_path),
+            "jsonl_bytes": os.path.getsize(jsonl),
+            "write_us_per_frame": 1e6 * write_sec / num_frames,
+            "jsonl_write_us_per_frame": 1e6 * jsonl_write_sec / num_frames,
+            "summary_ms": 1000.0 * summary_sec,
+            "query_ms": 1000.0 * query_sec,
+            "jsonl_query_ms": 1000.0 * jsonl_query_sec,
+            "query_frames": query["frames"],
+            "jsonl_query_frames": frames,
+            "summary_text": summary["text"],
+        }
+
+
+def bench_dedup(num_frames: int = 600, width: int = 1280, height: int = 720,
+                thresholds=(2.0, 4.0, 8.0), noise: float = 2.0) -> dict:
+    """
+    FrameDeduplicator: custo da assinatura por frame e taxa de frames
+    reaproveitados para cada limiar, em um vídeo sintético com trechos
+    parados (só ruído de sensor e uma "boca" mexendo) alternados com
+    trechos em movimento. Nos trechos em movimento, `max_shift_px` é o
+    maior deslocamento entre um frame reaproveitado e o frame analisado
+    que ele repete (erro das caixas reaproveitadas).
+    """
+    rng = np.random.default_rng(0)
+    bg = rng.integers(40, 120, size=(height, width, 3), dtype=np.uint8)
+    segment = max(1, num_frames // 6)
+    radius = height // 9
+    frames, centers, moving = [], [], []
+    for i in range(num_frames):
+        seg = i // segment
+        frame = bg.copy()
+        if seg % 2 == 0:
+            cx = width // 3 + seg * radius // 2
+        else:
+            cx = int(width / 2 + width / 3 * np.sin(i / 25.0))
+        cv2.circle(frame, (cx, height // 2), radius, (255, 255, 255), -1)
+        if seg % 2 == 0 and (i // 6) % 2:
+            cv2.ellipse(frame, (cx, height // 2 + radius // 3), (radius // 3, radius // 10), 0, 0, 360,
+                        (210, 210, 210), -1)
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+        frames.append(frame)
+        centers.append(cx)
+        moving.append(seg % 2 == 1)
+
+    buffers = {}
+    result = {"frames": num_frames, "width": width, "height": height, "static_frames": moving.count(False)}
+    for threshold in thresholds:
+        dedup = FrameDeduplicator(threshold=threshold)
+        reused = {"static": 0, "moving": 0}
+        ref_center, max_shift = None, 0
+        t0 = time.perf_counter()
+        for frame, cx, is_moving in zip(frames, centers, moving):
+            dedup.observe(FrameFeatures(frame, buffers=buffers))
+            if dedup.is_duplicate("face"):
+                reused["moving" if is_moving else "static"] += 1
+                if is_moving:
+                    max_shift = max(max_shift, abs(cx - ref_center))
+            else:
+                dedup.analyzed("face")
+                ref_center = cx
+        elapsed = time.perf_counter() - t0
+        static = result["static_frames"]
+        result[f"threshold_{threshold:g}"] = {
+            "ms_per_frame": 1000.0 * elapsed / num_frames,
+            "skip_rate": dedup.stats()["stages"]["face"]["skip_rate"],
+            "static_skip_rate": reused["static"] / static if static else 0.0,
+            "moving_skip_rate": reused["moving"] / (num_frames - static) if num_frames > static else 0.0,
+            "max_shift_px": max_shift,
+        }
+    return result
+
+
+def bench_features(width: int = 1920, height: int = 1080, num_frames: int = 200) -> dict:
+    """
+    Custo das conversões de frame inteiro por frame: caminho antigo (cópia
+    defensiva + RGB do detector + pré-processamento do ActivityAnalyzer +
+    redução do rastreador) x FrameFeatures compartilhado.
+    """
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(4)]
+    activity = ActivityAnalyzer()
+    track_width = 480
+
+    def legacy(frame):
+        raw = frame.copy()
+        cv2.cvtColor(raw, cv2.COLOR_BGR2RGB)
+        activity._preprocess(raw)
+        small = cv2.resize(raw, (track_width, int(height * track_width / width)),
+                           interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def shared(frame):
+        features = FrameFeatures(frame, resize_width=activity.resize_width)
+        features.rgb
+        features.blurred_gray
+        features.gray
+
+    result = {}
+    for name, fn in (("legacy", legacy), ("shared", shared)):
+        t0 = time.perf_counter()
+        for i in range(num_frames):
+            fn(frames[i % len(frames)])
+        elapsed = time.perf_counter() - t0
+        result[name] = {"ms_per_frame": 1000.0 * elapsed / num_frames}
+
+    result["saving_ms_per_frame"] = result["legacy"]["ms_per_frame"] - result["shared"]["ms_per_frame"]
+    result["resolution"] = f"{width}x{height}"
+    return result
+
+
+def bench_activity_chunk(num_frames: int = 600, width: int = 1280, height: int = 720,
+                         chunk: int = 30) -> dict:
+    """
+    ActivityAnalyzer: analyze() frame a frame x analyze_chunk() em blocos de
+    `chunk` frames, sobre os mesmos frames já reduzidos (o pré-processamento
+    fica fora da medição). Confere que rótulos e scores são idênticos.
+    """
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    analyzer = ActivityAnalyzer()
+    grays = []
+    for i in range(num_frames):
+        frame = base.copy()
+        cx = int((0.1 + 0.8 * ((i * 7) % 100) / 100.0) * width)
+        cv2.circle(frame, (cx, height // 2), height // 8 + (i % 5) * 4, (255, 255, 255), -1)
+        grays.append(analyzer.preprocess(frame))
+    grays = np.stack(grays)
+
+    # analyze() recebe o frame reduzido via um FrameFeatures de mentira
+    class _Reduced:
+        resize_width = analyzer.resize_width
+
+        def __init__(self, gray):
+            self.blurred_gray = gray
+
+    per_frame = ActivityAnalyzer()
+    t0 = time.perf_counter()
+    ref = [per_frame.analyze(None, features=_Reduced(g)) for g in grays]
+    t_frame = time.perf_counter() - t0
+
+    chunked = ActivityAnalyzer()
+    labels, scores = [], []
+    t0 = time.perf_counter()
+    for start in range(0, num_frames, chunk):
+        l, s = chunked.analyze_chunk(grays[start:start + chunk])
+        labels.append(l)
+        scores.append(s)
+    t_chunk = time.perf_counter() - t0
+    labels, scores = np.concatenate(labels), np.concatenate(scores)
+
+    return {
+        "frames": num_frames,
+        "reduced_size": f"{grays.shape[2]}x{grays.shape[1]}",
+        "chunk": chunk,
+        "per_frame": {"ms_per_frame": 1000.0 * t_frame / num_frames},
+        "chunked": {"ms_per_frame": 1000.0 * t_chunk / num_frames},
+        "speedup": t_frame / t_chunk if t_chunk > 0 else None,
+        "labels_equal": bool(all(r[0] == l for r, l in zip(ref, labels))),
+        "scores_equal": bool(np.array_equal(np.array([r[1] for r in ref]), scores)),
+    }
+
+
+def _reference_anomaly_z(scores, window_size: int):
+    """Implementação original do AnomalyDetector (cópia da janela a cada update)."""
+    from collections import deque
+
+    hist = deque(maxlen=window_size)
+    out = np.full(len(scores), np.nan)
+    for i, s in enumerate(scores):
+        hist.append(float(s))
+        if len(hist) < max(15, window_size // 4):
+            continue
+        arr = np.array(hist, dtype=float)
+        mean = float(arr.mean())
+        std = float(arr.std()) if float(arr.std()) > 1e-9 else 1e-9
+        out[i] = (s - mean) / std
+    return out
+
+
+def bench_anomaly(num_scores: int = 100_000, window_size: int = 60, z_thresh: float = 3.0) -> dict:
+    """
+    Verifica a equivalência (z-scores e decisões) entre a implementação
+    original, o update() incremental e o update_batch(), e mede o tempo de cada.
+    """
+    rng = np.random.default_rng(0)
+    scores = rng.gamma(2.0, 0.004, size=num_scores)
+    scores[rng.random(num_scores) < 0.005] = 0.2   # picos de movimento
+    scores[num_scores // 2: num_scores // 2 + 500] = 0.0  # trecho parado
+
+    t0 = time.perf_counter()
+    z_ref = _reference_anomaly_z(scores, window_size)
+    t_ref = time.perf_counter() - t0
+
+    det = AnomalyDetector(window_size=window_size, z_thresh=z_thresh)
+    z_stream = np.full(num_scores, np.nan)
+    t0 = time.perf_counter()
+    for i, s in enumerate(scores):
+        r = det.update(s)
+        if r is not None:
+            z_stream[i] = r["z"]
+    t_stream = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = AnomalyDetector(window_size=window_size, z_thresh=z_thresh).update_batch(scores)
+    t_batch = time.perf_counter() - t0
+
+    def flags_of(z):
+        f = np.zeros(len(z), dtype=np.int8)
+        valid = ~np.isnan(z)
+        f[valid & (z >= z_thresh)] = 1
+        f[valid & (z <= -z_thresh)] = -1
+        return f
+
+    ref_flags = flags_of(z_ref)
+    stream_flags = np.zeros(num_scores, dtype=np.int8)
+    stream_flags[~np.isnan(z_stream) & (z_stream > 0)] = 1
+    stream_flags[~np.isnan(z_stream) & (z_stream < 0)] = -1
+
+    return {
+        "scores": num_scores,
+        "seconds": {"reference": t_ref, "streaming": t_stream, "batch": t_batch},
+        "streaming_flags_equal": bool(np.array_equal(ref_flags, stream_flags)),
+        "batch_flags_equal": bool(np.array_equal(ref_flags, batch["flags"])),
+        "batch_max_rel_z_diff": float(
+            np.nanmax(np.abs(batch["z"] - z_ref) / np.maximum(1.0, np.abs(z_ref)))
+        ),
+    }
+
+
+def bench_overlay(width: int = 1920, height: int = 1080, num_frames: int = 300) -> dict:
+    """
+    Custo por frame de draw_overlays(): putText a cada frame x sprites em cache
+    (OverlayCompositor). Os rótulos mudam a cada 30 frames, como no vídeo real.
+    """
+    base = np.zeros((height, width, 3), dtype=np.uint8)
+    frame = base.copy()
+    fps = 30.0
+
+    def result_for(i):
+        return {
+            "frame": i,
+            "time_sec": i / fps,
+            "faces": [{"x1": 800, "y1": 300, "x2": 1000, "y2": 520, "score": 0.9}],
+            "emotion": "neutral",
+            "emotion_conf": 0.8,
+            "activity": "talking",
+            "motion": 0.01 + 0.001 * (i // 30),
+            "anomaly_text": "ANOMALY: high_motion z=3.20" if (i // 60) % 2 else None,
+        }
+
+    result = {}
+    for name, compositor in (("puttext", None), ("compositor", OverlayCompositor())):
+        t0 = time.perf_counter()
+        for i in range(1, num_frames + 1):
+            draw_overlays(frame, result_for(i), fps=fps, total_frames=num_frames, compositor=compositor)
+        elapsed = time.perf_counter() - t0
+        result[name] = {"ms_per_frame": 1000.0 * elapsed / num_frames}
+        if compositor is not None:
+            result[name].update(compositor.stats())
+
+    result["speedup"] = result["puttext"]["ms_per_frame"] / max(1e-9, result["compositor"]["ms_per_frame"])
+    return result
+
+
+def bench_frame_alloc(video_path: str, warmup: int = 10) -> dict:
+    """
+    Memória alocada por frame no loop (tracemalloc): leitura, conversões
+    (FrameFeatures, incluindo o RGB do MediaPipe), movimento, overlay e
+    escrita, com arrays novos a cada frame x buffers reaproveitados
+    (FramePool + buffers do FrameFeatures). As alocações internas do
+    MediaPipe (C++) não passam pelo tracemalloc e ficam de fora.
+
+    per_frame_kb: pico alocado acima do estado do frame anterior, por ciclo
+    (mediana e p99 após `warmup` frames); growth_kb: crescimento líquido no
+    regime estável.
+    """
+    import tracemalloc
+
+    cap = open_video(video_path)
+    props = get_video_props(cap)
+    cap.release()
+    fps = props["fps"] or 30.0
+    frame_kb = props["width"] * props["height"] * 3 / 1024.0
+    overlay_result = {
+        "faces": [{"x1": 100, "y1": 100, "x2": 220, "y2": 260, "score": 0.9}],
+        "emotion": "neutral", "emotion_conf": 0.8, "activity": "talking", "motion": 0.01,
+        "anomaly_text": None,
+    }
+
+    result = {"frame_kb": frame_kb}
+    for name, reuse in (("alloc", False), ("reuse", True)):
+        activity = ActivityAnalyzer()
+        compositor = OverlayCompositor()
+        buffers = {} if reuse else None
+        pool = FramePool() if reuse else None
+        samples = []
+        state = {"base": 0, "steady": None}
+
+        def on_frame(frame, frame_idx, time_sec):
+            current, peak = tracemalloc.get_traced_memory()
+            samples.append(peak - state["base"])
+            if frame_idx == warmup:
+                state["steady"] = current
+
+            features = FrameFeatures(frame, resize_width=activity.resize_width, buffers=buffers)
+            _ = features.rgb  # entrada do MediaPipe
+            activity.analyze(frame, features=features)
+            frame = draw_overlays(frame, {**overlay_result, "frame": frame_idx, "time_sec": time_sec},
+                                  fps=fps, total_frames=props["total_frames"], compositor=compositor)
+
+            tracemalloc.reset_peak()
+            state["base"] = tracemalloc.get_traced_memory()[0]
+            return frame
+
+        cap = open_video(video_path)
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = make_writer(str(Path(tmp) / "out.mp4"), fps, props["width"], props["height"])
+            tracemalloc.start()
+            try:
+                process_video_frames(cap=cap, writer=writer, fps=fps, total_frames=props["total_frames"],
+                                     on_frame=on_frame, progress=False, pool=pool)
+                end = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            writer.release()
+        cap.release()
+
+        steady = np.asarray(samples[warmup:], dtype=float) / 1024.0
+        result[name] = {
+            "per_frame_kb": {
+                "p50": float(np.percentile(steady, 50)) if len(steady) else None,
+                "p99": float(np.percentile(steady, 99)) if len(steady) else None,
+            },
+            "growth_kb": (end - state["steady"]) / 1024.0 if state["steady"] is not None else None,
+            "frame_pool": pool.stats() if pool is not None else None,
+        }
+    return result
+
+
+def bench_writers(video_path: str, ffmpeg_codec: str = "libx264", preset: str = "veryfast") -> dict:
+    """
+    Vazão de codificação e tamanho da saída de cada backend de writer
+    (make_writer). Só write()/release() entram no tempo (o decode fica de
+    fora); com thread própria, o tempo inclui esperar a fila esvaziar no
+    release(), e `loop_ms_per_frame` mostra o quanto o loop ficou bloqueado.
+    """
+    cap = open_video(video_path)
+    props = get_video_props(cap)
+    cap.release()
+    fps = props["fps"] or 30.0
+    width, height = props["width"], props["height"]
+
+    configs = {
+        "opencv": {},
+        "opencv+thread": {"queue_size": 8},
+        "opencv_half_res": {"out_width": width // 2},
+        "opencv_half_fps": {"out_fps": fps / 2},
+        "opencv_segmented": {"segment_sec": max(1.0, props["total_frames"] / fps / 3)},
+    }
+    if shutil.which("ffmpeg"):
+        configs.update({
+            "ffmpeg": {"backend": "ffmpeg", "codec": ffmpeg_codec, "preset": preset},
+            "ffmpeg+thread": {"backend": "ffmpeg", "codec": ffmpeg_codec, "preset": preset, "queue_size": 8},
+            "ffmpeg_half_res": {"backend": "ffmpeg", "codec": ffmpeg_codec, "preset": preset,
+                                "out_width": width // 2, "queue_size": 8},
+        })
+    else:
+        print("[WARN] ffmpeg não encontrado; backends ffmpeg fora do benchmark", file=sys.stderr)
+
+    result = {}
+    for name, options in configs.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = make_writer(str(Path(tmp) / "out.mp4"), fps, width, height, **options)
+            frames = 0
+            loop = 0.0
+            for frame in _iter_video(video_path):
+                t0 = time.perf_counter()
+                writer.write(frame)
+                loop += time.perf_counter() - t0
+                frames += 1
+            t0 = time.perf_counter()
+            writer.release()
+            total = loop + time.perf_counter() - t0
+            stats = writer.stats()
+            size = sum(os.path.getsize(p) for p in stats["paths"])
+
+        result[name] = {
+            "frames": frames,
+            "encode_fps": frames / total if total > 0 else 0.0,
+            "loop_ms_per_frame": 1000.0 * loop / max(1, frames),
+            "bytes": size,
+            "bytes_per_frame": size / max(1, frames),
+            "files": len(stats["paths"]),
+        }
+
+    base = result["opencv"]["encode_fps"]
+    for r in result.values():
+        r["speedup"] = r["encode_fps"] / base if base > 0 else None
+    return result
+
+
+def _match_faces(reference: list, found: list, min_iou: float = 0.5):
+    # associação gulosa por IoU; devolve (pares associados, soma das IoUs)
+    from detectors.face_tracker import iou
+
+    pairs = sorted(((iou(r, f), i, j) for i, r in enumerate(reference) for j, f in enumerate(found)),
+                   reverse=True)
+    used_r, used_f = set(), set()
+    total = 0.0
+    for v, i, j in pairs:
+        if v < min_iou or i in used_r or j in used_f:
+            continue
+        used_r.add(i)
+        used_f.add(j)
+        total += v
+    return len(used_r), total
+
+
+def bench_face_detect(video_path: str, detect_widths=(960, 640, 480), roi_padding: float = 0.5,
+                      full_sweep_every: int = 30) -> dict:
+    """
+    Detecção facial em resoluções reduzidas, com e sem ROI, comparada com a
+    detecção no frame original (referência): ms/frame, speedup e acurácia
+    (recall/precisão por IoU >= 0.5 e IoU média dos pares).
+    """
+    from detectors.face_detector import FaceDetector
+    from detectors.face_tracker import FaceTracker
+
+    configs = [("full", None, False)]
+    for w in detect_widths:
+        configs.append((f"w{w}", w, False))
+        configs.append((f"w{w}+roi", w, True))
+
+    reference = None
+    result = {}
+    for name, width, roi in configs:
+        detector = FaceDetector(min_detection_confidence=0.4, model_selection=1, detect_width=width)
+        tracker = FaceTracker(detector, detect_every=1, roi_padding=roi_padding if roi else None,
+                              full_sweep_every=full_sweep_every)
+        boxes, latencies = [], []
+        for idx, frame in enumerate(_iter_video(video_path), start=1):
+            t0 = time.perf_counter()
+            faces = tracker.update(frame, idx)
+            latencies.append(time.perf_counter() - t0)
+            boxes.append(faces)
+
+        stats = {"ms_per_frame": 1000.0 * sum(latencies) / max(1, len(latencies)), **tracker.stats()}
+        if reference is None:
+            reference = boxes
+        else:
+            ref_total = sum(len(r) for r in reference)
+            found_total = sum(len(b) for b in boxes)
+            matched = iou_sum = 0
+            for ref, found in zip(reference, boxes):
+                m, v = _match_faces(ref, found)
+                matched += m
+                iou_sum += v
+            stats.update({
+                "speedup": result["full"]["ms_per_frame"] / max(1e-9, stats["ms_per_frame"]),
+                "recall": matched / ref_total if ref_total else None,
+                "precision": matched / found_total if found_total else None,
+                "mean_iou": iou_sum / matched if matched else None,
+            })
+        result[name] = stats
+
+    result["reference_faces_per_frame"] = sum(len(r) for r in reference) / max(1, len(reference))
+    return result
+
+
+# ----------------------------------------------------------------------
+# suíte por estágio (baseline JSON + comparação)
+# ----------------------------------------------------------------------
+SUITE_STAGES = ("face_detect", "activity", "anomaly", "overlay", "frame_loop")
+
+# métricas comparadas com o baseline e o sentido em que pioram
+SUITE_METRICS = {"fps": "lower", "p50_ms": "higher", "p99_ms": "higher", "peak_rss_mb": "higher"}
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: KB no Linux, bytes no macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_stats(latencies: list, wall_sec: float = None) -> dict:
+    lat = np.asarray(latencies, dtype=float)
+    if len(lat) == 0:
+        return {"frames": 0, "fps": 0.0, "p50_ms": None, "p99_ms": None, "peak_rss_mb": _peak_rss_mb()}
+    total = float(lat.sum()) if wall_sec is None else wall_sec
+    return {
+        "frames": int(len(lat)),
+        "fps": len(lat) / total if total > 0 else 0.0,
+        "p50_ms": 1000.0 * float(np.percentile(lat, 50)),
+        "p99_ms": 1000.0 * float(np.percentile(lat, 99)),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _iter_video(path: str):
+    cap = open_video(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def _timed(fn, items) -> list:
+    # só a chamada do estágio entra na latência (o decode fica de fora)
+    latencies = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def _run_stage(case: dict) -> dict:
+    """Executa um caso da suíte (um estágio sobre um vídeo) e devolve as métricas."""
+    stage = case["stage"]
+    extra = {}
+
+    if stage == "anomaly":
+        rng = np.random.default_rng(0)
+        scores = rng.gamma(2.0, 0.004, size=case["scores"])
+        scores[rng.random(len(scores)) < 0.005] = 0.2
+        detector = AnomalyDetector(window_size=60, z_thresh=3.0)
+        result = _latency_stats(_timed(detector.update, scores))
+
+    elif stage == "face_detect":
+        from detectors.face_detector import FaceDetector
+
+        detector = FaceDetector(min_detection_confidence=0.4, model_selection=1)
+        found = []
+        result = _latency_stats(_timed(lambda f: found.append(len(detector.detect(f))),
+                                       _iter_video(case["video"])))
+        extra["faces_per_frame"] = sum(found) / len(found) if found else 0.0
+
+    elif stage == "activity":
+        analyzer = ActivityAnalyzer()
+        result = _latency_stats(_timed(analyzer.analyze, _iter_video(case["video"])))
+
+    elif stage == "overlay":
+        fps, total = 30.0, case["frames"]
+        counter = iter(range(1, 10**9))
+
+        def draw(frame):
+            i = next(counter)
+            overlay_basic(frame, i, i / fps, fps=fps, total_frames=total)
+
+        result = _latency_stats(_timed(draw, _iter_video(case["video"])))
+
+    elif stage == "frame_loop":
+        # loop completo (decode -> faces/movimento/anomalia/overlay -> encode), sem emoção
+        from detectors.face_detector import FaceDetector
+
+        detector = FaceDetector(min_detection_confidence=0.4, model_selection=1)
+        activity = ActivityAnalyzer()
+        anomaly = AnomalyDetector(window_size=60, z_thresh=3.0)
+        latencies = []
+
+        def on_frame(frame, frame_idx, time_sec):
+            t0 = time.perf_counter()
+            detector.detect(frame)
+            if frame_idx % 5 == 0:
+                _, motion = activity.analyze(frame)
+                anomaly.update(motion)
+            frame = overlay_basic(frame, frame_idx, time_sec, fps=30.0, total_frames=case["frames"])
+            latencies.append(time.perf_counter() - t0)
+            return frame
+
+        cap = open_video(case["video"])
+        props = get_video_props(cap)
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = make_writer(str(Path(tmp) / "out.mp4"), 30.0, props["width"], props["height"])
+            t0 = time.perf_counter()
+            process_video_frames(cap=cap, writer=writer, fps=30.0, total_frames=props["total_frames"],
+                                 on_frame=on_frame)
+            wall = time.perf_counter() - t0
+            writer.release()
+        cap.release()
+        # fps pelo tempo de parede (inclui decode/encode); latências só do on_frame
+        result = _latency_stats(latencies, wall_sec=wall)
+
+    else:
+        raise ValueError(f"Estágio desconhecido: {stage}")
+
+    result.update(extra)
+    return result
+
+
+def _run_isolated(case: dict) -> dict:
+    # um processo novo por caso: o pico de RSS medido é só daquele estágio
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as ex:
+        return ex.submit(_run_stage, case).result()
+
+
+def run_suite(resolutions: list, lengths: list, stages=SUITE_STAGES, faces: int = 2,
+              num_scores: int = 20_000) -> dict:
+    """
+    Roda cada estágio isoladamente sobre vídeos sintéticos determinísticos
+    (cada resolução x duração) e devolve {"meta": ..., "results": {caso: métricas}}.
+    Casos: "<estágio>@<L>x<A>/<frames>f"; o AnomalyDetector não depende do
+    vídeo e roda uma vez ("anomaly").
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in resolutions:
+            for num_frames in lengths:
+                video = make_synthetic_video(str(Path(tmp) / f"synthetic_{width}x{height}_{num_frames}.mp4"),
+                                             width, height, num_frames, faces=faces)
+                for stage in stages:
+                    if stage == "anomaly":
+                        continue
+                    key = f"{stage}@{width}x{height}/{num_frames}f"
+                    print(f"[suite] {key}", file=sys.stderr)
+                    results[key] = _run_isolated({"stage": stage, "video": video, "frames": num_frames})
+
+    if "anomaly" in stages:
+        print("[suite] anomaly", file=sys.stderr)
+        results["anomaly"] = _run_isolated({"stage": "anomaly", "scores": num_scores})
+
+    return {
+        "meta": {
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "faces": faces,
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict, tolerance: float = 0.10) -> dict:
+    """
+    Compara as métricas de dois resultados de run_suite(). Uma variação maior
+    que `tolerance` (relativa) no sentido ruim é regressão; no sentido bom,
+    melhora. Casos ausentes em um dos lados são listados à parte.
+    """
+    cur, base = current["results"], baseline["results"]
+    regressions, improvements = [], []
+
+    for key in sorted(set(cur) & set(base)):
+        for metric, worse in SUITE_METRICS.items():
+            new, old = cur[key].get(metric), base[key].get(metric)
+            if new is None or old is None or old == 0:
+                continue
+            change = (new - old) / old
+            item = {"case": key, "metric": metric, "baseline": old, "current": new, "change": change}
+            got_worse = change > tolerance if worse == "higher" else change < -tolerance
+            got_better = change < -tolerance if worse == "higher" else change > tolerance
+            if got_worse:
+                regressions.append(item)
+            elif got_better:
+                improvements.append(item)
+
+    return {
+        "tolerance": tolerance,
+        "regressions": regressions,
+        "improvements": improvements,
+        "only_in_baseline": sorted(set(base) - set(cur)),
+        "only_in_current": sorted(set(cur) - set(base)),
+    }
+
+
+def _parse_resolutions(text: str) -> list:
+    out = []
+    for item in text.split(","):
+        w, h = item.lower().split("x")
+        out.append((int(w), int(h)))
+    return out
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmarks do pipeline de análise de vídeo")
+    sub = p.add_subparsers(dest="command")
+
+    fl = sub.add_parser("frame_loop", help="Loop serial x pipeline")
+    fl.add_argument("--video", default=None, help="Vídeo de entrada (se omitido, gera um sintético)")
+    fl.add_argument("--width", type=int, default=1920)
+    fl.add_argument("--height", type=int, default=1080)
+    fl.add_argument("--frames", type=int, default=300)
+    fl.add_argument("--queue_size", type=int, default=8)
+
+    em = sub.add_parser("emotion", help="Emoção síncrona x assíncrona contra o stub local")
+    em.add_argument("--requests", type=int, default=20)
+    em.add_argument("--latency", type=float, default=0.3)
+    em.add_argument("--interval", type=float, default=0.1)
+    em.add_argument("--max_inflight", type=int, default=4)
+
+    eb = sub.add_parser("emotion_batch", help="Emoção recorte a recorte x mosaico (analyze_batch) contra o stub local")
+    eb.add_argument("--faces", type=int, default=36)
+    eb.add_argument("--batch_tiles", type=int, default=9, help="Recortes por mosaico")
+    eb.add_argument("--tile_size", type=int, default=96, help="Lado de cada tile (px)")
+    eb.add_argument("--latency", type=float, default=0.05)
+    eb.add_argument("--malformed_rate", type=float, default=0.0,
+                    help="Fração de respostas em mosaico inválidas (exercita o fallback)")
+
+    ft = sub.add_parser("features", help="Conversões por frame: antigo x FrameFeatures")
+    ft.add_argument("--width", type=int, default=1920)
+    ft.add_argument("--height", type=int, default=1080)
+    ft.add_argument("--frames", type=int, default=200)
+
+    an = sub.add_parser("anomaly", help="AnomalyDetector: equivalência e tempo (original x incremental x lote)")
+    an.add_argument("--scores", type=int, default=100_000)
+    an.add_argument("--window_size", type=int, default=60)
+    an.add_argument("--z_thresh", type=float, default=3.0)
+
+    ac = sub.add_parser("activity", help="ActivityAnalyzer: analyze() por frame x analyze_chunk() em lote")
+    ac.add_argument("--frames", type=int, default=600)
+    ac.add_argument("--width", type=int, default=1280)
+    ac.add_argument("--height", type=int, default=720)
+    ac.add_argument("--chunk", type=int, default=30, help="Frames por chamada de analyze_chunk")
+
+    tl = sub.add_parser("timeline", help="Timeline colunar: gravação, resumo e consultas x JSONL por frame")
+    tl.add_argument("--frames", type=int, default=216_000)
+    tl.add_argument("--fps", type=float, default=30.0)
+
+    dd = sub.add_parser("dedup", help="Frames quase duplicados: custo da assinatura e taxa de reaproveitamento")
+    dd.add_argument("--frames", type=int, default=600)
+    dd.add_argument("--width", type=int, default=1280)
+    dd.add_argument("--height", type=int, default=720)
+    dd.add_argument("--thresholds", default="2,4,8", help="Limiares de --dedup_threshold (separados por vírgula)")
+
+    ov = sub.add_parser("overlay", help="Overlay: putText x sprites em cache")
+    ov.add_argument("--width", type=int, default=1920)
+    ov.add_argument("--height", type=int, default=1080)
+    ov.add_argument("--frames", type=int, default=300)
+
+    al = sub.add_parser("alloc", help="Alocações por frame (tracemalloc): arrays novos x buffers reaproveitados")
+    al.add_argument("--video", default=None, help="Vídeo de entrada (se omitido, gera um sintético)")
+    al.add_argument("--width", type=int, default=1920)
+    al.add_argument("--height", type=int, default=1080)
+    al.add_argument("--frames", type=int, default=120)
+
+    wr = sub.add_parser("writers", help="Backends de writer: vazão de codificação e tamanho da saída")
+    wr.add_argument("--video", default=None, help="Vídeo de entrada (se omitido, gera um sintético)")
+    wr.add_argument("--width", type=int, default=1920)
+    wr.add_argument("--height", type=int, default=1080)
+    wr.add_argument("--frames", type=int, default=300)
+    wr.add_argument("--codec", default="libx264", help="Codec dos backends ffmpeg")
+    wr.add_argument("--preset", default="veryfast", help="Preset dos backends ffmpeg")
+
+    fd = sub.add_parser("faces", help="Detecção facial: resolução reduzida e ROI x frame original")
+    fd.add_argument("--video", default=None, help="Vídeo de entrada (se omitido, gera um sintético com rostos)")
+    fd.add_argument("--width", type=int, default=1920)
+    fd.add_argument("--height", type=int, default=1080)
+    fd.add_argument("--frames", type=int, default=150)
+    fd.add_argument("--faces", type=int, default=2, help="Rostos no vídeo sintético")
+    fd.add_argument("--detect_widths", default="960,640,480", help="Larguras de detecção (separadas por vírgula)")
+    fd.add_argument("--roi_padding", type=float, default=0.5)
+    fd.add_argument("--full_sweep_every", type=int, default=30)
+
+    su = sub.add_parser("suite", help="Suíte por estágio com baseline JSON e detecção de regressões")
+    su.add_argument("--resolutions", default="640x360,1280x720,1920x1080",
+                    help="Resoluções dos vídeos sintéticos (LxA separados por vírgula)")
+    su.add_argument("--lengths", default="150", help="Durações em frames (separadas por vírgula)")
+    su.add_argument("--faces", type=int, default=2, help="Rostos sintéticos por frame")
+    su.add_argument("--stages", default=",".join(SUITE_STAGES), help="Estágios a medir")
+    su.add_argument("--scores", type=int, default=20_000, help="Updates medidos no AnomalyDetector")
+    su.add_argument("--out", default=None, help="Salva o resultado (ex: novo baseline) neste JSON")
+    su.add_argument("--compare", default=None, help="Baseline JSON para comparação")
+    su.add_argument("--tolerance", type=float, default=0.10,
+                    help="Variação relativa tolerada antes de acusar regressão")
+
+    args = p.parse_args()
+    if args.command is None:
+        args = p.parse_args(["frame_loop"])
+    return args
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "emotion":
+        result = bench_emotion(args.requests, args.latency, args.interval, args.max_inflight)
+    elif args.command == "emotion_batch":
+        result = bench_emotion_batch(args.faces, args.batch_tiles, args.tile_size,
+                                     args.latency, args.malformed_rate)
+    elif args.command == "anomaly":
+        result = bench_anomaly(args.scores, args.window_size, args.z_thresh)
+    elif args.command == "activity":
+        result = bench_activity_chunk(args.frames, args.width, args.height, args.chunk)
+    elif args.command == "timeline":
+        result = bench_timeline(args.frames, args.fps)
+    elif args.command == "dedup":
+        result = bench_dedup(args.frames, args.width, args.height,
+                             [float(t) for t in args.thresholds.split(",")])
+    elif args.command == "overlay":
+        result = bench_overlay(args.width, args.height, args.frames)
+    elif args.command == "features":
+        result = bench_features(args.width, args.height, args.frames)
+    elif args.command == "alloc":
+        with tempfile.TemporaryDirectory() as tmp:
+            video = args.video or make_synthetic_video(
+                str(Path(tmp) / "synthetic.mp4"), args.width, args.height, args.frames
+            )
+            result = bench_frame_alloc(video)
+    elif args.command == "writers":
+        with tempfile.TemporaryDirectory() as tmp:
+            video = args.video or make_synthetic_video(
+                str(Path(tmp) / "synthetic.mp4"), args.width, args.height, args.frames
+            )
+            result = bench_writers(video, args.codec, args.preset)
+    elif args.command == "faces":
+        widths = [int(w) for w in args.detect_widths.split(",")]
+        with tempfile.TemporaryDirectory() as tmp:
+            video = args.video or make_synthetic_video(
+                str(Path(tmp) / "synthetic_faces.mp4"), args.width, args.height, args.frames, faces=args.faces
+            )
+            result = bench_face_detect(video, widths, args.roi_padding, args.full_sweep_every)
+    elif args.command == "suite":
+        stages = [st.strip() for st in args.stages.split(",") if st.strip()]
+        unknown = set(stages) - set(SUITE_STAGES)
+        if unknown:
+            raise RuntimeError(f"Estágios desconhecidos: {', '.join(sorted(unknown))}")
+        result = run_suite(
+            _parse_resolutions(args.resolutions),
+            [int(n) for n in args.lengths.split(",")],
+            stages=stages,
+            faces=args.faces,
+            num_scores=args.scores,
+        )
+        if args.out:
+            Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            result["comparison"] = compare_to_baseline(result, baseline, args.tolerance)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            video = args.video
+            if video is None:
+                video = make_synthetic_video(
+                    str(Path(tmp) / "synthetic.mp4"), args.width, args.height, args.frames
+                )
+
+            result = compare_frame_loop(video, queue_size=args.queue_size)
+
+    print(json.dumps(result, indent=2))
+
+    if args.command == "suite" and result.get("comparison", {}).get("regressions"):
+        for r in result["comparison"]["regressions"]:
+            print(f"[WARN] Regressão: {r['case']} {r['metric']} {r['baseline']:.3f} -> {r['current']:.3f} "
+                  f"({r['change']:+.1%})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+import cv2
+
+from io_video import make_writer, open_video
+from overlay import OverlayCompositor, draw_overlays
+from writers import write_frame
+
+
+CHECKPOINT_VERSION = 4
+
+# estado persistido de cada componente (atributos copiados como estão)
+PROCESSOR_FIELDS = (
+    "last_emotion", "last_emotion_conf", "current_frame", "current_time",
+    "emotion_track_id", "emotion_target", "last_activity", "last_motion",
+    "last_anomaly_frame", "anomaly_overlay_until", "anomaly_overlay_text",
+    "_last_face_count", "_emotion_box", "extra",
+)
+COMPONENT_FIELDS = {
+    "context": ("frames_with_face", "total_face_detections", "emotion_counts", "activity_counts",
+                "anomalies_count", "anomalies"),
+    "activity_analyzer": ("prev_gray", "_diff", "_mask", "_opened"),
+    "anomaly_detector": ("hist", "_shift", "_s1", "_s2", "_since_resync"),
+    "face_tracker": ("_tracks", "_frame_shape", "_next_id", "_last_sweep", "detections_run",
+                     "frames_tracked", "frames_held", "roi_detections", "full_sweeps"),
+    "activity_sampler": ("interval", "next_frame", "last_sample", "_recent", "first_frame", "last_frame",
+                         "samples", "triggers", "budget_denied"),
+    "emotion_analyzer": ("submitted", "dropped", "retries", "requests", "bytes_sent",
+                         "batch_requests", "batch_faces", "batch_fallbacks"),
+    # entradas do cache: só as mudanças, em <checkpoint>.cache (ver Checkpointer)
+    "emotion_cache": ("hits", "misses", "evictions"),
+    "graph": ("runs", "parallel_levels"),
+    "deduplicator": ("signature", "_refs", "frames", "reused", "analyzed_frames"),
+}
+COMPONENT_FIELDS["emotion_sampler"] = COMPONENT_FIELDS["activity_sampler"]
+
+# opções que não mudam o resultado da análise (podem diferir entre a execução e a retomada);
+# as do writer só valem na concatenação final das partes
+RESUME_IGNORED_ARGS = (
+    "resume", "checkpoint", "checkpoint_sec", "timings", "prometheus_textfile", "events_flush_sec",
+    "openai_base_url", "emotion_timeout", "jobs",
+    "writer", "writer_codec", "writer_preset", "writer_crf", "writer_threads", "writer_queue",
+    "out_width", "out_fps", "segment_minutes", "checkpoint_part_minutes",
+)
+
+
+def _components(processor) -> dict:
+    return {
+        "context": processor.context,
+        "activity_analyzer": processor.activity_analyzer,
+        "anomaly_detector": processor.anomaly_detector,
+        "face_tracker": processor.face_tracker,
+        "activity_sampler": processor.activity_sampler,
+        "emotion_sampler": processor.emotion_sampler,
+        "emotion_analyzer": processor.emotion_analyzer,
+        "emotion_cache": processor.emotion_analyzer.cache,
+        "graph": processor.graph,
+        "deduplicator": processor.deduplicator,
+    }
+
+
+def processor_state(processor) -> dict:
+    """
+    Estado do FrameProcessor e dos seus componentes (None = componente
+    ausente), incluindo as emoções assíncronas ainda em andamento.
+    """
+    state = {"processor": {name: getattr(processor, name) for name in PROCESSOR_FIELDS}}
+    for key, obj in _components(processor).items():
+        state[key] = None if obj is None else {name: getattr(obj, name) for name in COMPONENT_FIELDS[key]}
+    state["emotion_pending"] = processor.emotion_analyzer.pending_state()
+    return state
+
+
+def restore_processor(processor, state: dict):
+    """
+    Aplica processor_state() a um FrameProcessor montado com as mesmas
+    opções; as emoções que estavam em andamento são reenviadas.
+    """
+    for name, value in state["processor"].items():
+        setattr(processor, name, value)
+    for key, obj in _components(processor).items():
+        if obj is not None and state.get(key) is not None:
+            for name, value in state[key].items():
+                setattr(obj, name, value)
+    processor.emotion_analyzer.restore_pending(state.get("emotion_pending") or [])
+
+
+def run_signature(args) -> dict:
+    return {k: v for k, v in sorted(vars(args).items()) if k not in RESUME_IGNORED_ARGS}
+
+
+class PartWriter:
+    """
+    Writer do vídeo anotado em partes de `part_sec` segundos de vídeo: a
+    parte atual só é fechada (arquivo mp4 finalizado) no primeiro checkpoint
+    depois de atingir esse tamanho, e cada execução (inclusive a retomada)
+    começa uma parte nova. No fim, as partes são concatenadas sem recodificar
+    (ver concat_videos).
+
+    A parte em andamento não sobrevive a uma interrupção (mp4 sem índice).
+    Para refazê-la sem analisar os frames de novo, o resultado de cada frame
+    escrito nela (o dict de FrameProcessor._result, como em --frame_results)
+    vai para um JSONL ao lado (log()); na retomada, replay() redesenha esses
+    frames sobre o vídeo de entrada em uma parte nova.
+
+    Cada parte é gravada com as opções de make_writer da execução
+    (`options`: backend, codec, redução, thread própria), exceto a
+    segmentação, que só vale para o arquivo final. `resume` é o dict de
+    checkpoint() gravado no checkpoint da retomada.
+    """
+
+    def __init__(self, parts_dir: str, fps: float, width: int, height: int, part_sec: float = 600.0,
+                 options: dict = None, resume: dict = None):
+        self.parts_dir = Path(parts_dir)
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        self.fps, self.width, self.height = fps, width, height
+        self.part_frames = max(1, int(round(part_sec * fps)))
+        self.options = {**(options or {}), "segment_sec": None}
+
+        resume = resume or {}
+        self.parts = list(resume.get("parts", []))  # partes finalizadas
+        self.frames = resume.get("frames", 0)       # frames gravados (a redução de fps segue na mesma fase)
+        self.part_start = self.frames               # frames antes da parte atual
+        self._seq = resume.get("seq", 0)            # número da próxima parte (nunca reaproveitado)
+        self._replay = (resume["log"], resume["log_offset"]) if resume.get("log") else None
+        self._current = None
+        self._log = None
+        self._log_path = None
+        self._obsolete = []  # JSONL que o próximo checkpoint gravado deixa de usar
+        self.rotations = 0
+        self.replayed = 0
+
+        # arquivos gravados depois do checkpoint (execução interrompida) são descartados
+        keep = {Path(p).name for p in self.parts}
+        if self._replay is not None:
+            keep.add(Path(self._replay[0]).name)
+        for stale in list(self.parts_dir.glob("part_*.mp4")) + list(self.parts_dir.glob("part_*.jsonl")):
+            if stale.name not in keep:
+                stale.unlink()
+
+    def write(self, frame):
+        self._open().write(frame)
+        self.frames += 1
+
+    def write_owned(self, frame, done):
+        write_frame(self._open(), frame, done)
+        self.frames += 1
+
+    def log(self, result: dict):
+        """Resultado do frame que será escrito em seguida (refeito por replay())."""
+        self._open()
+        self._log.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def replay(self, video_path: str, total_frames: int = 0) -> int:
+        """
+        Retomada: regrava na parte atual os frames da parte que estava em
+        andamento no checkpoint, redesenhando os overlays do JSONL sobre os
+        frames do vídeo de entrada. Retorna quantos frames foram regravados.
+        """
+        if self._replay is None:
+            return 0
+        path, offset = self._replay
+        self._replay = None
+        with open(path, "rb") as f:
+            lines = f.read(offset).decode("utf-8").splitlines()
+        results = [json.loads(line) for line in lines if line.strip()]
+        self._obsolete.append(path)
+        if not results:
+            return 0
+
+        cap = open_video(video_path)
+        compositor = OverlayCompositor()
+        try:
+            pos = results[0]["frame"]
+            cap.set(cv2.CAP_PROP_POS_FRAMES, pos - 1)
+            for result in results:
+                while pos < result["frame"]:
+                    cap.grab()
+                    pos += 1
+                ret, frame = cap.read()
+                pos += 1
+                if not ret:
+                    raise RuntimeError(f"Frame {result['frame']} não encontrado em {video_path} ao refazer "
+                                       "o vídeo anotado da retomada")
+                self.log(result)
+                self.write(draw_overlays(frame, result, fps=self.fps, total_frames=total_frames,
+                                         compositor=compositor))
+        finally:
+            cap.release()
+        self.replayed = len(results)
+        return self.replayed
+
+    def checkpoint(self) -> dict:
+        """
+        Estado para o checkpoint: partes finalizadas e a posição do JSONL da
+        parte atual, que é fechada antes se já tem part_sec segundos.
+        """
+        if self._current is not None and self.frames - self.part_start >= self.part_frames:
+            self._finish_part()
+        offset = 0
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            offset = self._log.tell()
+        return {"parts": list(self.parts), "frames": self.part_start, "seq": self._seq,
+                "log": self._log_path if self._log is not None else None, "log_offset": offset}
+
+    def saved(self):
+        """O checkpoint foi gravado: os JSONL que ele não usa mais podem ser apagados."""
+        for path in self._obsolete:
+            Path(path).unlink(missing_ok=True)
+        self._obsolete = []
+
+    def _open(self):
+        if self._current is None:
+            name = f"part_{self._seq:05d}"
+            self._seq += 1
+            self._current_path = str(self.parts_dir / f"{name}.mp4")
+            self._current = make_writer(self._current_path, self.fps, self.width, self.height,
+                                        frame_offset=self.frames, **self.options)
+            self._log_path = str(self.parts_dir / f"{name}.jsonl")
+            self._log = open(self._log_path, "w", encoding="utf-8")
+            self.part_start = self.frames
+        return self._current
+
+    def _finish_part(self):
+        self._current.release()
+        self._current = None
+        self._log.close()
+        self._log = None
+        self.parts.append(self._current_path)
+        self._obsolete.append(self._log_path)
+        self.part_start = self.frames
+        self.rotations += 1
+
+    def release(self):
+        if self._current is not None:
+            self._finish_part()
+        self.saved()
+
+    def stats(self) -> dict:
+        return {"backend": "parts", "frames": self.frames, "paths": list(self.parts)}
+
+
+class Checkpointer:
+    """
+    Grava checkpoints periódicos (a cada `interval_sec` segundos de relógio)
+    de uma análise serial: estado do FrameProcessor e do contexto, próximo
+    frame, posição do JSONL de eventos, de --frame_results e do timeline por
+    frame (TimelineWriter) e o estado do vídeo anotado em partes (PartWriter).
+
+    maybe_save(processor, frame_idx) é chamado antes de cada frame (ver
+    FrameProcessor): tudo o que veio antes de frame_idx já foi analisado e
+    escrito. Emoções assíncronas em andamento entram no estado (o JPEG de
+    cada requisição) e são reenviadas na retomada, então o checkpoint não
+    espera as respostas.
+
+    O cache de emoções (`cache`) não vai inteiro em cada checkpoint: só as
+    mudanças desde o anterior (EmotionCache.journal()) são acrescentadas a
+    <checkpoint>.cache, e o checkpoint guarda até onde esse arquivo vale.
+    Com `resume` (o checkpoint carregado), o arquivo é cortado nessa posição
+    e as mudanças são reaplicadas ao cache.
+
+    A escrita é atômica: arquivo temporário no mesmo diretório + os.replace.
+    """
+
+    def __init__(self, path: str, interval_sec: float, args, sink=None, frame_results=None, writer=None,
+                 timeline=None, cache=None, resume: dict = None):
+        self.path = Path(path)
+        self.interval_sec = interval_sec
+        self.signature = run_signature(args)
+        self.sink = sink
+        self.frame_results = frame_results
+        self.writer = writer
+        self.timeline = timeline
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.cache = cache
+        self.journal_path = self.path.with_name(self.path.name + ".cache")
+        self._journal = None
+        if cache is not None:
+            offset = resume.get("cache_journal") if resume else None
+            if offset is not None:
+                cache.replay(read_journal(self.journal_path, offset))
+                truncate_file(self.journal_path, offset)
+                self._journal = open(self.journal_path, "ab")
+            else:
+                self._journal = open(self.journal_path, "wb")
+            cache.start_journal()
+
+        self._last_save = time.monotonic()
+        self.saves = 0
+        self.save_sec = 0.0
+        self.bytes = 0
+        self.emotion_pending = 0  # requisições em andamento no último checkpoint
+
+    def maybe_save(self, processor, frame_idx: int):
+        if time.monotonic() - self._last_save < self.interval_sec:
+            return
+        self.save(processor, frame_idx)
+
+    def record(self, result: dict):
+        """Resultado de um frame registrado (FrameProcessor._result), antes de ele ser escrito."""
+        if self.writer is not None:
+            self.writer.log(result)
+
+    def save(self, processor, next_frame: int):
+        t0 = time.perf_counter()
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "signature": self.signature,
+            "next_frame": next_frame,
+            "state": processor_state(processor),
+            "events": self.sink.position() if self.sink is not None else None,
+            "frame_results_offset": None,
+            "timeline": self.timeline.position() if self.timeline is not None else None,
+            "video": self.writer.checkpoint() if self.writer is not None else None,
+            "cache_journal": None,
+        }
+        if self.frame_results is not None:
+            self.frame_results.flush()
+            state["frame_results_offset"] = self.frame_results.tell()
+        if self._journal is not None:
+            ops = self.cache.journal()
+            if ops:
+                pickle.dump(ops, self._journal, protocol=pickle.HIGHEST_PROTOCOL)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            state["cache_journal"] = self._journal.tell()
+
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if self.writer is not None:
+            self.writer.saved()
+
+        self._last_save = time.monotonic()
+        self.saves += 1
+        self.bytes = len(data)
+        self.emotion_pending = len(state["state"]["emotion_pending"])
+        self.save_sec += time.perf_counter() - t0
+
+    def discard(self):
+        """Execução concluída: o checkpoint não serve mais para retomar."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self.path.unlink(missing_ok=True)
+        self.journal_path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "interval_sec": self.interval_sec,
+            "saves": self.saves,
+            "emotion_pending": self.emotion_pending,
+            "bytes": self.bytes,
+            "ms_per_save": 1000.0 * self.save_sec / self.saves if self.saves else 0.0,
+            "video_parts": len(self.writer.parts) if self.writer is not None else None,
+            "video_replayed": self.writer.replayed if self.writer is not None else None,
+        }
+
+
+def read_journal(path, offset: int) -> list:
+    """Mudanças do cache gravadas por Checkpointer.save() até `offset` (em ordem)."""
+    ops = []
+    with open(path, "rb") as f:
+        while f.tell() < offset:
+            ops.extend(pickle.load(f))
+    return ops
+
+
+def load_checkpoint(path: str, args) -> dict:
+    """
+    Lê um checkpoint de Checkpointer e confere se foi gravado com as mesmas
+    opções de análise; None se o arquivo não existe.
+    """
+    if not Path(path).exists():
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise RuntimeError(f"Checkpoint em formato incompatível: {path}")
+
+    current = run_signature(args)
+    saved = {k: v for k, v in state["signature"].items() if k not in RESUME_IGNORED_ARGS}
+    diff = sorted(k for k in set(current) | set(saved) if current.get(k) != saved.get(k))
+    if diff:
+        raise RuntimeError(f"Checkpoint {path} foi gravado com outras opções ({', '.join(diff)}); "
+                           "rode sem --resume para recomeçar")
+    return state
+
+
+def truncate_file(path: str, offset: int):
+    """Descarta o que foi escrito depois do checkpoint (o arquivo continua em modo append)."""
+    with open(path, "r+b") as f:
+        f.truncate(offset)
@@ -2,7 +2,19 @@ from collections import Counter
 
 
 class VideoAnalysisContext:
-    def __init__(self):
+    """
+    Agregados da análise. Só contadores e as primeiras `max_anomalies`
+    anomalias ficam em memória; com um `sink` (EventSink), todo evento de
+    anomalia, emoção e atividade também é gravado no stream JSONL, que é a
+    lista completa. Com um `timeline` (TimelineWriter), os eventos também
+    marcam a linha do frame no timeline por frame.
+    """
+
+    def __init__(self, sink=None, max_anomalies: int = 100, timeline=None):
+        self.sink = sink
+        self.timeline = timeline
+        self.max_anomalies = max_anomalies
+
         # R2 - reconhecimento facial
         self.frames_with_face = 0
         self.total_face_detections = 0
@@ -14,7 +26,8 @@ class VideoAnalysisContext:
         self.activity_counts = Counter()
 
         # R5 - anomalias
-        self.anomalies = []  # lista de eventos
+        self.anomalies_count = 0
+        self.anomalies = []  # primeiros eventos (até max_anomalies)
 
 
     def register_faces(self, num_faces: int):
@@ -22,15 +35,46 @@ class VideoAnalysisContext:
             self.frames_with_face += 1
             self.total_face_detections += num_faces
 
-    def register_emotion(self, emotion: str):
+    def register_emotion(self, emotion: str, conf=None, frame_idx: int = None, time_sec: float = None):
         if emotion:
             self.emotion_counts[emotion] += 1
+            if self.sink is not None:
+                self.sink.emit("emotion", {"frame": frame_idx, "time_sec": time_sec,
+                                           "emotion": emotion, "conf": conf})
+            if self.timeline is not None:
+                self.timeline.emotion(frame_idx, emotion, conf)
 
-    def register_activity(self, activity: str):
+    def register_activity(self, activity: str, motion: float = None, frame_idx: int = None,
+                          time_sec: float = None):
         if activity:
             self.activity_counts[activity] += 1
+            if self.sink is not None:
+                self.sink.emit("activity", {"frame": frame_idx, "time_sec": time_sec,
+                                            "activity": activity, "motion": motion})
+            if self.timeline is not None:
+                self.timeline.activity(frame_idx)
 
     def register_anomaly(self, anomaly_event: dict):
         if anomaly_event:
-            self.anomalies.append(anomaly_event)
+            self.anomalies_count += 1
+            if len(self.anomalies) < self.max_anomalies:
+                self.anomalies.append(anomaly_event)
+            if self.sink is not None:
+                self.sink.emit("anomaly", anomaly_event)
+            if self.timeline is not None:
+                self.timeline.anomaly(anomaly_event)
 
+    def merge(self, other: "VideoAnalysisContext"):
+        """
+        Soma as métricas de outro contexto (ex: de um segmento processado
+        em paralelo). As anomalias são concatenadas na ordem recebida
+        (eventos no stream ficam a cargo de quem chama).
+        """
+        self.frames_with_face += other.frames_with_face
+        self.total_face_detections += other.total_face_detections
+        self.emotion_counts.update(other.emotion_counts)
+        self.activity_counts.update(other.activity_counts)
+        self.anomalies_count += other.anomalies_count
+        room = self.max_anomalies - len(self.anomalies)
+        if room > 0:
+            self.anomalies.extend(other.anomalies[:room])
@@ -0,0 +1,72 @@
+import cv2
+
+
+class FrameDeduplicator:
+    """
+    Detecta frames quase idênticos ao último frame analisado por um estágio,
+    para que o estágio reaproveite o resultado anterior em vez de recalcular.
+
+    A assinatura do frame é o cinza reduzido (FrameFeatures.gray) em blocos
+    de `size` (média de cada bloco, INTER_AREA); a distância entre dois
+    frames é a maior diferença entre blocos correspondentes, em níveis de
+    cinza. Usar o maior bloco (e não a média) faz uma mudança localizada,
+    como uma face que vira, contar mesmo com o resto da cena parado.
+
+    Cada estágio tem a sua referência: a assinatura do último frame em que
+    ele de fato rodou (analyzed()). A comparação é sempre com essa
+    referência, não com o frame anterior, então uma mudança lenta não passa
+    despercebida acumulando diferenças pequenas.
+
+    Uso por frame: observe(features) uma vez; depois, em cada estágio,
+    is_duplicate(stage) e, se o estágio rodou, analyzed(stage).
+    """
+
+    def __init__(self, threshold: float = 4.0, size: tuple = (16, 9), stages: tuple = ("face", "emotion")):
+        self.threshold = threshold
+        self.size = size
+
+        self.signature = None  # assinatura do frame atual
+        self._refs = {}        # estágio -> assinatura do último frame analisado
+
+        self.frames = 0
+        self.reused = {stage: 0 for stage in stages}
+        self.analyzed_frames = {stage: 0 for stage in stages}
+
+    def observe(self, features):
+        self.signature = cv2.resize(features.gray, self.size, interpolation=cv2.INTER_AREA)
+        self.frames += 1
+
+    def distance(self, stage: str):
+        ref = self._refs.get(stage)
+        if ref is None or self.signature is None or ref.shape != self.signature.shape:
+            return None
+        return float(cv2.absdiff(self.signature, ref).max())
+
+    def is_duplicate(self, stage: str) -> bool:
+        """True (e conta como reaproveitado) se o frame atual é quase igual à referência do estágio."""
+        dist = self.distance(stage)
+        if dist is None or dist > self.threshold:
+            return False
+        self.reused[stage] = self.reused.get(stage, 0) + 1
+        return True
+
+    def analyzed(self, stage: str):
+        """O estágio rodou no frame atual: ele passa a ser a referência."""
+        self._refs[stage] = self.signature
+        self.analyzed_frames[stage] = self.analyzed_frames.get(stage, 0) + 1
+
+    def reset(self, stage: str):
+        """Descarta a referência (ex: o alvo da emoção mudou de face)."""
+        self._refs.pop(stage, None)
+
+    def stats(self) -> dict:
+        stages = {}
+        for stage in sorted(set(self.reused) | set(self.analyzed_frames)):
+            reused = self.reused.get(stage, 0)
+            total = reused + self.analyzed_frames.get(stage, 0)
+            stages[stage] = {
+                "analyzed": self.analyzed_frames.get(stage, 0),
+                "reused": reused,
+                "skip_rate": reused / total if total else 0.0,
+            }
+        return {"threshold": self.threshold, "frames": self.frames, "stages": stages}
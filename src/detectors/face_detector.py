@@ -1,27 +1,86 @@
 import cv2
 import mediapipe as mp
 
+from detectors.face_tracker import iou
+
 
 class FaceDetector:
+    """
+    detect_width: largura em que o MediaPipe roda (None = resolução
+    original). O frame é reduzido antes da detecção e as caixas voltam para
+    as coordenadas do frame original.
+
+    detect(..., rois=[...]) restringe a detecção a regiões do frame (ex:
+    ao redor das faces anteriores, ver FaceTracker); cada região é reduzida
+    na mesma escala do frame inteiro.
+    """
+
     def __init__(
         self,
         min_detection_confidence: float = 0.6,
         model_selection: int = 1,
+        detect_width: int = None,
+        nms_iou: float = 0.3,
     ):
         self._mp_face = mp.solutions.face_detection
         self._detector = self._mp_face.FaceDetection(
             model_selection=model_selection,  # 0 = short range, 1 = long range
             min_detection_confidence=min_detection_confidence,
         )
+        self.detect_width = detect_width
+        self.nms_iou = nms_iou
 
-    def detect(self, bgr_frame):
+    def detect(self, bgr_frame, features=None, rois=None):
         """
         Retorna lista de faces detectadas como dict:
         {x1,y1,x2,y2,score}
+
+        features (FrameFeatures, opcional) reaproveita a conversão RGB do frame
+        (ou o frame reduzido, se resize_width == detect_width).
+        rois: lista de (x1, y1, x2, y2) em pixels do frame; None = frame inteiro.
         """
         h, w, _ = bgr_frame.shape
-        rgb = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        scale = self._scale(w)
+
+        if rois is None:
+            return self._detect_region(self._full_rgb(bgr_frame, features, scale), 0, 0, w, h, w, h)
 
+        faces = []
+        for x1, y1, x2, y2 in rois:
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(w, int(x2)), min(h, int(y2))
+            if x2 - x1 < 8 or y2 - y1 < 8:
+                continue
+            crop = bgr_frame[y1:y2, x1:x2]
+            if scale < 1.0:
+                size = (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale)))
+                crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+            rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            faces.extend(self._detect_region(rgb, x1, y1, x2 - x1, y2 - y1, w, h))
+
+        # regiões sobrepostas podem achar a mesma face
+        return self._suppress(faces)
+
+    # ------------------------------------------------------------------
+    # internos
+    # ------------------------------------------------------------------
+    def _scale(self, w: int) -> float:
+        if self.detect_width is None or w <= self.detect_width:
+            return 1.0
+        return self.detect_width / float(w)
+
+    def _full_rgb(self, bgr_frame, features, scale):
+        if scale == 1.0:
+            return features.rgb if features is not None else cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        if features is not None and features.resize_width == self.detect_width:
+            small = features.small
+        else:
+            h, w = bgr_frame.shape[:2]
+            small = cv2.resize(bgr_frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+    def _detect_region(self, rgb, ox: int, oy: int, rw: int, rh: int, w: int, h: int):
+        # caixas relativas à região (ox, oy, rw, rh), devolvidas em pixels do frame (w x h)
         results = self._detector.process(rgb)
         faces = []
 
@@ -32,10 +91,10 @@ class FaceDetector:
             score = float(det.score[0]) if det.score else 0.0
             box = det.location_data.relative_bounding_box
 
-            x1 = int(box.xmin * w)
-            y1 = int(box.ymin * h)
-            x2 = int((box.xmin + box.width) * w)
-            y2 = int((box.ymin + box.height) * h)
+            x1 = ox + int(box.xmin * rw)
+            y1 = oy + int(box.ymin * rh)
+            x2 = ox + int((box.xmin + box.width) * rw)
+            y2 = oy + int((box.ymin + box.height) * rh)
 
             # clamp defensivo
             x1 = max(0, min(w - 1, x1))
@@ -48,3 +107,10 @@ class FaceDetector:
             )
 
         return faces
+
+    def _suppress(self, faces):
+        kept = []
+        for f in sorted(faces, key=lambda f: f["score"], reverse=True):
+            if all(iou(f, k) < self.nms_iou for k in kept):
+                kept.append(f)
+        return kept
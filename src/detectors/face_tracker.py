@@ -0,0 +1,257 @@
+import math
+import cv2
+
+
+def iou(a: dict, b: dict) -> float:
+    ix1, iy1 = max(a["x1"], b["x1"]), max(a["y1"], b["y1"])
+    ix2, iy2 = min(a["x2"], b["x2"]), min(a["y2"], b["y2"])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    area_a = max(0, a["x2"] - a["x1"]) * max(0, a["y2"] - a["y1"])
+    area_b = max(0, b["x2"] - b["x1"]) * max(0, b["y2"] - b["y1"])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Camada de rastreamento sobre o FaceDetector.
+
+    A detecção completa (MediaPipe) roda apenas a cada `detect_every` frames
+    (cadência absoluta, pelo índice do frame) ou quando a confiança de algum
+    rastreamento cai abaixo de `min_track_confidence`. Nos frames
+    intermediários, cada face é propagada por template matching em uma
+    janela de busca ao redor da posição anterior, em um frame reduzido e em
+    escala de cinza.
+
+    Cada face recebe um `track_id` estável: na detecção, as novas caixas são
+    associadas às faces rastreadas por IoU.
+
+    O template de cada face é o recorte do último frame de detecção, então o
+    estado após uma detecção depende só dos frames desde então (sem deriva).
+
+    Com `roi_padding`, a detecção roda só nas regiões ao redor das faces
+    atuais (caixa ampliada em roi_padding x o lado maior, para cada lado);
+    o frame inteiro é varrido quando não há faces, quando as regiões não
+    acham nenhuma e a cada `full_sweep_every` frames (faces novas).
+    """
+
+    def __init__(
+        self,
+        detector,
+        detect_every: int = 10,
+        min_track_confidence: float = 0.6,
+        iou_threshold: float = 0.3,
+        work_width: int = 320,
+        search_margin: float = 0.5,
+        roi_padding: float = None,
+        full_sweep_every: int = 30,
+    ):
+        self.detector = detector
+        self.detect_every = max(1, detect_every)
+        self.min_track_confidence = min_track_confidence
+        self.iou_threshold = iou_threshold
+        self.work_width = work_width
+        self.search_margin = search_margin
+        self.roi_padding = roi_padding
+        self.full_sweep_every = max(1, full_sweep_every)
+
+        self._tracks = []  # dicts: face + template/posição no frame reduzido
+        self._frame_shape = None
+        self._next_id = 1
+        self._last_sweep = None
+
+
+        self.detections_run = 0
+        self.frames_tracked = 0
+        self.frames_held = 0
+        self.roi_detections = 0
+        self.full_sweeps = 0
+
+    def update(self, bgr_frame, frame_idx: int, features=None):
+        """
+        Retorna a lista de faces do frame (mesmo formato do FaceDetector,
+        com `track_id` e `tracked`=True quando a caixa veio do rastreamento).
+
+        features (FrameFeatures, opcional) fornece o RGB para a detecção e o
+        frame reduzido em cinza para o rastreamento.
+        """
+        self._frame_shape = bgr_frame.shape[:2]
+
+        if self.detect_every == 1:
+            # sem rastreamento: só associa IDs, sem custo de templates
+            faces = self._detect(bgr_frame, frame_idx, features)
+            return self._associate(faces, None, 1.0)
+
+        if features is not None and features.resize_width == self.work_width:
+            scale, gray = features.scale, features.gray
+        else:
+            scale, gray = self._work_gray(bgr_frame)
+
+        if not self.needs_frame(frame_idx):
+            tracked = self._track_all(gray, scale, bgr_frame.shape)
+            if tracked is not None:
+                self.frames_tracked += 1
+                return tracked
+
+        faces = self._detect(bgr_frame, frame_idx, features)
+        return self._associate(faces, gray, scale)
+
+    def needs_frame(self, frame_idx: int) -> bool:
+        """True se o frame é um frame-chave (detecção completa obrigatória)."""
+        return self.detect_every == 1 or frame_idx % self.detect_every == 0
+
+    def hold(self):
+        """
+        Repete as últimas caixas sem olhar o frame (frames não decodificados
+        no modo só análise). O próximo update() retoma o rastreamento.
+        """
+        self.frames_held += 1
+        if self._frame_shape is None:
+            return []
+        fh, fw = self._frame_shape
+        return [
+            {
+                **t["face"],
+                "x2": min(fw - 1, t["face"]["x2"]),
+                "y2": min(fh - 1, t["face"]["y2"]),
+                "tracked": True,
+            }
+            for t in self._tracks
+        ]
+
+    def stats(self) -> dict:
+        total = self.detections_run + self.frames_tracked + self.frames_held
+        return {
+            "detect_every": self.detect_every,
+            "detections_run": self.detections_run,
+            "frames_tracked": self.frames_tracked,
+            "frames_held": self.frames_held,
+            "detection_ratio": (self.detections_run / total) if total else 0.0,
+            "roi_detections": self.roi_detections,
+            "full_sweeps": self.full_sweeps,
+        }
+
+    # ------------------------------------------------------------------
+    # internos
+    # ------------------------------------------------------------------
+    def _detect(self, bgr_frame, frame_idx: int, features):
+        self.detections_run += 1
+        sweep_due = self._last_sweep is None or frame_idx - self._last_sweep >= self.full_sweep_every
+        if self.roi_padding is not None and self._tracks and not sweep_due:
+            self.roi_detections += 1
+            faces = self.detector.detect(bgr_frame, features=features, rois=self._rois(bgr_frame.shape))
+            if faces:
+                return faces
+
+        self.full_sweeps += 1
+        self._last_sweep = frame_idx
+        return self.detector.detect(bgr_frame, features=features)
+
+    def _rois(self, frame_shape):
+        fh, fw = frame_shape[:2]
+        rois = []
+        for t in self._tracks:
+            f = t["face"]
+            pad = int(self.roi_padding * max(f["x2"] - f["x1"], f["y2"] - f["y1"]))
+            rois.append((max(0, f["x1"] - pad), max(0, f["y1"] - pad),
+                         min(fw, f["x2"] + pad), min(fh, f["y2"] + pad)))
+        return rois
+
+    def _work_gray(self, bgr_frame):
+        h, w = bgr_frame.shape[:2]
+        scale = 1.0
+        small = bgr_frame
+        if w > self.work_width:
+            scale = self.work_width / float(w)
+            small = cv2.resize(bgr_frame, (int(w * scale), int(h * scale)))
+        return scale, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _associate(self, faces, gray, scale):
+        # associação gulosa por IoU (maior IoU primeiro)
+        pairs = []
+        for i, f in enumerate(faces):
+            for j, t in enumerate(self._tracks):
+                v = iou(f, t["face"])
+                if v >= self.iou_threshold:
+                    pairs.append((v, i, j))
+        pairs.sort(reverse=True)
+
+        assigned = {}
+        used_tracks = set()
+        for _, i, j in pairs:
+            if i in assigned or j in used_tracks:
+                continue
+            assigned[i] = self._tracks[j]["face"]["track_id"]
+            used_tracks.add(j)
+
+        tracks = []
+        out = []
+        for i, f in enumerate(faces):
+            track_id = assigned.get(i)
+            if track_id is None:
+                track_id = self._next_id
+                self._next_id += 1
+
+            face = {**f, "track_id": track_id, "tracked": False}
+            out.append(face)
+
+            track = {"face": face} if gray is None else self._make_track(face, gray, scale)
+            if track is not None:
+                tracks.append(track)
+
+        self._tracks = tracks
+        return out
+
+    def _make_track(self, face, gray, scale):
+        tx1, ty1 = int(face["x1"] * scale), int(face["y1"] * scale)
+        tx2, ty2 = int(face["x2"] * scale), int(face["y2"] * scale)
+        template = gray[ty1:ty2, tx1:tx2]
+        # faces muito pequenas no frame reduzido não são rastreáveis
+        if template.shape[0] < 4 or template.shape[1] < 4:
+            return None
+        return {
+            "face": face,
+            "template": template.copy(),
+            "tx": tx1,
+            "ty": ty1,
+        }
+
+    def _track_all(self, gray, scale, frame_shape):
+        """
+        Propaga todas as faces. Retorna None se alguma perdeu confiança
+        (o chamador roda a detecção completa neste frame).
+        """
+        H, W = gray.shape[:2]
+        fh, fw = frame_shape[:2]
+        out = []
+
+        for t in self._tracks:
+            template = t["template"]
+            th, tw = template.shape[:2]
+            mx, my = int(tw * self.search_margin), int(th * self.search_margin)
+
+            sx1, sy1 = max(0, t["tx"] - mx), max(0, t["ty"] - my)
+            sx2, sy2 = min(W, t["tx"] + tw + mx), min(H, t["ty"] + th + my)
+            if sx2 - sx1 < tw or sy2 - sy1 < th:
+                return None
+
+            res = cv2.matchTemplate(gray[sy1:sy2, sx1:sx2], template, cv2.TM_CCOEFF_NORMED)
+            _, conf, _, loc = cv2.minMaxLoc(res)
+            if not math.isfinite(conf) or conf < self.min_track_confidence:
+                return None
+
+            t["tx"], t["ty"] = sx1 + loc[0], sy1 + loc[1]
+
+            face = t["face"]
+            bw, bh = face["x2"] - face["x1"], face["y2"] - face["y1"]
+            x1 = max(0, min(fw - 1, int(t["tx"] / scale)))
+            y1 = max(0, min(fh - 1, int(t["ty"] / scale)))
+            x2 = max(0, min(fw - 1, x1 + bw))
+            y2 = max(0, min(fh - 1, y1 + bh))
+
+            tracked = {**face, "x1": x1, "y1": y1, "x2": x2, "y2": y2, "tracked": True}
+            # o rastreamento guarda a caixa sem clamp para não encolher na borda
+            t["face"] = {**tracked, "x2": x1 + bw, "y2": y1 + bh}
+            out.append(tracked)
+
+        return out
@@ -0,0 +1,105 @@
+import json
+import time
+from pathlib import Path
+
+
+class EventSink:
+    """
+    Grava eventos (anomalia, emoção, atividade) em JSONL à medida que
+    acontecem, uma linha por evento: {"event": <tipo>, ...campos}.
+
+    As linhas ficam em um buffer e vão para o arquivo quando o buffer passa
+    de `flush_bytes` ou quando o último flush tem mais de `flush_interval`
+    segundos; assim uma execução interrompida perde no máximo esse intervalo
+    de eventos, sem uma escrita por evento.
+
+    resume (dict de position(), ex: de um checkpoint) reabre o arquivo
+    descartando o que foi gravado depois daquela posição e continua dali.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_bytes: int = 64 * 1024,
+                 resume: dict = None):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        if resume is not None:
+            with open(self.path, "r+b") as f:
+                f.truncate(resume["offset"])
+            self._f = open(self.path, "a", encoding="utf-8")
+        else:
+            self._f = open(self.path, "w", encoding="utf-8")
+        self._buf = []
+        self._buf_bytes = 0
+        self._last_flush = time.monotonic()
+
+        self.events = resume["events"] if resume else 0
+        self.flushes = 0
+        self.bytes_written = resume["offset"] if resume else 0
+
+    def emit(self, event: str, payload: dict):
+        line = json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+        self._buf.append(line)
+        self._buf_bytes += len(line)
+        self.events += 1
+
+        if self._buf_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            data = "".join(self._buf)
+            self._f.write(data)
+            self.bytes_written += len(data)
+            self._buf = []
+            self._buf_bytes = 0
+            self.flushes += 1
+        self._f.flush()
+        self._last_flush = time.monotonic()
+
+    def position(self) -> dict:
+        """Grava o buffer e devolve a posição atual do arquivo (ver `resume`)."""
+        self.flush()
+        return {"offset": self._f.tell(), "events": self.events}
+
+    def append_file(self, path: str):
+        """Copia os eventos de outro JSONL (ex: de um segmento de --workers) para este."""
+        self.flush()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._f.write(line)
+                self.bytes_written += len(line)
+                self.events += 1
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "events": self.events,
+            "flushes": self.flushes,
+            "bytes": self.bytes_written,
+        }
+
+
+def iter_events(path: str, event: str = None):
+    """
+    Lê um JSONL de EventSink sem carregar o arquivo inteiro.
+    Com `event`, só os eventos desse tipo, já sem o campo "event".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if event is None:
+                yield item
+            elif item.get("event") == event:
+                item.pop("event")
+                yield item
@@ -0,0 +1,99 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameFeatures:
+    """
+    Representações derivadas de um frame BGR, calculadas sob demanda e no
+    máximo uma vez por frame. Detectores e analyzers recebem este objeto
+    em vez de refazer conversões de frame inteiro.
+
+      - small: frame reduzido para `resize_width` (mesma regra do
+        ActivityAnalyzer; sem ampliação)
+      - gray: small em escala de cinza
+      - blurred_gray: gray com GaussianBlur 5x5
+      - rgb: frame em resolução completa convertido para RGB (MediaPipe)
+
+    buffers (dict, opcional): arrays reaproveitados entre frames como
+    destino das conversões (o mesmo dict a cada frame). Com ele, as
+    representações só valem durante o frame; quem guarda algo para o
+    próximo frame (ex: o ActivityAnalyzer) precisa copiar.
+
+    O cálculo sob demanda é protegido por lock: analyzers rodando em
+    paralelo (AnalyzerGraph) podem pedir a mesma representação.
+    """
+
+    def __init__(self, bgr_frame, resize_width: int = 320, buffers: dict = None):
+        self.bgr = bgr_frame
+        self.resize_width = resize_width
+        self.buffers = buffers
+
+        self._scale = None
+        self._small = None
+        self._gray = None
+        self._blurred_gray = None
+        self._rgb = None
+        self._lock = threading.RLock()
+
+    @property
+    def scale(self) -> float:
+        """Fator entre o frame reduzido e o original (small = original * scale)."""
+        if self._scale is None:
+            w = self.bgr.shape[1]
+            self._scale = self.resize_width / float(w) if w > self.resize_width else 1.0
+        return self._scale
+
+    @property
+    def small(self):
+        if self._small is None:
+            with self._lock:
+                if self._small is None:
+                    h, w = self.bgr.shape[:2]
+                    if w > self.resize_width:
+                        scale = self.scale
+                        size = (int(w * scale), int(h * scale))
+                        self._small = cv2.resize(self.bgr, size,
+                                                 dst=self._buffer("small", (size[1], size[0], 3)))
+                    else:
+                        self._small = self.bgr
+        return self._small
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            with self._lock:
+                if self._gray is None:
+                    small = self.small
+                    self._gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY,
+                                              dst=self._buffer("gray", small.shape[:2]))
+        return self._gray
+
+    @property
+    def blurred_gray(self):
+        if self._blurred_gray is None:
+            with self._lock:
+                if self._blurred_gray is None:
+                    gray = self.gray
+                    self._blurred_gray = cv2.GaussianBlur(gray, (5, 5), 0,
+                                                          dst=self._buffer("blurred_gray", gray.shape))
+        return self._blurred_gray
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            with self._lock:
+                if self._rgb is None:
+                    self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB,
+                                             dst=self._buffer("rgb", self.bgr.shape))
+        return self._rgb
+
+    def _buffer(self, name: str, shape):
+        # None = o OpenCV aloca um array novo
+        if self.buffers is None:
+            return None
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != tuple(shape):
+            buf = self.buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buf
@@ -1,48 +1,332 @@
+import queue
+import threading
+from collections import deque
 from typing import Callable, Optional
 import cv2
 from tqdm import tqdm
 
+from timing import NULL_TIMER
+from writers import write_frame
+
+
+# marcador de fim de fluxo entre os estágios do pipeline
+_END = object()
+
+
+class FramePool:
+    """
+    Buffers de frame reutilizados pelo loop: cap.read(buffer) decodifica
+    direto em um buffer já alocado em vez de criar um array novo por frame.
+
+    acquire() devolve um buffer livre (None se não houver: o cap.read()
+    aloca e o array passa a circular pelo pool); release() devolve o buffer
+    depois que o frame foi analisado e escrito. A quantidade de buffers fica
+    limitada aos frames em trânsito (1 no loop serial; as filas no pipeline e
+    a fila do writer em thread, que recebe o buffer sem cópia).
+    """
+
+    def __init__(self):
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.allocated += 1
+            return None
+
+    def release(self, frame):
+        if frame is None:
+            return
+        with self._lock:
+            self._free.append(frame)
+
+    def read(self, cap: cv2.VideoCapture):
+        buffer = self.acquire()
+        ret, frame = cap.read(buffer) if buffer is not None else cap.read()
+        if not ret and buffer is not None:
+            self.release(buffer)
+        return ret, frame
+
+    def stats(self) -> dict:
+        return {"buffers": self.allocated, "reused": self.reused}
+
 
 def process_video_frames(
     cap: cv2.VideoCapture,
-    writer: cv2.VideoWriter,
+    writer: Optional[cv2.VideoWriter],
     fps: float,
     total_frames: Optional[int],
     on_frame: Callable[[cv2.Mat, int, float], cv2.Mat],
+    pipelined: bool = False,
+    queue_size: int = 8,
+    needs_frame: Optional[Callable[[int], bool]] = None,
+    on_skip: Optional[Callable[[int, float], None]] = None,
+    first_frame: int = 1,
+    last_frame: Optional[int] = None,
+    seek_gap: Optional[int] = None,
+    progress: bool = True,
+    timer=None,
+    pool: Optional[FramePool] = None,
 ) -> int:
     """
     Percorre o vídeo frame a frame, aplica um processamento
     e escreve no writer.
 
     on_frame(frame, frame_index, time_sec) -> frame processado
+    (None = nada a escrever, ex.: frames de warm-up)
+
+    pipelined=True executa decode, análise e encode em estágios
+    separados (ver process_video_frames_pipelined).
+
+    Modo só análise (writer=None): nada é escrito e, se needs_frame for
+    informado, os frames em que needs_frame(frame_index) é False são
+    avançados com cap.grab() (sem decodificar a imagem) e repassados a
+    on_skip(frame_index, time_sec).
+
+    Intervalo: first_frame/last_frame (1-based, inclusivos) limitam os
+    frames percorridos; os índices continuam sendo os do arquivo.
+    Com seek_gap, trechos de pelo menos seek_gap frames sem uso são
+    saltados com CAP_PROP_POS_FRAMES em vez de grab() (ver measure_seek_gap).
+    Retorna o número de frames percorridos.
+
+    timer (StageTimer, opcional) mede leitura (read/grab/seek) e escrita (write).
+
+    pool (FramePool, opcional) reaproveita os buffers de leitura: o frame
+    passado a on_frame só vale até o retorno da chamada (e da escrita), então
+    quem precisar dos pixels depois (ex: um recorte enviado a outra thread)
+    deve copiá-los.
     """
-    processed = 0
+    if needs_frame is not None and writer is not None:
+        raise ValueError("needs_frame só pode ser usado sem writer (modo só análise)")
 
-    iterator = range(total_frames) if total_frames and total_frames > 0 else None
+    if last_frame is None and total_frames and total_frames > 0:
+        last_frame = total_frames
+    timer = timer or NULL_TIMER
 
-    if iterator:
-        for _ in tqdm(iterator, desc="Processando vídeo"):
-            ret, frame = cap.read()
-            if not ret:
-                break
+    if pipelined:
+        return process_video_frames_pipelined(
+            cap, writer, fps, total_frames, on_frame, queue_size=queue_size,
+            needs_frame=needs_frame, on_skip=on_skip,
+            first_frame=first_frame, last_frame=last_frame, seek_gap=seek_gap, timer=timer, pool=pool,
+        )
+
+    processed = 0
+    limit = last_frame - first_frame + 1 if last_frame is not None else None
 
-            frame_idx = processed + 1
+    with tqdm(total=limit, desc="Processando vídeo", disable=limit is None or not progress) as pbar:
+        for frame_idx, frame in _iter_frames(cap, first_frame, last_frame, needs_frame, seek_gap, timer, pool):
             time_sec = frame_idx / fps if fps else 0.0
 
-            frame = on_frame(frame, frame_idx, time_sec)
-            writer.write(frame)
+            if frame is None:
+                if on_skip is not None:
+                    on_skip(frame_idx, time_sec)
+            else:
+                out = on_frame(frame, frame_idx, time_sec)
+                if writer is not None and out is not None:
+                    with timer.stage("write"):
+                        _write(writer, out, frame, pool)
+                elif pool is not None:
+                    pool.release(frame)
+
             processed += 1
+            pbar.update(1)
+
+    return processed
+
+
+def _iter_frames(
+    cap: cv2.VideoCapture,
+    first_frame: int,
+    last_frame: Optional[int],
+    needs_frame: Optional[Callable[[int], bool]],
+    seek_gap: Optional[int],
+    timer=NULL_TIMER,
+    pool: Optional[FramePool] = None,
+):
+    """
+    Gera (frame_index, frame) de first_frame até last_frame (ou o fim do
+    arquivo); frame=None para os frames que nenhum estágio usa. Com pool,
+    os frames são lidos em buffers do pool (devolvidos por quem consome).
+    """
+    if first_frame > 1:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame - 1)
+
+    frame_idx = first_frame - 1
+    while last_frame is None or frame_idx < last_frame:
+        nxt = frame_idx + 1
+
+        if needs_frame is not None and not needs_frame(nxt):
+            # salto só com o fim conhecido: não se gera índice além do arquivo
+            if seek_gap and last_frame is not None:
+                target = nxt + 1
+                while target <= last_frame and not needs_frame(target):
+                    target += 1
+                if target - nxt >= seek_gap:
+                    with timer.stage("seek"):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, target - 1)
+                    for idx in range(nxt, target):
+                        yield idx, None
+                    frame_idx = target - 1
+                    continue
+
+            with timer.stage("grab"):
+                ok = cap.grab()
+            if not ok:
+                return
+            frame_idx = nxt
+            yield frame_idx, None
+            continue
+
+        with timer.stage("read"):
+            ret, frame = pool.read(cap) if pool is not None else cap.read()
+        if not ret:
+            return
+        frame_idx = nxt
+        yield frame_idx, frame
+
+
+def _write(writer, out, frame, pool: Optional[FramePool]):
+    # o buffer de leitura (frame, do qual out costuma ser o mesmo array) só
+    # volta ao pool depois de codificado; com writer em thread, sem cópia
+    if pool is None:
+        writer.write(out)
     else:
+        write_frame(writer, out, lambda: pool.release(frame))
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # put bloqueante (backpressure), mas que desiste se outro estágio falhou
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def process_video_frames_pipelined(
+    cap: cv2.VideoCapture,
+    writer: Optional[cv2.VideoWriter],
+    fps: float,
+    total_frames: Optional[int],
+    on_frame: Callable[[cv2.Mat, int, float], cv2.Mat],
+    queue_size: int = 8,
+    needs_frame: Optional[Callable[[int], bool]] = None,
+    on_skip: Optional[Callable[[int, float], None]] = None,
+    first_frame: int = 1,
+    last_frame: Optional[int] = None,
+    seek_gap: Optional[int] = None,
+    timer=None,
+    pool: Optional[FramePool] = None,
+) -> int:
+    """
+    Versão em pipeline de process_video_frames:
+      - thread de leitura: cap.read()
+      - thread principal: on_frame (mantém o estado dos analyzers em uma só thread)
+      - thread de escrita: writer.write()
+
+    As filas são limitadas (queue_size), então um estágio lento segura os
+    demais (backpressure) sem acumular frames em memória. Como existe um único
+    consumidor por fila, a ordem dos frames é preservada. O OpenCV libera o GIL
+    no decode/encode, então os três estágios rodam em núcleos diferentes.
+
+    Se qualquer estágio falhar, os demais são interrompidos e a exceção
+    original é relançada aqui.
+
+    Com pool, o buffer de cada frame volta ao pool depois da escrita (ou da
+    análise, sem writer); os buffers em uso ficam limitados pelas filas.
+    """
+    decode_q: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    encode_q: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    errors = []
+    if last_frame is None and total_frames and total_frames > 0:
+        last_frame = total_frames
+    limit = last_frame - first_frame + 1 if last_frame is not None else None
+    timer = timer or NULL_TIMER
+
+    def reader():
+        try:
+            # frame pulado (None): só o índice segue adiante
+            for item in _iter_frames(cap, first_frame, last_frame, needs_frame, seek_gap, timer, pool):
+                if not _put(decode_q, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(decode_q, _END, stop)
+
+    def encoder():
+        try:
+            while True:
+                item = _get(encode_q, stop)
+                if item is _END:
+                    break
+                out, frame = item
+                with timer.stage("write"):
+                    _write(writer, out, frame, pool)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    reader_t = threading.Thread(target=reader, name="frame-reader", daemon=True)
+    reader_t.start()
+    encoder_t = None
+    if writer is not None:
+        encoder_t = threading.Thread(target=encoder, name="frame-encoder", daemon=True)
+        encoder_t.start()
+
+    processed = 0
+    pbar = tqdm(total=limit, desc="Processando vídeo (pipeline)")
+    try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            item = _get(decode_q, stop)
+            if item is _END:
                 break
 
-            frame_idx = processed + 1
+            frame_idx, frame = item
             time_sec = frame_idx / fps if fps else 0.0
 
-            frame = on_frame(frame, frame_idx, time_sec)
-            writer.write(frame)
+            if frame is None:
+                if on_skip is not None:
+                    on_skip(frame_idx, time_sec)
+            else:
+                out = on_frame(frame, frame_idx, time_sec)
+                if encoder_t is not None and out is not None:
+                    # o buffer de leitura só volta ao pool depois da escrita
+                    if not _put(encode_q, (out, frame), stop):
+                        break
+                elif pool is not None:
+                    pool.release(frame)
             processed += 1
+            pbar.update(1)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        pbar.close()
+        reader_t.join()
+        if encoder_t is not None:
+            _put(encode_q, _END, stop)
+            encoder_t.join()
+
+    if errors:
+        raise errors[0]
 
     return processed
@@ -0,0 +1,588 @@
+import json
+import math
+from typing import Optional
+
+from detectors.face_tracker import FaceTracker, iou
+
+from analyzers.emotion_analyzer_openai import EmotionAnalyzerOpenAI
+from analyzers.emotion_cache import EmotionCache
+from analyzers.activity_analyzer import ActivityAnalyzer
+from analyzers.anomaly_detector import AnomalyDetector
+from frame_features import FrameFeatures
+from overlay import OverlayCompositor, draw_overlays
+from timing import NULL_TIMER, StageTimer
+from sampling import AdaptiveSampler
+from dedup import FrameDeduplicator
+from analyzer_graph import (
+    ANALYZER_REGISTRY, Analyzer, AnalyzerGraph, FrameState, load_plugins, register_analyzer,
+)
+
+
+EMOTION_EVERY_N_FRAMES = 30
+ACTIVITY_EVERY_N_FRAMES = 5
+ANOMALY_WINDOW_SIZE = 60
+ANOMALY_COOLDOWN_SEC = 1.0
+ANOMALY_OVERLAY_SEC = 2.0
+
+# amostragem adaptativa: o que conta como mudança relevante
+MOTION_CHANGE = 0.02      # variação do motion_score entre amostras de atividade
+FACE_CHANGE_IOU = 0.5     # IoU mínima entre a caixa atual e a da última amostra de emoção
+
+
+def apply_anomaly_cooldown(candidates: list, cooldown_frames: int) -> list:
+    """
+    Aplica o cooldown sobre a sequência de anomalias candidatas (ordenadas
+    por frame): um evento só é aceito se o anterior aceito estiver a pelo
+    menos `cooldown_frames` frames de distância.
+    """
+    accepted = []
+    last_frame = -10**9
+    for event in candidates:
+        if (event["frame"] - last_frame) >= cooldown_frames:
+            last_frame = event["frame"]
+            accepted.append(event)
+    return accepted
+
+
+# ----------------------------------------------------------------------
+# analyzers do grafo (R2-R5); o estado compartilhado fica no FrameProcessor
+# ----------------------------------------------------------------------
+@register_analyzer
+class FaceNode(Analyzer):
+    """R2: detecção/rastreamento de faces e escolha da face alvo da emoção."""
+
+    name = "face"
+
+    # sem inputs declarados: o RGB só é usado nos frames de detecção (FrameFeatures
+    # calcula sob demanda, com lock) e o cinza já vem do ActivityNode
+
+    def needs_frame(self, processor, frame_idx):
+        return processor.face_tracker.needs_frame(frame_idx)
+
+    def run(self, processor, state):
+        if processor.skip_faces:
+            return processor.face_tracker.hold()  # atrasado: repete as últimas caixas
+        dedup = processor.deduplicator
+        if dedup is not None and dedup.is_duplicate("face"):
+            return processor.face_tracker.hold()  # quase igual ao último frame analisado
+        with processor.timer.stage("face"):
+            # frame limpo
+            faces = processor.face_tracker.update(state.frame, state.frame_idx, features=state.features)
+        if dedup is not None:
+            dedup.analyzed("face")
+        return faces
+
+    def apply(self, processor, state, faces):
+        if state.record:
+            processor.context.register_faces(len(faces))
+
+        largest = None
+        largest_area = 0
+        target = None
+
+        for f in faces:
+            area = max(0, (f["x2"] - f["x1"])) * max(0, (f["y2"] - f["y1"]))
+            if area > largest_area:
+                largest_area = area
+                largest = f
+            if f["track_id"] == processor.emotion_track_id:
+                target = f
+
+        # a emoção acompanha a mesma face enquanto ela estiver rastreada
+        if target is None and largest is not None:
+            target = largest
+            processor.emotion_track_id = largest["track_id"]
+            if processor.deduplicator is not None:
+                processor.deduplicator.reset("emotion")
+
+        processor.emotion_target = target
+        processor._observe_faces(state.frame_idx, faces, target, state.record)
+
+
+@register_analyzer
+class EmotionNode(Analyzer):
+    """R3: emoção da face alvo (OpenAI), síncrona ou assíncrona."""
+
+    name = "emotion"
+    requires = ("face",)
+
+    def needs_frame(self, processor, frame_idx):
+        return processor._emotion_due(frame_idx)
+
+    def due(self, processor, state):
+        return (state.record and processor.emotion_target is not None and not processor.skip_emotion
+                and processor._emotion_due(state.frame_idx))
+
+    def run(self, processor, state):
+        target = processor.emotion_target
+        dedup = processor.deduplicator
+        if dedup is not None and processor.last_emotion is not None and dedup.is_duplicate("emotion"):
+            # mesma face em um frame quase igual ao da última análise: repete o resultado
+            return {"target": target, "result": (processor.last_emotion, processor.last_emotion_conf)}
+        face_crop = state.frame[target["y1"]:target["y2"], target["x1"]:target["x2"]]
+
+        # tempo em que o loop fica bloqueado (a chamada em si: openai_request)
+        with processor.timer.stage("emotion"):
+            if processor.emotion_async:
+                sent = processor.emotion_analyzer.submit(face_crop) is not None
+                result = None
+            else:
+                result = processor.emotion_analyzer.analyze(face_crop)
+                sent = result[0] is not None
+        # a referência só avança se a amostra foi de fato enviada/respondida
+        # (descartada por max_in_flight ou sem resposta: o próximo frame tenta de novo)
+        if dedup is not None and sent:
+            dedup.analyzed("emotion")
+        return {"target": target, "result": result}
+
+    def apply(self, processor, state, output):
+        if not state.record:
+            return
+        if output is not None:
+            if processor.emotion_sampler is not None:
+                processor.emotion_sampler.sampled(state.frame_idx)
+                processor._emotion_box = dict(output["target"])
+            if output["result"] is not None:
+                processor.apply_emotion(*output["result"])
+
+        # resultados assíncronos que chegaram desde o último frame
+        for emotion, conf in processor.emotion_analyzer.poll():
+            processor.apply_emotion(emotion, conf)
+
+
+@register_analyzer
+class ActivityNode(Analyzer):
+    """R4: atividade pelo movimento (frame differencing)."""
+
+    name = "activity"
+    inputs = ("blurred_gray",)
+
+    def needs_frame(self, processor, frame_idx):
+        return processor._activity_due(frame_idx)
+
+    def due(self, processor, state):
+        return processor._activity_due(state.frame_idx)
+
+    def run(self, processor, state):
+        with processor.timer.stage("activity"):
+            activity, motion = processor.activity_analyzer.analyze(state.frame, features=state.features)
+        return {"activity": activity, "motion": motion}
+
+    def apply(self, processor, state, output):
+        if output is None:
+            return
+        output["prev_motion"] = processor.last_motion
+        processor.last_activity = output["activity"]
+        processor.last_motion = output["motion"]
+        if state.record:
+            processor.context.register_activity(output["activity"], motion=float(output["motion"]),
+                                                frame_idx=state.frame_idx, time_sec=state.time_sec)
+
+
+@register_analyzer
+class AnomalyNode(Analyzer):
+    """R5: anomalias (desvio do padrão recente de movimento), com cooldown."""
+
+    name = "anomaly"
+    requires = ("activity",)
+
+    def due(self, processor, state):
+        return state.outputs.get("activity") is not None
+
+    def run(self, processor, state):
+        with processor.timer.stage("anomaly"):
+            return processor.anomaly_detector.update(state.outputs["activity"]["motion"])
+
+    def apply(self, processor, state, anomaly):
+        activity = state.outputs.get("activity")
+        if activity is None:
+            return
+        frame_idx, motion = state.frame_idx, activity["motion"]
+
+        if anomaly:
+            event = {
+                "frame": frame_idx,
+                "time_sec": state.time_sec,
+                "type": anomaly["type"],   # high_motion | low_motion
+                "z": anomaly["z"],
+                "motion": float(motion),
+                "activity": activity["activity"],
+            }
+            if state.record and processor.anomaly_candidates is not None:
+                processor.anomaly_candidates.append(event)
+
+            if (frame_idx - processor.last_anomaly_frame) >= processor.anomaly_cooldown_frames:
+                processor.last_anomaly_frame = frame_idx
+                processor.anomaly_overlay_until = frame_idx + processor.anomaly_overlay_frames
+                processor.anomaly_overlay_text = f"ANOMALY: {anomaly['type']} z={anomaly['z']:.2f}"
+                if state.record and processor.anomaly_candidates is None:
+                    processor.context.register_anomaly(event)
+
+        if processor.activity_sampler is not None:
+            prev_motion = activity["prev_motion"]
+            changed = bool(anomaly) or (prev_motion is not None and abs(motion - prev_motion) >= MOTION_CHANGE)
+            processor.activity_sampler.sampled(frame_idx, changed=changed, record=state.record)
+
+
+class FrameProcessor:
+    """
+    Processamento por frame (R2-R5) com o estado que antes vivia no closure
+    on_frame de main.py.
+
+    analyze() roda o grafo de analyzers (AnalyzerGraph: face, emotion,
+    activity, anomaly e plugins) sobre o frame limpo e devolve um resultado
+    (dict) com o que deve ser desenhado; __call__ faz analyze() seguido de
+    draw_overlays(), mantendo a assinatura on_frame do frame loop.
+
+    Com record=False (warm-up), o estado interno (rastreamento, movimento,
+    janela de anomalias, cooldown) avança normalmente, mas nada é registrado
+    no contexto e nenhuma emoção é solicitada.
+
+    Modo só análise: render=False faz __call__ devolver o frame sem
+    desenhar; needs_frame()/skip() permitem ao frame loop não decodificar
+    frames que nenhum estágio usa. Se `frame_results` for um arquivo aberto,
+    cada resultado é gravado como uma linha JSON (entrada de render.py); com
+    um `timeline` (TimelineWriter), também vira uma linha do timeline.
+
+    Frames com índice menor que `record_from` são tratados como warm-up
+    (analisados com record=False e não escritos; __call__ devolve None).
+
+    skip_emotion/skip_faces desligam os estágios opcionais (emoção; detecção
+    e rastreamento de faces, que passam a repetir as últimas caixas) quando
+    o modo ao vivo está atrasado.
+
+    Com um `deduplicator` (dedup.FrameDeduplicator), frames quase idênticos
+    ao último analisado repetem as faces e a emoção anteriores; atividade e
+    anomalias rodam normalmente (o movimento é sempre medido).
+
+    Com um `checkpointer` (checkpoint.Checkpointer), o estado é salvo
+    periodicamente antes de um frame, quando todos os anteriores terminaram,
+    e cada resultado também é repassado a ele (refaz o vídeo na retomada).
+    """
+
+    def __init__(
+        self,
+        context,
+        fps: float,
+        total_frames: int,
+        face_tracker,
+        emotion_analyzer,
+        activity_analyzer,
+        anomaly_detector,
+        emotion_async: bool = False,
+        render: bool = True,
+        graph: AnalyzerGraph = None,
+    ):
+        self.context = context
+        self.fps = fps
+        self.total_frames = total_frames
+
+        self.face_tracker = face_tracker
+        self.emotion_analyzer = emotion_analyzer
+        self.activity_analyzer = activity_analyzer
+        self.anomaly_detector = anomaly_detector
+        self.emotion_async = emotion_async
+        self.render = render
+        self.compositor = OverlayCompositor() if render else None
+
+        self.last_emotion = None
+        self.last_emotion_conf = None
+        # frame em que os resultados de emoção (inclusive assíncronos) são aplicados
+        self.current_frame = 0
+        self.current_time = 0.0
+        self.emotion_track_id = None  # face (track) acompanhada pela análise de emoção
+        self.emotion_target = None    # caixa dessa face no frame atual
+
+        self.last_activity = None
+        self.last_motion = None
+
+        self.anomaly_cooldown_frames = int(fps * ANOMALY_COOLDOWN_SEC)
+        self.anomaly_overlay_frames = int(fps * ANOMALY_OVERLAY_SEC)
+        self.last_anomaly_frame = -10**9
+        self.anomaly_overlay_until = -1
+        self.anomaly_overlay_text = None
+
+        # se for uma lista, recebe todas as anomalias antes do cooldown e
+        # nenhuma é registrada no contexto (quem forneceu a lista aplica o cooldown)
+        self.anomaly_candidates = None
+        # arquivo (modo texto) que recebe um resultado JSON por frame
+        self.frame_results = None
+        # timeline colunar por frame (timeline.TimelineWriter)
+        self.timeline = None
+        # primeiro frame registrado (os anteriores são warm-up)
+        self.record_from = 1
+        # latência por estágio (StageTimer); desligado por padrão
+        self.timer = NULL_TIMER
+        # destinos das conversões do frame, reaproveitados a cada frame (FrameFeatures)
+        self._feature_buffers = {}
+        # amostragem adaptativa (AdaptiveSampler); None = intervalos fixos
+        self.activity_sampler = None
+        self.emotion_sampler = None
+        self._last_face_count = 0
+        self._emotion_box = None
+
+        # estágios opcionais desligados pelo agendador do modo ao vivo (live.py)
+        self.skip_emotion = False
+        self.skip_faces = False
+        # frames quase duplicados (FrameDeduplicator); None = tudo é analisado
+        self.deduplicator = None
+
+        # analyzers por frame (ver analyzer_graph.py); saídas de analyzers
+        # extras (plugins) que devem ir para o resultado do frame ficam em `extra`
+        self.graph = graph or AnalyzerGraph([FaceNode(), EmotionNode(), ActivityNode(), AnomalyNode()])
+        self.extra = {}
+        # checkpoints periódicos (--checkpoint_sec/--resume)
+        self.checkpointer = None
+
+    def __call__(self, frame, frame_idx, time_sec):
+        if self.checkpointer is not None:
+            self.checkpointer.maybe_save(self, frame_idx)
+        if frame_idx < self.record_from:
+            self.analyze(frame, frame_idx, time_sec, record=False)
+            return None
+
+        result = self.analyze(frame, frame_idx, time_sec)
+        if not self.render:
+            return frame
+        with self.timer.stage("overlay"):
+            return draw_overlays(frame, result, fps=self.fps, total_frames=self.total_frames,
+                                 compositor=self.compositor)
+
+    def needs_frame(self, frame_idx: int) -> bool:
+        """True se algum estágio precisa dos pixels deste frame."""
+        return self.graph.needs_frame(self, frame_idx)
+
+    def _activity_due(self, frame_idx: int) -> bool:
+        if self.activity_sampler is None:
+            return frame_idx % ACTIVITY_EVERY_N_FRAMES == 0
+        return self.activity_sampler.due(frame_idx)
+
+    def _emotion_due(self, frame_idx: int) -> bool:
+        if self.emotion_sampler is None:
+            return frame_idx % EMOTION_EVERY_N_FRAMES == 0
+        return self.emotion_sampler.due(frame_idx)
+
+    def skip(self, frame_idx, time_sec) -> dict:
+        """
+        Frame não decodificado (modo só análise): as faces do último frame
+        analisado são repetidas e os resultados de emoção pendentes aplicados.
+        """
+        if self.checkpointer is not None:
+            self.checkpointer.maybe_save(self, frame_idx)
+        faces = self.face_tracker.hold()
+        if frame_idx < self.record_from:
+            return None
+        for sampler in (self.activity_sampler, self.emotion_sampler):
+            if sampler is not None:
+                sampler.observe(frame_idx)
+        self.current_frame, self.current_time = frame_idx, float(time_sec)
+        self.context.register_faces(len(faces))
+
+        for emotion, conf in self.emotion_analyzer.poll():
+            self.apply_emotion(emotion, conf)
+
+        return self._result(frame_idx, time_sec, faces)
+
+    def apply_emotion(self, emotion, conf):
+        if emotion:
+            if self.emotion_sampler is not None and self.last_emotion and emotion != self.last_emotion:
+                self.emotion_sampler.trigger(self.current_frame)
+            self.last_emotion = emotion
+            self.last_emotion_conf = conf
+            self.context.register_emotion(emotion, conf=conf, frame_idx=self.current_frame,
+                                          time_sec=self.current_time)
+
+    def finish(self):
+        """Aguarda as análises de emoção ainda em andamento."""
+        for emotion, conf in self.emotion_analyzer.drain():
+            self.apply_emotion(emotion, conf)
+        self.emotion_analyzer.close()
+        self.graph.close()
+
+    def analyze(self, frame, frame_idx, time_sec, record: bool = True) -> dict:
+        if record:
+            self.current_frame, self.current_time = frame_idx, float(time_sec)
+
+        # conversões do frame (RGB, reduzido, cinza) compartilhadas entre os estágios
+        features = FrameFeatures(frame, resize_width=self.activity_analyzer.resize_width,
+                                 buffers=self._feature_buffers)
+        if self.deduplicator is not None:
+            with self.timer.stage("dedup"):
+                self.deduplicator.observe(features)
+        state = FrameState(frame, frame_idx, float(time_sec), record, features)
+        self.graph.run(self, state)
+
+        if not record:
+            return None
+        return self._result(frame_idx, time_sec, state.outputs.get("face") or [])
+
+    def _observe_faces(self, frame_idx, faces, target, record):
+        # amostragem adaptativa: mudanças nas faces antecipam as próximas análises
+        for sampler in (self.activity_sampler, self.emotion_sampler):
+            if sampler is not None and record:
+                sampler.observe(frame_idx)
+
+        if len(faces) != self._last_face_count:
+            self._last_face_count = len(faces)
+            for sampler in (self.activity_sampler, self.emotion_sampler):
+                if sampler is not None:
+                    sampler.trigger(frame_idx)
+        elif self.emotion_sampler is not None and target is not None and self._emotion_box is not None:
+            box = self._emotion_box
+            if target["track_id"] != box["track_id"] or iou(target, box) < FACE_CHANGE_IOU:
+                self.emotion_sampler.trigger(frame_idx)
+                self._emotion_box = dict(target)
+
+    def _result(self, frame_idx, time_sec, faces) -> dict:
+        anomaly_text = None
+        if self.anomaly_overlay_text and frame_idx <= self.anomaly_overlay_until:
+            anomaly_text = self.anomaly_overlay_text
+
+        result = {
+            "frame": frame_idx,
+            "time_sec": float(time_sec),
+            "faces": faces,
+            "emotion": self.last_emotion,
+            "emotion_conf": self.last_emotion_conf,
+            "activity": self.last_activity,
+            "motion": self.last_motion,
+            "anomaly_text": anomaly_text,
+        }
+        if self.extra:
+            result["extra"] = dict(self.extra)
+        if self.frame_results is not None:
+            self.frame_results.write(json.dumps(result, ensure_ascii=False) + "\n")
+        if self.timeline is not None:
+            self.timeline.append(result)
+        if self.checkpointer is not None:
+            self.checkpointer.record(result)
+        return result
+
+    def stats(self) -> dict:
+        cache = self.emotion_analyzer.cache
+        return {
+            "face_tracking": self.face_tracker.stats(),
+            "emotion_requests": self.emotion_analyzer.stats(),
+            "emotion_cache": cache.stats() if cache is not None else None,
+            "timings": self.timer.report(),
+            "analyzers": self.graph.stats(),
+            "dedup": self.deduplicator.stats() if self.deduplicator is not None else None,
+            "adaptive_sampling": (
+                {"activity": self.activity_sampler.stats(), "emotion": self.emotion_sampler.stats()}
+                if self.activity_sampler is not None else None
+            ),
+        }
+
+
+def build_frame_processor(args, context, fps: float, total_frames: int, face_detector=None) -> FrameProcessor:
+    """
+    Monta detectores/analyzers a partir das opções de linha de comando
+    (argparse.Namespace de main.parse_args).
+    """
+    if face_detector is None:
+        # MediaPipe só é carregado aqui: quem já tem um detector (batch, testes) não precisa dele
+        from detectors.face_detector import FaceDetector
+        face_detector = FaceDetector(min_detection_confidence=0.4, model_selection=1)
+    # o detector pode vir pronto (batch reaproveita entre vídeos); a resolução é por execução
+    face_detector.detect_width = args.face_detect_width
+    face_tracker = FaceTracker(
+        face_detector,
+        detect_every=args.face_detect_every,
+        min_track_confidence=args.face_track_confidence,
+        roi_padding=args.face_roi_padding if args.face_roi else None,
+        full_sweep_every=args.face_full_sweep_every,
+    )
+
+    emotion_cache = None
+    if args.emotion_cache or args.emotion_cache_path:
+        emotion_cache = EmotionCache(
+            max_distance=args.emotion_cache_distance,
+            max_entries=args.emotion_cache_max_entries,
+            max_bytes=args.emotion_cache_max_bytes,
+            path=args.emotion_cache_path,
+        )
+
+    emotion_analyzer = EmotionAnalyzerOpenAI(
+        model="gpt-4o-mini",
+        cache=emotion_cache,
+        base_url=args.openai_base_url,
+        max_in_flight=args.emotion_max_inflight,
+        timeout=args.emotion_timeout,
+        batch_tiles=max(1, args.emotion_batch),
+        async_batch=args.emotion_batch if args.emotion_async else 1,
+        batch_wait=args.emotion_batch_wait,
+    )
+
+    activity_analyzer = ActivityAnalyzer()
+    anomaly_detector = AnomalyDetector(window_size=ANOMALY_WINDOW_SIZE, z_thresh=3.0, enable_low=True)
+
+    if args.analyzer_plugins:
+        load_plugins([m.strip() for m in args.analyzer_plugins.split(",") if m.strip()])
+    names = ([n.strip() for n in args.analyzers.split(",") if n.strip()]
+             if args.analyzers else list(ANALYZER_REGISTRY))
+    unknown = [n for n in names if n not in ANALYZER_REGISTRY]
+    if unknown:
+        raise RuntimeError(f"Analyzers desconhecidos: {', '.join(unknown)} "
+                           f"(registrados: {', '.join(ANALYZER_REGISTRY)})")
+
+    processor = FrameProcessor(
+        context,
+        fps,
+        total_frames,
+        face_tracker=face_tracker,
+        emotion_analyzer=emotion_analyzer,
+        activity_analyzer=activity_analyzer,
+        anomaly_detector=anomaly_detector,
+        emotion_async=args.emotion_async,
+        render=not args.no_video,
+    )
+    nodes = [node for node in (ANALYZER_REGISTRY[n].from_args(processor, args) for n in names) if node is not None]
+    processor.graph = AnalyzerGraph(nodes, threads=args.analyzer_threads)
+    if args.adaptive_sampling:
+        processor.activity_sampler = AdaptiveSampler(
+            ACTIVITY_EVERY_N_FRAMES, args.activity_interval_min, args.activity_interval_max, fps,
+        )
+        processor.emotion_sampler = AdaptiveSampler(
+            EMOTION_EVERY_N_FRAMES, args.emotion_interval_min, args.emotion_interval_max, fps,
+            budget_per_minute=args.emotion_budget_per_min,
+        )
+    if args.dedup:
+        processor.deduplicator = FrameDeduplicator(threshold=args.dedup_threshold)
+    if args.timings or args.prometheus_textfile:
+        processor.timer = StageTimer()
+        emotion_analyzer.timer = processor.timer
+    return processor
+
+
+def warmup_frames(face_detect_every: int) -> int:
+    """
+    Quantos frames antes do início de um segmento precisam ser processados
+    (sem registro) para que o estado fique igual ao da execução serial:
+      - ANOMALY_WINDOW_SIZE + 1 amostras de atividade (a primeira só
+        inicializa prev_gray e sai da janela)
+      - pelo menos um frame-chave de detecção facial
+    """
+    activity = (ANOMALY_WINDOW_SIZE + 1) * ACTIVITY_EVERY_N_FRAMES
+    return max(activity, face_detect_every)
+
+
+def resolve_frame_range(start_sec: Optional[float], end_sec: Optional[float], fps: float,
+                        total_frames: int) -> tuple:
+    """
+    Converte um intervalo em segundos nos índices (1-based, inclusivos) dos
+    frames cujo time_sec (= frame / fps) cai dentro dele.
+    end_frame=None: até o fim do arquivo (total de frames desconhecido).
+    """
+    eps = 1e-6  # evita que 0.1 * 30 = 3.0000000000000004 pule um frame
+    start_frame = 1
+    if start_sec is not None and start_sec > 0:
+        start_frame = max(1, math.ceil(start_sec * fps - eps))
+
+    end_frame = total_frames if total_frames > 0 else None
+    if end_sec is not None:
+        last = math.floor(end_sec * fps + eps)
+        end_frame = last if end_frame is None else min(end_frame, last)
+
+    if end_frame is not None and end_frame < start_frame:
+        raise RuntimeError(f"Intervalo vazio: --start {start_sec} / --end {end_sec}")
+    return start_frame, end_frame
@@ -1,5 +1,14 @@
+import math
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
 import cv2
 
+from writers import create_writer, output_geometry
+
 
 def open_video(video_path: str) -> cv2.VideoCapture:
     cap = cv2.VideoCapture(video_path)
@@ -8,6 +17,14 @@ def open_video(video_path: str) -> cv2.VideoCapture:
     return cap
 
 
+def open_stream(source: str) -> cv2.VideoCapture:
+    """Câmera (índice, ex: "0") ou stream (URL rtsp/http) para o modo ao vivo."""
+    cap = cv2.VideoCapture(int(source)) if source.isdigit() else cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Erro ao abrir a fonte ao vivo: {source}")
+    return cap
+
+
 def get_video_props(cap: cv2.VideoCapture) -> dict:
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -21,9 +38,133 @@ def get_video_props(cap: cv2.VideoCapture) -> dict:
     }
 
 
-def make_writer(output_path: str, fps: float, width: int, height: int) -> cv2.VideoWriter:
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    if not writer.isOpened():
-        raise RuntimeError(f"Erro ao criar VideoWriter em: {output_path}")
-    return writer
+def make_writer(output_path: str, fps: float, width: int, height: int, backend: str = "opencv", **options):
+    """
+    Writer de vídeo com write(frame)/release()/stats() (ver writers.py).
+
+      - backend: "opencv" (cv2.VideoWriter, mp4v) ou "ffmpeg" (processo
+        ffmpeg via pipe; codec/preset/crf/threads)
+      - out_width / out_fps: saída reduzida (resolução e/ou frames)
+      - segment_sec: um arquivo a cada N segundos (<nome>_000.mp4, ...)
+      - queue_size > 0: codifica em uma thread própria (write não bloqueia)
+
+    Sem opções, equivale ao cv2.VideoWriter mp4v de sempre.
+    """
+    return create_writer(output_path, fps, width, height, backend=backend, **options)
+
+
+def concat_copy(input_paths: list, output_path: str, ffmpeg: str = "ffmpeg") -> bool:
+    """
+    Junta os arquivos com o concat demuxer do ffmpeg, sem recodificar
+    (-c copy); todos precisam ter o mesmo codec, resolução e fps. Retorna
+    False se o ffmpeg não estiver instalado ou falhar.
+    """
+    binary = shutil.which(ffmpeg)
+    if binary is None:
+        return False
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    list_path = f"{output_path}.concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in input_paths:
+            escaped = str(Path(path).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        proc = subprocess.run(
+            [binary, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", output_path],
+            stderr=subprocess.PIPE,
+        )
+    finally:
+        os.remove(list_path)
+    if proc.returncode != 0:
+        print("[WARN] ffmpeg concat falhou:", proc.stderr.decode("utf-8", "replace").strip()[-300:])
+        return False
+    return True
+
+
+def concat_videos(input_paths: list, output_path: str, fps: float, width: int, height: int,
+                  **writer_options) -> dict:
+    """
+    Concatena as partes de um vídeo em um único arquivo, na ordem dada.
+
+    As partes devem ter sido gravadas com as mesmas opções de make_writer
+    (codec, redução de resolução/fps já aplicadas; ver PartWriter e
+    --workers): aí a junção é só uma cópia dos streams (concat_copy), sem
+    decodificar nem recodificar. `fps`/`width`/`height` são os do vídeo de
+    entrada. Com segment_sec (arquivos de N minutos) ou sem ffmpeg, os
+    frames das partes são decodificados e recodificados.
+    Retorna as estatísticas no formato de writer.stats() (+ "concat").
+    """
+    if not writer_options.get("segment_sec") and concat_copy(input_paths, output_path):
+        return {"backend": writer_options.get("backend", "opencv"), "paths": [output_path], "concat": "copy"}
+    if not writer_options.get("segment_sec"):
+        print("[WARN] ffmpeg indisponível para juntar as partes sem recodificar; recodificando")
+
+    # as partes já estão na resolução/fps de saída: só recodifica (e segmenta)
+    size, enc_fps = output_geometry(width, height, fps, writer_options.get("out_width"),
+                                    writer_options.get("out_fps"))
+    width, height = size or (width, height)
+    options = {**writer_options, "out_width": None, "out_fps": None}
+    writer = make_writer(output_path, enc_fps, width, height, **options)
+    frame = None
+    try:
+        for path in input_paths:
+            cap = open_video(path)
+            while True:
+                ret, frame = cap.read(frame) if frame is not None else cap.read()
+                if not ret:
+                    frame = None
+                    break
+                writer.write(frame)
+            cap.release()
+    finally:
+        writer.release()
+    return {**writer.stats(), "concat": "reencode"}
+
+
+def measure_seek_gap(cap: cv2.VideoCapture, first_frame: int, last_frame: int,
+                     probe_grabs: int = 30, probe_seeks: int = 3) -> Optional[int]:
+    """
+    Calibra, para este arquivo, a partir de quantos frames pulados um salto
+    com CAP_PROP_POS_FRAMES sai mais barato que cap.grab() sequencial.
+
+    Mede o custo médio de grab() e de um salto (seek + grab, que inclui a
+    decodificação desde o keyframe anterior) em alguns pontos do intervalo.
+    Retorna None se o container não suporta seek preciso ou se saltar nunca
+    compensa dentro do intervalo; nesses casos o loop só usa grab().
+    A posição de leitura é restaurada para first_frame.
+    """
+    start_pos = first_frame - 1
+    span = last_frame - first_frame + 1
+    if span <= 2 * probe_grabs:
+        return None
+
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_pos)
+        t0 = time.perf_counter()
+        grabbed = 0
+        for _ in range(probe_grabs):
+            if not cap.grab():
+                break
+            grabbed += 1
+        if grabbed == 0:
+            return None
+        grab_cost = (time.perf_counter() - t0) / grabbed
+
+        seek_cost = 0.0
+        for i in range(1, probe_seeks + 1):
+            target = start_pos + probe_grabs + (span - 2 * probe_grabs) * i // (probe_seeks + 1)
+            t0 = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            ok = cap.grab()
+            seek_cost += time.perf_counter() - t0
+            # a posição após o grab precisa ser exatamente target + 1
+            if not ok or int(round(cap.get(cv2.CAP_PROP_POS_FRAMES))) != target + 1:
+                print("[WARN] Seek impreciso neste vídeo; usando leitura sequencial")
+                return None
+        seek_cost /= probe_seeks
+    finally:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_pos)
+
+    gap = max(2, math.ceil(seek_cost / max(grab_cost, 1e-9)))
+    return gap if gap < span else None
@@ -0,0 +1,6 @@
+# Rótulos das categorias, sem dependências: usados pelos analyzers e pelas
+# ferramentas que só leem resultados (timeline.py), que assim não importam
+# OpenAI/OpenCV só para conhecer os nomes.
+
+ACTIVITY_LABELS = ("still", "talking", "gesturing")
+EMOTION_LABELS = ("neutral", "happy", "surprise", "sad", "fear", "disgust")
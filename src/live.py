@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from timing import NULL_TIMER
+
+
+class LiveSource:
+    """
+    Fonte ao vivo: uma thread lê a câmera/stream continuamente e mantém só
+    os `buffer_size` frames mais recentes; se o consumidor atrasa, os mais
+    antigos são descartados (como em uma câmera, que não espera).
+
+    replay=True usa um arquivo como câmera: os frames são liberados no ritmo
+    do relógio (1/fps por frame, multiplicado por `speed`).
+
+    read() devolve (frame_index, capture_time, frame), com capture_time em
+    time.monotonic(), ou None quando a fonte termina.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, fps: float, replay: bool = False,
+                 buffer_size: int = 2, speed: float = 1.0):
+        self.cap = cap
+        self.fps = fps
+        self.replay = replay
+        self.buffer_size = max(1, buffer_size)
+        self.speed = speed
+
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._ended = False
+        self.error = None
+
+        self.captured = 0
+        self.dropped = 0  # descartados pela fonte (buffer cheio)
+
+        self._thread = threading.Thread(target=self._run, name="live-source", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start = time.monotonic()
+        frame_idx = 0
+        try:
+            while not self._stop.is_set():
+                if self.replay:
+                    # instante em que a "câmera" entregaria o próximo frame
+                    due = start + frame_idx / (self.fps * self.speed)
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                frame_idx += 1
+                captured_at = due if self.replay else time.monotonic()
+
+                with self._cond:
+                    if len(self._frames) >= self.buffer_size:
+                        self._frames.popleft()
+                        self.dropped += 1
+                    self._frames.append((frame_idx, captured_at, frame))
+                    self.captured += 1
+                    self._cond.notify()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def read(self):
+        with self._cond:
+            while not self._frames and not self._ended:
+                self._cond.wait(0.1)
+            if self._frames:
+                return self._frames.popleft()
+        if self.error is not None:
+            raise self.error
+        return None
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self.cap.release()
+
+
+class DeadlineScheduler:
+    """
+    Decide, a cada frame, o quanto do processamento cabe no prazo, a partir
+    do atraso (agora - instante de captura) em múltiplos do orçamento por
+    frame (1/fps):
+
+      nível 0: tudo
+      nível 1: sem emoção                (atraso > emotion_lag orçamentos)
+      nível 2: sem emoção e sem faces    (atraso > faces_lag)
+      nível 3: frame descartado          (atraso > drop_lag)
+
+    A piora é imediata; a melhora desce um nível por vez, só quando o atraso
+    fica abaixo da metade do limite do nível atual (evita oscilar).
+    """
+
+    LEVELS = ("full", "no_emotion", "no_faces", "drop")
+
+    def __init__(self, fps: float, emotion_lag: float = 1.0, faces_lag: float = 2.0, drop_lag: float = 4.0):
+        self.budget = 1.0 / fps if fps > 0 else 1.0 / 30.0
+        self.limits = (emotion_lag * self.budget, faces_lag * self.budget, drop_lag * self.budget)
+        self.level = 0
+
+        self.level_counts = [0] * len(self.LEVELS)
+        self.deadline_misses = 0
+        self._lags = []
+        self._work = []
+
+    def decide(self, lag: float) -> int:
+        target = sum(1 for limit in self.limits if lag > limit)
+        if target > self.level:
+            self.level = target
+        elif target < self.level and lag < 0.5 * self.limits[self.level - 1]:
+            self.level -= 1
+        self.level_counts[self.level] += 1
+        self._lags.append(lag)
+        return self.level
+
+    def record_work(self, seconds: float):
+        self._work.append(seconds)
+        if seconds > self.budget:
+            self.deadline_misses += 1
+
+    def stats(self) -> dict:
+        lags = np.asarray(self._lags, dtype=float) * 1000.0
+        work = np.asarray(self._work, dtype=float) * 1000.0
+
+        def pct(arr, q):
+            return float(np.percentile(arr, q)) if len(arr) else None
+
+        return {
+            "budget_ms": 1000.0 * self.budget,
+            "levels": dict(zip(self.LEVELS, self.level_counts)),
+            "deadline_misses": self.deadline_misses,
+            "lag_ms": {"p50": pct(lags, 50), "p99": pct(lags, 99),
+                       "max": float(lags.max()) if len(lags) else None},
+            "work_ms": {"p50": pct(work, 50), "p99": pct(work, 99),
+                        "max": float(work.max()) if len(work) else None},
+        }
+
+
+def process_live(source: LiveSource, processor, writer=None, scheduler: DeadlineScheduler = None,
+                 duration: float = None, timer=None) -> dict:
+    """
+    Loop do modo ao vivo: processa os frames da fonte conforme o nível
+    decidido pelo agendador. Frames descartados (pelo agendador ou pela
+    fonte) passam por processor.skip() — as contagens continuam por frame —
+    e não são escritos no vídeo.
+
+    Termina no fim da fonte, após `duration` segundos ou com Ctrl+C.
+    Retorna as estatísticas (frames, descartes e atraso).
+    """
+    scheduler = scheduler or DeadlineScheduler(source.fps)
+    timer = timer or NULL_TIMER
+    fps = source.fps
+
+    seen = processed = dropped = source_gaps = 0
+    last_idx = 0
+    started = time.monotonic()
+
+    try:
+        while duration is None or time.monotonic() - started < duration:
+            item = source.read()
+            if item is None:
+                break
+            frame_idx, captured_at, frame = item
+
+            # frames que a fonte descartou (buffer cheio)
+            for missing in range(last_idx + 1, frame_idx):
+                processor.skip(missing, missing / fps)
+                source_gaps += 1
+            last_idx = frame_idx
+            seen += 1
+
+            level = scheduler.decide(time.monotonic() - captured_at)
+            if level >= 3:
+                processor.skip(frame_idx, frame_idx / fps)
+                dropped += 1
+                continue
+
+            processor.skip_emotion = level >= 1
+            processor.skip_faces = level >= 2
+
+            t0 = time.monotonic()
+            out = processor(frame, frame_idx, frame_idx / fps)
+            if writer is not None and out is not None:
+                with timer.stage("write"):
+                    writer.write(out)
+            scheduler.record_work(time.monotonic() - t0)
+            processed += 1
+    except KeyboardInterrupt:
+        print("[WARN] Interrompido; finalizando o modo ao vivo")
+    finally:
+        processor.skip_emotion = processor.skip_faces = False
+
+    elapsed = time.monotonic() - started
+    return {
+        "frames": last_idx,
+        "frames_received": seen,
+        "frames_processed": processed,
+        "frames_dropped": dropped,
+        "frames_dropped_by_source": source_gaps,
+        "drop_rate": (dropped + source_gaps) / last_idx if last_idx else 0.0,
+        "elapsed_sec": elapsed,
+        "processed_fps": processed / elapsed if elapsed > 0 else 0.0,
+        **scheduler.stats(),
+    }
@@ -1,66 +1,51 @@
 import argparse
+import shutil
 from pathlib import Path
 import cv2
 
-from io_video import open_video, get_video_props, make_writer
-from frame_loop import process_video_frames
+from io_video import open_video, open_stream, get_video_props, make_writer, measure_seek_gap, concat_videos
+from frame_loop import FramePool, process_video_frames
+from writers import output_size, writer_options
+from options import add_analysis_args
+from live import LiveSource, DeadlineScheduler, process_live
 from report import write_report
 
 from context import VideoAnalysisContext
-from detectors.face_detector import FaceDetector
-
-from analyzers.emotion_analyzer_openai import EmotionAnalyzerOpenAI
-from analyzers.activity_analyzer import ActivityAnalyzer
-from analyzers.anomaly_detector import AnomalyDetector
+from event_sink import EventSink, iter_events
+from timing import write_prometheus_textfile
+from frame_processor import ACTIVITY_EVERY_N_FRAMES, build_frame_processor, resolve_frame_range, warmup_frames
+from sharding import process_video_sharded
 from summary import build_summary
+from timeline import TimelineWriter
+from checkpoint import Checkpointer, PartWriter, load_checkpoint, restore_processor, truncate_file
 
 
 
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--video", required=True, help="Caminho do vídeo de entrada (ex: data/sample_video.mp4)")
     p.add_argument("--out_video", default="outputs/annotated.mp4", help="Caminho do vídeo anotado")
     p.add_argument("--out_report", default="outputs/report.json", help="Caminho do relatório final")
-    return p.parse_args()
-
-
-def overlay_basic(frame, frame_idx: int, time_sec: float, fps: float, total_frames: int):
-    total_str = str(total_frames) if total_frames > 0 else "?"
-    line1 = f"Frame: {frame_idx} / {total_str}"
-    line2 = f"Time: {time_sec:.2f}s | FPS: {fps:.2f}"
-
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    scale = 1.3
-    thickness = 3
-    color = (0, 0, 255)  # vermelho (BGR)
-
-    x, y = 20, 50
-    line_gap = 45
-
-    (w1, h1), _ = cv2.getTextSize(line1, font, scale, thickness)
-    (w2, h2), _ = cv2.getTextSize(line2, font, scale, thickness)
-    w = max(w1, w2)
-
-    pad = 12
-    cv2.rectangle(
-        frame,
-        (x - pad, y - h1 - pad),
-        (x + w + pad, y + h2 + pad + line_gap),
-        (0, 0, 0),
-        -1,
-    )
+    p.add_argument("--frame_results", default=None,
+                   help="Salva os resultados por frame (JSONL) para gerar o vídeo depois com render.py")
+    add_analysis_args(p)
+    return p.parse_args(argv)
 
-    cv2.putText(frame, line1, (x, y), font, scale, color, thickness, cv2.LINE_AA)
-    cv2.putText(frame, line2, (x, y + line_gap), font, scale, color, thickness, cv2.LINE_AA)
-    return frame
 
+def analyze_video(args, face_detector=None) -> dict:
+    """
+    Analisa um vídeo (args no formato de parse_args), grava o relatório em
+    args.out_report e devolve o conteúdo do relatório.
 
-def main():
-    args = parse_args()
-    Path("outputs").mkdir(exist_ok=True)
+    face_detector: FaceDetector já carregado, reaproveitado entre vídeos
+    (ex: workers de batch.py); ignorado no modo --workers.
+    """
+    live = args.live or args.replay
+    if live and (args.workers > 1 or args.sparse or args.pipeline or args.start or args.end is not None):
+        raise RuntimeError("Modo ao vivo não combina com --workers, --sparse, --pipeline, --start ou --end")
 
     # --- vídeo input ---
-    cap = open_video(args.video)
+    cap = open_stream(args.video) if args.live else open_video(args.video)
     props = get_video_props(cap)
 
     fps = props.get("fps", 0) or 0
@@ -71,162 +56,170 @@ def main():
     width = props["width"]
     height = props["height"]
 
-    writer = make_writer(args.out_video, fps, width, height)
-
-    # --- contexto ---
-    context = VideoAnalysisContext()
-
-    # --- detectores/analyzers ---
-    face_detector = FaceDetector(min_detection_confidence=0.4, model_selection=1)
-
-    emotion_analyzer = EmotionAnalyzerOpenAI(model="gpt-4o-mini")
-    EMOTION_EVERY_N_FRAMES = 30
-    last_emotion = None
-    last_emotion_conf = None
-
-    activity_analyzer = ActivityAnalyzer()
-    ACTIVITY_EVERY_N_FRAMES = 5
-    last_activity = None
-    last_motion = None
-
-    anomaly_detector = AnomalyDetector(window_size=60, z_thresh=3.0, enable_low=True)
-    ANOMALY_COOLDOWN_FRAMES = int(fps * 1.0)      # 1s
-    ANOMALY_OVERLAY_FRAMES = int(fps * 2.0)       # 2s
-    last_anomaly_frame = -10**9
-    anomaly_overlay_until = -1
-    anomaly_overlay_text = None
-
-    def on_frame(frame, frame_idx, time_sec):
-        nonlocal last_emotion, last_emotion_conf
-        nonlocal last_activity, last_motion
-        nonlocal last_anomaly_frame, anomaly_overlay_until, anomaly_overlay_text
-
-        # frame "limpo" (sem overlay) para atividade/anomalia
-        raw_frame = frame.copy()
-
-        # overlay base (informações)
-        frame = overlay_basic(frame, frame_idx, time_sec, fps=fps, total_frames=total_frames)
-
-        # -------- R2: Faces --------
-        faces = face_detector.detect(raw_frame)  # detecta no frame limpo
-        context.register_faces(len(faces))
-
-        largest = None
-        largest_area = 0
-
-        for f in faces:
-            x1, y1, x2, y2 = f["x1"], f["y1"], f["x2"], f["y2"]
-            score = f["score"]
-            area = max(0, (x2 - x1)) * max(0, (y2 - y1))
-
-            if area > largest_area:
-                largest_area = area
-                largest = f
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(
-                frame,
-                f"face {score:.2f}",
-                (x1, max(20, y1 - 10)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (0, 255, 0),
-                2,
-                cv2.LINE_AA,
-            )
-
-        # -------- R3: Emoções (OpenAI) --------
-        if largest is not None and (frame_idx % EMOTION_EVERY_N_FRAMES == 0):
-            x1, y1, x2, y2 = largest["x1"], largest["y1"], largest["x2"], largest["y2"]
-            face_crop = raw_frame[y1:y2, x1:x2].copy()
-
-            emotion, conf = emotion_analyzer.analyze(face_crop)
-            if emotion:
-                last_emotion = emotion
-                last_emotion_conf = conf
-                context.register_emotion(emotion)
-
-        if last_emotion:
-            txt = f"emotion: {last_emotion}"
-            if last_emotion_conf is not None:
-                txt += f" ({last_emotion_conf:.2f})"
-            cv2.putText(
-                frame,
-                txt,
-                (20, 300),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1.0,
-                (0, 0, 255),
-                3,
-                cv2.LINE_AA,
-            )
-
-        # -------- R4: Atividades (movimento) --------
-        if frame_idx % ACTIVITY_EVERY_N_FRAMES == 0:
-            activity, motion = activity_analyzer.analyze(raw_frame)
-            last_activity = activity
-            last_motion = motion
-            context.register_activity(activity)
-
-            # -------- R5: Anomalias (desvio do padrão recente) --------
-            anomaly = anomaly_detector.update(motion)
-            if anomaly and (frame_idx - last_anomaly_frame) >= ANOMALY_COOLDOWN_FRAMES:
-                last_anomaly_frame = frame_idx
-
-                anomaly_overlay_until = frame_idx + ANOMALY_OVERLAY_FRAMES
-                anomaly_overlay_text = f"ANOMALY: {anomaly['type']} z={anomaly['z']:.2f}"
-
-                event = {
-                    "frame": frame_idx,
-                    "time_sec": float(time_sec),
-                    "type": anomaly["type"],   # high_motion | low_motion
-                    "z": anomaly["z"],
-                    "motion": float(motion),
-                    "activity": activity,
-                }
-                context.register_anomaly(event)
-
-        if last_activity:
-            txt = f"activity: {last_activity}"
-            if last_motion is not None:
-                txt += f" | motion={last_motion:.4f}"
-            cv2.putText(
-                frame,
-                txt,
-                (20, 350),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1.0,
-                (0, 0, 255),
-                3,
-                cv2.LINE_AA,
-            )
-
-        # overlay persistente da anomalia
-        if anomaly_overlay_text and frame_idx <= anomaly_overlay_until:
-            cv2.putText(
-                frame,
-                anomaly_overlay_text,
-                (20, 420),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1.1,
-                (0, 0, 255),
-                4,
-                cv2.LINE_AA,
+    if args.sparse and not args.no_video:
+        raise RuntimeError("--sparse exige --no-video (o vídeo anotado precisa de todos os frames)")
+
+    # intervalo de análise: os índices/tempos continuam sendo os do arquivo
+    start_frame, end_frame = resolve_frame_range(args.start, args.end, fps, total_frames)
+    # frames antes do início reconstroem o estado (janela de anomalias, faces)
+    warmup_start = max(1, start_frame - warmup_frames(args.face_detect_every)) if start_frame > 1 else 1
+
+    # checkpoints: só no loop serial (um frame por vez, escrita no próprio loop)
+    checkpoint_path = args.checkpoint or str(Path(args.out_report).with_suffix(".checkpoint"))
+    checkpointing = bool(args.checkpoint_sec or args.resume)
+    if checkpointing and (live or args.workers > 1 or args.pipeline):
+        raise RuntimeError("--checkpoint_sec/--resume não combinam com --workers, --pipeline ou modo ao vivo")
+    resume = load_checkpoint(checkpoint_path, args) if args.resume else None
+    if args.resume and resume is None:
+        print(f"[WARN] Checkpoint não encontrado ({checkpoint_path}); começando do início")
+
+    # eventos vão para o JSONL durante a análise; em memória ficam só os agregados
+    events_path = args.events or str(Path(args.out_report).with_suffix(".events.jsonl"))
+    sink = EventSink(events_path, flush_interval=args.events_flush_sec,
+                     resume=resume["events"] if resume else None)
+    timeline_path = args.timeline or str(Path(args.out_report).with_suffix(".timeline.json"))
+    try:
+        if args.workers > 1:
+            # --- processamento paralelo por segmentos de tempo ---
+            cap.release()
+            processed_frames, context, stats = process_video_sharded(
+                args, fps, total_frames, width, height,
+                first_frame=start_frame, last_frame=end_frame, sink=sink, timeline_path=timeline_path,
             )
-
-        return frame
-
-    processed_frames = process_video_frames(
-        cap=cap,
-        writer=writer,
-        fps=fps,
-        total_frames=total_frames,
-        on_frame=on_frame,
-    )
-
-    cap.release()
-    writer.release()
-    cv2.destroyAllWindows()
+        else:
+            writer = None
+            if not args.no_video:
+                Path(args.out_video).parent.mkdir(parents=True, exist_ok=True)
+                options = writer_options(args)
+                if args.pipeline:
+                    options["queue_size"] = 0  # o pipeline já codifica em uma thread própria
+                if checkpointing:
+                    # partes com `options`, de até --checkpoint_part_minutes, juntadas sem recodificar no fim
+                    out = Path(args.out_video)
+                    writer = PartWriter(out.parent / f".parts_{out.stem}", fps, width, height,
+                                        part_sec=60.0 * args.checkpoint_part_minutes, options=options,
+                                        resume=resume["video"] if resume else None)
+                else:
+                    writer = make_writer(args.out_video, fps, width, height, **options)
+
+            # --- contexto ---
+            timeline = TimelineWriter(timeline_path, fps, resume=resume.get("timeline") if resume else None)
+            context = VideoAnalysisContext(sink=sink, timeline=timeline)
+
+            # --- detectores/analyzers ---
+            processor = build_frame_processor(args, context, fps, total_frames, face_detector=face_detector)
+            processor.record_from = start_frame
+            processor.timeline = timeline
+
+            frame_results = None
+            if args.frame_results:
+                Path(args.frame_results).parent.mkdir(parents=True, exist_ok=True)
+                if resume and resume["frame_results_offset"] is not None:
+                    truncate_file(args.frame_results, resume["frame_results_offset"])
+                    frame_results = open(args.frame_results, "a", encoding="utf-8")
+                else:
+                    frame_results = open(args.frame_results, "w", encoding="utf-8")
+                processor.frame_results = frame_results
+
+            checkpointer = None
+            if checkpointing:
+                checkpointer = Checkpointer(checkpoint_path, args.checkpoint_sec or 5.0, args, sink=sink,
+                                            frame_results=frame_results, writer=writer, timeline=timeline,
+                                            cache=processor.emotion_analyzer.cache, resume=resume)
+                processor.checkpointer = checkpointer
+
+            # retomada: o estado vem do checkpoint e o loop segue do próximo frame
+            loop_start = warmup_start
+            if resume:
+                restore_processor(processor, resume["state"])
+                loop_start = resume["next_frame"]
+                if writer is not None:
+                    # a parte que estava em andamento é redesenhada a partir dos resultados salvos
+                    writer.replay(args.video, total_frames)
+
+            seek_gap = measured_gap = None
+            if args.sparse and end_frame is not None:
+                seek_gap = measured_gap = measure_seek_gap(cap, loop_start, end_frame)
+                if (seek_gap is not None and seek_gap > ACTIVITY_EVERY_N_FRAMES and processor.activity_sampler is None
+                        and any(a.name == "activity" for a in processor.graph.analyzers)):
+                    # atividade em cadência fixa: nenhum trecho sem frames usados chega ao limiar
+                    print(f"[WARN] --sparse: a atividade usa um frame a cada {ACTIVITY_EVERY_N_FRAMES} e o salto só "
+                          f"compensa a partir de {seek_gap} frames sem uso; nenhum trecho será saltado "
+                          f"(desligue a atividade com --analyzers face,emotion ou use --adaptive_sampling)")
+                    seek_gap = None
+
+            try:
+                if live:
+                    # --- modo ao vivo: prazo por frame, estágios opcionais cedem primeiro ---
+                    source = LiveSource(cap, fps, replay=args.replay, buffer_size=args.live_buffer)
+                    try:
+                        live_stats = process_live(source, processor, writer=writer,
+                                                  scheduler=DeadlineScheduler(fps),
+                                                  duration=args.live_duration, timer=processor.timer)
+                    finally:
+                        source.close()
+                    walked = live_stats["frames"]
+                else:
+                    walked = process_video_frames(
+                        cap=cap,
+                        writer=writer,
+                        fps=fps,
+                        total_frames=total_frames,
+                        on_frame=processor,
+                        pipelined=args.pipeline,
+                        queue_size=args.queue_size,
+                        # só análise: frames que nenhum estágio usa não são decodificados
+                        needs_frame=processor.needs_frame if args.no_video else None,
+                        on_skip=processor.skip,
+                        first_frame=loop_start,
+                        last_frame=end_frame,
+                        seek_gap=seek_gap,
+                        timer=processor.timer,
+                        pool=FramePool(),
+                    )
+            finally:
+                if frame_results is not None:
+                    frame_results.close()
+
+            # frames percorridos antes da retomada também contam
+            processed_frames = max(0, walked + (loop_start - warmup_start) - (start_frame - warmup_start))
+
+            cap.release()
+            if writer is not None:
+                writer.release()
+                if checkpointing:
+                    parts = writer.stats()["paths"]
+                    stats_writer = concat_videos(parts, args.out_video, fps, width, height, **writer_options(args))
+                    stats_writer["parts"] = len(parts)
+                    stats_writer["frames_received"] = writer.frames
+                    shutil.rmtree(writer.parts_dir, ignore_errors=True)
+                else:
+                    stats_writer = writer.stats()
+                stats_writer["bytes"] = output_size(stats_writer["paths"])
+            cv2.destroyAllWindows()
+
+            # aguarda as análises de emoção ainda em andamento
+            processor.finish()
+            timeline.close(processed_frames=processed_frames)
+            if processor.emotion_analyzer.cache is not None:
+                processor.emotion_analyzer.cache.save()
+            stats = processor.stats()
+            if args.sparse:
+                stats["sparse"] = {"seek_gap": measured_gap, "seeking": seek_gap is not None}
+            if live:
+                stats["live"] = live_stats
+            if writer is not None:
+                stats["writer"] = stats_writer
+            stats["timeline"] = timeline.stats()
+            if checkpointer is not None:
+                stats["checkpoint"] = {**checkpointer.stats(), "resumed_at": resume["next_frame"] if resume else None}
+    finally:
+        sink.close()
+    stats["events_stream"] = sink.stats()
+
+    if args.prometheus_textfile:
+        write_prometheus_textfile(args.prometheus_textfile, stats["timings"],
+                                  labels={"video": Path(args.video).name})
 
     summary = build_summary(
     processed_frames=processed_frames,
@@ -234,27 +227,48 @@ def main():
     emotions=dict(context.emotion_counts),
     activities=dict(context.activity_counts),
     anomalies=context.anomalies,
+    anomalies_count=context.anomalies_count,
     )
 
-    write_report(
-        args.out_report,
-        {
-            "input_video": args.video,
-            "output_video": args.out_video,
-            "total_frames_analyzed": processed_frames,
-            "frames_with_face_detected": context.frames_with_face,
-            "total_face_detections": context.total_face_detections,
-            "emotions": dict(context.emotion_counts),
-            "activities": dict(context.activity_counts),
-            "anomalies_count": len(context.anomalies),
-            "anomalies": context.anomalies,
-            "summary": summary,
+    report = {
+        "input_video": args.video,
+        "output_video": None if args.no_video else args.out_video,
+        "range": {
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "start_sec": start_frame / fps,
+            "end_sec": end_frame / fps if end_frame is not None else None,
         },
-    )
+        "total_frames_analyzed": processed_frames,
+        "frames_with_face_detected": context.frames_with_face,
+        "total_face_detections": context.total_face_detections,
+        "emotions": dict(context.emotion_counts),
+        "activities": dict(context.activity_counts),
+        "anomalies_count": context.anomalies_count,
+        **stats,
+        "summary": summary,
+    }
+    # lista completa de anomalias lida do stream, sem carregá-la em memória
+    write_report(args.out_report, report, streams={"anomalies": iter_events(events_path, "anomaly")})
+    if checkpointing:
+        checkpointer.discard()
+    return report
+
+
+def main():
+    args = parse_args()
+    Path("outputs").mkdir(exist_ok=True)
+
+    report = analyze_video(args)
 
     print("OK!")
-    print(f"Frames analisados: {processed_frames}")
-    print(f"Vídeo gerado: {args.out_video}")
+    print(f"Frames analisados: {report['total_frames_analyzed']}")
+    if not args.no_video:
+        print(f"Vídeo gerado: {args.out_video}")
+    if args.frame_results:
+        print(f"Resultados por frame: {args.frame_results}")
+    print(f"Eventos: {report['events_stream']['path']}")
+    print(f"Timeline: {report['timeline']['path']}")
     print(f"Relatório gerado: {args.out_report}")
 
 
@@ -0,0 +1,167 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Imita o endpoint POST /v1/chat/completions da OpenAI, com latência e
+    erros injetados. Usado para testar o EmotionAnalyzerOpenAI sem rede.
+    """
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += len(raw)
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if server.error_rate > 0 and server.rng.random() < server.error_rate:
+            status = server.rng.choice([429, 500, 503])
+            self._send_json(status, {"error": {"message": "injected error", "code": status}})
+            return
+
+        try:
+            req = json.loads(raw)
+        except Exception:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+
+        content = server.reply_fn(req) if server.reply_fn else json.dumps(
+            {"emotion": server.emotion, "confidence": 0.9}
+        )
+
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-stub-{server.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": req.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+
+def mosaic_reply_fn(emotions=("neutral", "happy", "sad"), malformed_rate: float = 0.0, seed: int = 0):
+    """
+    reply_fn para start_stub_server que entende os pedidos em mosaico do
+    EmotionAnalyzerOpenAI.analyze_batch: responde um array JSON com um item
+    por tile (o número de tiles vem do prompt) e um objeto simples para os
+    pedidos de um recorte. Os rótulos seguem `emotions` em ciclo pelo tile.
+    Com `malformed_rate`, essa fração das respostas em mosaico vem inválida
+    (array truncado), para exercitar o fallback recorte a recorte.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def reply(req: dict) -> str:
+        text = ""
+        for msg in req.get("messages", []):
+            content = msg.get("content")
+            for part in content if isinstance(content, list) else []:
+                if part.get("type") == "text":
+                    text += part.get("text", "")
+
+        m = re.search(r"mosaico de (\d+) rostos", text)
+        if not m:
+            return json.dumps({"emotion": emotions[0], "confidence": 0.9})
+        n = int(m.group(1))
+        items = [{"tile": i, "emotion": emotions[i % len(emotions)], "confidence": 0.8} for i in range(n)]
+        with lock:
+            malformed = malformed_rate > 0 and rng.random() < malformed_rate
+        if malformed:
+            items = items[:-1]
+        return json.dumps(items)
+
+    return reply
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                      error_rate: float = 0.0, emotion: str = "neutral",
+                      reply_fn=None, seed: int = 0, verbose: bool = False):
+    """
+    Sobe o servidor stub em uma thread e retorna (server, base_url).
+    port=0 escolhe uma porta livre. reply_fn(request_json) -> str permite
+    customizar o conteúdo da resposta do modelo.
+    Para encerrar: server.shutdown(); server.server_close().
+    """
+    server = ThreadingHTTPServer((host, port), _StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.emotion = emotion
+    server.reply_fn = reply_fn
+    server.rng = random.Random(seed)
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bytes_received = 0
+
+    t = threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True)
+    t.start()
+
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Servidor stub do endpoint chat/completions da OpenAI")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8089)
+    p.add_argument("--latency", type=float, default=0.5, help="Latência injetada por requisição (s)")
+    p.add_argument("--error_rate", type=float, default=0.0, help="Fração de respostas 429/5xx")
+    p.add_argument("--emotion", default="neutral")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    server, base_url = start_stub_server(
+        args.host, args.port, args.latency, args.error_rate, args.emotion, verbose=True
+    )
+    print(f"Stub OpenAI em {base_url} (Ctrl+C para encerrar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+
+from writers import WRITER_BACKENDS
+
+
+def add_analysis_args(p: argparse.ArgumentParser):
+    """Opções de análise comuns a main.py e batch.py (tudo menos entradas/saídas)."""
+    p.add_argument("--no-video", dest="no_video", action="store_true",
+                   help="Modo só análise: não desenha overlays nem gera vídeo (apenas o relatório)")
+    p.add_argument("--start", type=float, default=None,
+                   help="Analisa a partir deste instante (s)")
+    p.add_argument("--end", type=float, default=None,
+                   help="Analisa até este instante (s)")
+    p.add_argument("--sparse", action="store_true",
+                   help="Só análise: salta (seek) trechos sem frames usados quando compensar em relação a grab()")
+    p.add_argument("--live", action="store_true",
+                   help="Modo ao vivo: --video é o índice da câmera (ex: 0) ou a URL do stream")
+    p.add_argument("--replay", action="store_true",
+                   help="Modo ao vivo usando o arquivo de --video, liberado no ritmo do relógio (testes)")
+    p.add_argument("--live_duration", type=float, default=None,
+                   help="Encerra o modo ao vivo após N segundos (padrão: fim da fonte ou Ctrl+C)")
+    p.add_argument("--live_buffer", type=int, default=2,
+                   help="Frames mantidos pela fonte ao vivo; os mais antigos são descartados")
+    p.add_argument("--writer", choices=WRITER_BACKENDS, default="opencv",
+                   help="Backend do vídeo anotado: opencv (mp4v) ou ffmpeg (processo ffmpeg via pipe)")
+    p.add_argument("--writer_codec", default=None,
+                   help="Codec do backend (ffmpeg: ex. libx264, libx265, h264_nvenc; opencv: FourCC, ex. mp4v)")
+    p.add_argument("--writer_preset", default="veryfast", help="Preset do codec (ffmpeg)")
+    p.add_argument("--writer_crf", type=int, default=23, help="Qualidade CRF (ffmpeg; menor = melhor)")
+    p.add_argument("--writer_threads", type=int, default=0, help="Threads do codificador (ffmpeg; 0 = automático)")
+    p.add_argument("--writer_queue", type=int, default=8,
+                   help="Frames na fila da thread de codificação (0 = codifica no próprio loop)")
+    p.add_argument("--out_width", type=int, default=None,
+                   help="Largura do vídeo anotado (reduzido; a altura segue a proporção)")
+    p.add_argument("--out_fps", type=float, default=None,
+                   help="FPS do vídeo anotado (reduzido: frames são descartados de forma uniforme)")
+    p.add_argument("--segment_minutes", type=float, default=None,
+                   help="Divide o vídeo anotado em arquivos de N minutos (<nome>_000.mp4, ...)")
+    p.add_argument("--pipeline", action="store_true",
+                   help="Executa decode, análise e encode em threads separadas (pipeline)")
+    p.add_argument("--queue_size", type=int, default=8,
+                   help="Tamanho das filas entre os estágios do pipeline")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Divide o vídeo em N segmentos de tempo processados em processos separados")
+    p.add_argument("--analyzers", default=None,
+                   help="Analyzers por frame, separados por vírgula (padrão: todos os registrados: "
+                        "face,emotion,activity,anomaly e os de --analyzer_plugins)")
+    p.add_argument("--analyzer_plugins", default=None,
+                   help="Módulos importados antes de montar o grafo (registram analyzers extras)")
+    p.add_argument("--analyzer_threads", type=int, default=0,
+                   help="Threads extras para rodar analyzers independentes do mesmo frame em paralelo "
+                        "(padrão 0 = em sequência)")
+    p.add_argument("--face_detect_every", type=int, default=1,
+                   help="Roda a detecção facial completa a cada N frames e rastreia as faces entre elas")
+    p.add_argument("--face_track_confidence", type=float, default=0.6,
+                   help="Confiança mínima do rastreamento antes de forçar nova detecção")
+    p.add_argument("--face_detect_width", type=int, default=None,
+                   help="Largura em que a detecção facial roda (ex: 640); padrão: resolução original")
+    p.add_argument("--face_roi", action="store_true",
+                   help="Detecta só ao redor das faces atuais, com varredura completa periódica")
+    p.add_argument("--face_roi_padding", type=float, default=0.5,
+                   help="Margem das regiões de --face_roi (fração do lado maior da face)")
+    p.add_argument("--face_full_sweep_every", type=int, default=30,
+                   help="Intervalo máximo entre varreduras do frame inteiro com --face_roi (frames)")
+    p.add_argument("--emotion_async", action="store_true",
+                   help="Envia as análises de emoção sem bloquear o loop de frames")
+    p.add_argument("--emotion_max_inflight", type=int, default=2,
+                   help="Máximo de requisições de emoção em andamento (modo assíncrono)")
+    p.add_argument("--emotion_batch", type=int, default=1,
+                   help="Com --emotion_async, acumula até N recortes e os envia juntos em um mosaico "
+                        "(uma requisição por lote; 1 = uma requisição por recorte)")
+    p.add_argument("--emotion_batch_wait", type=float, default=0.5,
+                   help="Espera máxima do recorte mais antigo de um lote incompleto antes do envio (s)")
+    p.add_argument("--emotion_timeout", type=float, default=20.0,
+                   help="Timeout por requisição à OpenAI (s)")
+    p.add_argument("--openai_base_url", default=None,
+                   help="URL base da API (ex: stub local http://127.0.0.1:8089/v1)")
+    p.add_argument("--adaptive_sampling", action="store_true",
+                   help="Amostragem por evento: analisa emoção/atividade com mais frequência quando faces "
+                        "ou movimento mudam e espaça exponencialmente quando nada muda")
+    p.add_argument("--activity_interval_min", type=int, default=2,
+                   help="Intervalo mínimo entre análises de atividade com --adaptive_sampling (frames)")
+    p.add_argument("--activity_interval_max", type=int, default=30,
+                   help="Intervalo máximo entre análises de atividade com --adaptive_sampling (frames)")
+    p.add_argument("--emotion_interval_min", type=int, default=10,
+                   help="Intervalo mínimo entre análises de emoção com --adaptive_sampling (frames)")
+    p.add_argument("--emotion_interval_max", type=int, default=300,
+                   help="Intervalo máximo entre análises de emoção com --adaptive_sampling (frames)")
+    p.add_argument("--emotion_budget_per_min", type=int, default=None,
+                   help="Máximo de análises de emoção (chamadas à API) por minuto de vídeo "
+                        "com --adaptive_sampling")
+    p.add_argument("--dedup", action="store_true",
+                   help="Frames quase idênticos ao último analisado repetem as faces e a emoção anteriores "
+                        "(atividade e anomalias continuam sendo calculadas)")
+    p.add_argument("--dedup_threshold", type=float, default=4.0,
+                   help="Maior diferença entre blocos 16x9 do frame reduzido (níveis de cinza) para o frame "
+                        "contar como quase duplicado com --dedup")
+    p.add_argument("--emotion_cache", action="store_true",
+                   help="Reaproveita emoções de recortes quase idênticos (hash perceptual)")
+    p.add_argument("--emotion_cache_path", default=None,
+                   help="Arquivo JSON para persistir o cache de emoções entre execuções")
+    p.add_argument("--emotion_cache_distance", type=int, default=6,
+                   help="Distância de Hamming máxima para considerar dois recortes iguais")
+    p.add_argument("--emotion_cache_max_entries", type=int, default=1024,
+                   help="Máximo de entradas no cache de emoções (LRU)")
+    p.add_argument("--emotion_cache_max_bytes", type=int, default=256 * 1024,
+                   help="Memória máxima estimada do cache de emoções em bytes (LRU; ~250 bytes por entrada)")
+    p.add_argument("--events", default=None,
+                   help="JSONL com os eventos (anomalias, emoções, atividades) gravados durante a análise "
+                        "(padrão: <out_report>.events.jsonl)")
+    p.add_argument("--timeline", default=None,
+                   help="Timeline colunar por frame (.json + .bin) para consultas com timeline.py "
+                        "(padrão: <out_report>.timeline.json)")
+    p.add_argument("--events_flush_sec", type=float, default=1.0,
+                   help="Intervalo máximo entre gravações do JSONL de eventos (s)")
+    p.add_argument("--checkpoint_sec", type=float, default=None,
+                   help="Grava um checkpoint da análise a cada N segundos (permite --resume)")
+    p.add_argument("--checkpoint_part_minutes", type=float, default=10.0,
+                   help="Com checkpoints, o vídeo anotado é gravado em partes de N minutos de vídeo, "
+                        "juntadas no fim (uma interrupção refaz só a parte em andamento)")
+    p.add_argument("--checkpoint", default=None,
+                   help="Arquivo do checkpoint (padrão: <out_report>.checkpoint)")
+    p.add_argument("--resume", action="store_true",
+                   help="Retoma a partir do checkpoint (mesmas opções da execução interrompida); "
+                        "sem checkpoint, começa do início")
+    p.add_argument("--timings", action="store_true",
+                   help="Mede a latência de cada estágio (bloco timings no relatório)")
+    p.add_argument("--prometheus_textfile", default=None,
+                   help="Grava os histogramas de latência neste .prom (collector textfile do node exporter); "
+                        "implica --timings")
@@ -0,0 +1,275 @@
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def overlay_basic(frame, frame_idx: int, time_sec: float, fps: float, total_frames: int):
+    total_str = str(total_frames) if total_frames > 0 else "?"
+    line1 = f"Frame: {frame_idx} / {total_str}"
+    line2 = f"Time: {time_sec:.2f}s | FPS: {fps:.2f}"
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = 1.3
+    thickness = 3
+    color = (0, 0, 255)  # vermelho (BGR)
+
+    x, y = 20, 50
+    line_gap = 45
+
+    (w1, h1), _ = cv2.getTextSize(line1, font, scale, thickness)
+    (w2, h2), _ = cv2.getTextSize(line2, font, scale, thickness)
+    w = max(w1, w2)
+
+    pad = 12
+    cv2.rectangle(
+        frame,
+        (x - pad, y - h1 - pad),
+        (x + w + pad, y + h2 + pad + line_gap),
+        (0, 0, 0),
+        -1,
+    )
+
+    cv2.putText(frame, line1, (x, y), font, scale, color, thickness, cv2.LINE_AA)
+    cv2.putText(frame, line2, (x, y + line_gap), font, scale, color, thickness, cv2.LINE_AA)
+    return frame
+
+
+class _Sprite:
+    """Texto rasterizado uma vez: cor sólida + pesos de mistura (alfa do anti-aliasing)."""
+
+    __slots__ = ("color", "alpha", "inv_alpha", "ox", "oy")
+
+    def __init__(self, color_img, alpha, ox: int, oy: int):
+        self.color = color_img
+        self.alpha = alpha          # float32 0..1
+        self.inv_alpha = 1.0 - alpha
+        self.ox = ox                # origem do texto (putText) dentro do sprite
+        self.oy = oy
+
+
+class OverlayCompositor:
+    """
+    Desenha as anotações a partir de sprites em cache em vez de refazer
+    layout e rasterização de texto a cada frame.
+
+      - rótulos (emoção, atividade, anomalia, score da face) são
+        rasterizados uma vez por (texto, escala, cor, espessura) e
+        misturados ao frame com o alfa pré-calculado (cv2.blendLinear);
+        só um texto novo gera nova rasterização (cache LRU).
+      - o bloco de informações (frame/tempo) é montado com glifos
+        individuais em cache, já que o texto muda a cada frame.
+    """
+
+    def __init__(self, max_labels: int = 256):
+        self.max_labels = max_labels
+        self._labels = OrderedDict()
+        self._glyphs = {}
+        self._line_metrics = {}
+        self._luts = {}
+
+        self.label_renders = 0
+        self.label_hits = 0
+
+    # ------------------------------------------------------------------
+    # rótulos
+    # ------------------------------------------------------------------
+    def draw_text(self, frame, text: str, org, scale: float, color, thickness: int):
+        """Equivalente a cv2.putText(..., FONT_HERSHEY_SIMPLEX, ..., LINE_AA)."""
+        key = (text, scale, tuple(color), thickness)
+        sprite = self._labels.get(key)
+        if sprite is None:
+            sprite = self._render_label(text, scale, color, thickness)
+            self._labels[key] = sprite
+            self.label_renders += 1
+            if len(self._labels) > self.max_labels:
+                self._labels.popitem(last=False)
+        else:
+            self._labels.move_to_end(key)
+            self.label_hits += 1
+
+        self._blend(frame, sprite, org[0] - sprite.ox, org[1] - sprite.oy)
+        return frame
+
+    def _render_label(self, text, scale, color, thickness) -> _Sprite:
+        (w, h), base = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness
+        canvas = np.zeros((h + base + 2 * pad, w + 2 * pad), dtype=np.uint8)
+        cv2.putText(canvas, text, (pad, pad + h), FONT, scale, 255, thickness, cv2.LINE_AA)
+
+        alpha = canvas.astype(np.float32) / 255.0
+        color_img = np.empty(canvas.shape + (3,), dtype=np.uint8)
+        color_img[:] = color
+        return _Sprite(color_img, alpha, pad, pad + h)
+
+    @staticmethod
+    def _blend(frame, sprite: _Sprite, x: int, y: int):
+        fh, fw = frame.shape[:2]
+        sh, sw = sprite.alpha.shape[:2]
+
+        # recorte do sprite que cai dentro do frame
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(fw, x + sw), min(fh, y + sh)
+        if x2 <= x1 or y2 <= y1:
+            return
+
+        sx1, sy1 = x1 - x, y1 - y
+        sx2, sy2 = sx1 + (x2 - x1), sy1 + (y2 - y1)
+
+        roi = frame[y1:y2, x1:x2]
+        roi[:] = cv2.blendLinear(
+            roi,
+            sprite.color[sy1:sy2, sx1:sx2],
+            np.ascontiguousarray(sprite.inv_alpha[sy1:sy2, sx1:sx2]),
+            np.ascontiguousarray(sprite.alpha[sy1:sy2, sx1:sx2]),
+        )
+
+    # ------------------------------------------------------------------
+    # bloco de informações (frame/tempo) com glifos em cache
+    # ------------------------------------------------------------------
+    def overlay_basic(self, frame, frame_idx: int, time_sec: float, fps: float, total_frames: int):
+        """Mesmo layout de overlay_basic(), montado a partir de glifos em cache."""
+        total_str = str(total_frames) if total_frames > 0 else "?"
+        line1 = f"Frame: {frame_idx} / {total_str}"
+        line2 = f"Time: {time_sec:.2f}s | FPS: {fps:.2f}"
+
+        scale = 1.3
+        thickness = 3
+        color = (0, 0, 255)  # vermelho (BGR)
+
+        x, y = 20, 50
+        line_gap = 45
+        pad = 12
+
+        w1 = self._line_width(line1, scale, thickness)
+        w2 = self._line_width(line2, scale, thickness)
+        h = self._metrics(scale, thickness)["height"]
+        w = max(w1, w2)
+
+        # caixa preta opaca com as duas linhas (coordenadas de overlay_basic)
+        bx1, by1 = x - pad, y - h - pad
+        bx2, by2 = x + w + pad, y + h + pad + line_gap
+        alpha = np.zeros((by2 - by1 + 1, bx2 - bx1 + 1), dtype=np.uint8)
+        self._compose_line(alpha, line1, x - bx1, y - by1, scale, thickness)
+        self._compose_line(alpha, line2, x - bx1, y + line_gap - by1, scale, thickness)
+
+        fh, fw = frame.shape[:2]
+        cx1, cy1 = max(0, bx1), max(0, by1)
+        cx2, cy2 = min(fw, bx2 + 1), min(fh, by2 + 1)
+        if cx2 <= cx1 or cy2 <= cy1:
+            return frame
+
+        a = alpha[cy1 - by1: cy2 - by1, cx1 - bx1: cx2 - bx1]
+        # sobre fundo preto, o texto anti-aliased é a cor multiplicada pelo alfa
+        frame[cy1:cy2, cx1:cx2] = cv2.LUT(cv2.merge((a, a, a)), self._color_lut(color))
+        return frame
+
+    def _color_lut(self, color):
+        key = tuple(color)
+        lut = self._luts.get(key)
+        if lut is None:
+            ramp = np.arange(256, dtype=np.float32) / 255.0
+            lut = np.round(ramp[:, None] * np.array(key, dtype=np.float32)[None, :])
+            lut = lut.astype(np.uint8).reshape(1, 256, 3)
+            self._luts[key] = lut
+        return lut
+
+    def _metrics(self, scale, thickness) -> dict:
+        key = (scale, thickness)
+        m = self._line_metrics.get(key)
+        if m is None:
+            # nas fontes Hershey, altura e baseline não dependem do texto
+            (_, h), base = cv2.getTextSize("0", FONT, scale, thickness)
+            m = {
+                "height": h,
+                "ascent": h,
+                "descent": base,
+                "pad": thickness,
+            }
+            self._line_metrics[key] = m
+        return m
+
+    def _glyph(self, ch: str, scale, thickness):
+        key = (ch, scale, thickness)
+        g = self._glyphs.get(key)
+        if g is None:
+            m = self._metrics(scale, thickness)
+            (w, _), _ = cv2.getTextSize(ch, FONT, scale, thickness)
+            pad = m["pad"]
+            canvas = np.zeros((m["ascent"] + m["descent"] + 2 * pad, w + 2 * pad), dtype=np.uint8)
+            cv2.putText(canvas, ch, (pad, pad + m["ascent"]), FONT, scale, 255, thickness, cv2.LINE_AA)
+            # getTextSize soma os avanços dos glifos e acrescenta a espessura uma vez
+            advance = max(0, w - thickness)
+            g = (canvas, advance, pad, pad + m["ascent"])
+            self._glyphs[key] = g
+        return g
+
+    def _line_width(self, text, scale, thickness) -> int:
+        return sum(self._glyph(ch, scale, thickness)[1] for ch in text) + thickness
+
+    def _compose_line(self, alpha, text, x, y, scale, thickness):
+        # combina os glifos pelo máximo do alfa (equivale a desenhar em sequência sobre preto)
+        H, W = alpha.shape
+        for ch in text:
+            canvas, advance, ox, oy = self._glyph(ch, scale, thickness)
+            gx, gy = x - ox, y - oy
+            gh, gw = canvas.shape
+            x1, y1 = max(0, gx), max(0, gy)
+            x2, y2 = min(W, gx + gw), min(H, gy + gh)
+            if x2 > x1 and y2 > y1:
+                dst = alpha[y1:y2, x1:x2]
+                np.maximum(dst, canvas[y1 - gy: y2 - gy, x1 - gx: x2 - gx], out=dst)
+            x += advance
+
+    def stats(self) -> dict:
+        return {
+            "label_renders": self.label_renders,
+            "label_hits": self.label_hits,
+            "glyphs": len(self._glyphs),
+        }
+
+
+def _put_text(frame, text, org, scale, color, thickness, compositor=None):
+    if compositor is not None:
+        compositor.draw_text(frame, text, org, scale, color, thickness)
+    else:
+        cv2.putText(frame, text, org, FONT, scale, color, thickness, cv2.LINE_AA)
+
+
+def draw_overlays(frame, result: dict, fps: float, total_frames: int, compositor=None):
+    """
+    Desenha no frame as anotações de um resultado de FrameProcessor.analyze():
+    informações básicas, faces, emoção, atividade e anomalia ativa.
+
+    Com `compositor` (OverlayCompositor), os textos vêm de sprites em cache.
+    """
+    if compositor is not None:
+        frame = compositor.overlay_basic(frame, result["frame"], result["time_sec"],
+                                         fps=fps, total_frames=total_frames)
+    else:
+        frame = overlay_basic(frame, result["frame"], result["time_sec"], fps=fps, total_frames=total_frames)
+
+    for f in result["faces"]:
+        x1, y1, x2, y2 = f["x1"], f["y1"], f["x2"], f["y2"]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        _put_text(frame, f"face {f['score']:.2f}", (x1, max(20, y1 - 10)), 0.7, (0, 255, 0), 2, compositor)
+
+    if result.get("emotion"):
+        txt = f"emotion: {result['emotion']}"
+        if result.get("emotion_conf") is not None:
+            txt += f" ({result['emotion_conf']:.2f})"
+        _put_text(frame, txt, (20, 300), 1.0, (0, 0, 255), 3, compositor)
+
+    if result.get("activity"):
+        txt = f"activity: {result['activity']}"
+        if result.get("motion") is not None:
+            txt += f" | motion={result['motion']:.4f}"
+        _put_text(frame, txt, (20, 350), 1.0, (0, 0, 255), 3, compositor)
+
+    # overlay persistente da anomalia
+    if result.get("anomaly_text"):
+        _put_text(frame, result["anomaly_text"], (20, 420), 1.1, (0, 0, 255), 4, compositor)
+
+    return frame
@@ -0,0 +1,91 @@
+import argparse
+import json
+import cv2
+from tqdm import tqdm
+
+from io_video import open_video, get_video_props, make_writer
+from writers import WRITER_BACKENDS
+from overlay import OverlayCompositor, draw_overlays
+
+
+def iter_frame_results(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def render_video(video_path: str, results_path: str, output_path: str, **writer_options) -> int:
+    """
+    Gera o vídeo anotado a partir dos resultados por frame salvos em uma
+    execução só análise (main.py --no-video --frame_results ...).
+    Frames sem resultado são copiados sem anotação.
+    writer_options: opções de make_writer (backend, codec, queue_size, ...).
+    """
+    cap = open_video(video_path)
+    props = get_video_props(cap)
+
+    fps = props.get("fps", 0) or 0
+    if fps <= 0:
+        fps = 30.0
+    total_frames = props.get("total_frames", 0) or 0
+
+    writer = make_writer(output_path, fps, props["width"], props["height"], **writer_options)
+
+    compositor = OverlayCompositor()
+    results = iter_frame_results(results_path)
+    pending = next(results, None)
+
+    written = 0
+    frame = None
+    try:
+        with tqdm(total=total_frames or None, desc="Renderizando vídeo") as pbar:
+            while True:
+                # o frame anterior já foi escrito: o buffer é reaproveitado na leitura
+                ret, frame = cap.read(frame) if frame is not None else cap.read()
+                if not ret:
+                    break
+                frame_idx = written + 1
+
+                while pending is not None and pending["frame"] < frame_idx:
+                    pending = next(results, None)
+
+                if pending is not None and pending["frame"] == frame_idx:
+                    frame = draw_overlays(frame, pending, fps=fps, total_frames=total_frames,
+                                          compositor=compositor)
+
+                writer.write(frame)
+                written += 1
+                pbar.update(1)
+    finally:
+        cap.release()
+        writer.release()
+
+    return written
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Renderiza o vídeo anotado a partir de resultados salvos")
+    p.add_argument("--video", required=True, help="Vídeo de entrada original")
+    p.add_argument("--results", required=True, help="Resultados por frame (JSONL de --frame_results)")
+    p.add_argument("--out_video", default="outputs/annotated.mp4", help="Caminho do vídeo anotado")
+    p.add_argument("--writer", choices=WRITER_BACKENDS, default="opencv",
+                   help="Backend do vídeo: opencv (mp4v) ou ffmpeg (processo ffmpeg via pipe)")
+    p.add_argument("--writer_codec", default=None, help="Codec do backend (ex: libx264)")
+    p.add_argument("--writer_queue", type=int, default=8,
+                   help="Frames na fila da thread de codificação (0 = codifica no próprio loop)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    written = render_video(args.video, args.results, args.out_video, backend=args.writer,
+                           codec=args.writer_codec, queue_size=args.writer_queue)
+    cv2.destroyAllWindows()
+    print(f"Frames renderizados: {written}")
+    print(f"Vídeo gerado: {args.out_video}")
+
+
+if __name__ == "__main__":
+    main()
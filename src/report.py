@@ -1,13 +1,34 @@
 import json
+import os
 from pathlib import Path
 from datetime import datetime
 
 
-def write_report(output_path: str, data: dict) -> None:
+def write_report(output_path: str, data: dict, streams: dict = None) -> None:
+    """
+    Grava o relatório JSON. `streams` ({chave: iterável}) são listas gravadas
+    item a item no fim do objeto, sem materializá-las em memória (ex: as
+    anomalias lidas do JSONL de eventos). A escrita é atômica (arquivo
+    temporário + os.replace).
+    """
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     payload = {
         "generated_at": datetime.utcnow().isoformat() + "Z",
         **data,
     }
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    tmp = f"{output_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        if not streams:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        else:
+            # objeto sem o "}" final; as listas em streaming entram como últimas chaves
+            f.write(json.dumps(payload, ensure_ascii=False, indent=2)[:-2])
+            for key, items in streams.items():
+                f.write(f",\n  {json.dumps(key)}: [")
+                sep = "\n    "
+                for item in items:
+                    f.write(sep + json.dumps(item, ensure_ascii=False))
+                    sep = ",\n    "
+                f.write("\n  ]")
+            f.write("\n}")
+    os.replace(tmp, output_path)
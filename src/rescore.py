@@ -0,0 +1,138 @@
+import argparse
+import json
+from collections import Counter
+
+import numpy as np
+from tqdm import tqdm
+
+from io_video import open_video, get_video_props
+from analyzers.activity_analyzer import ActivityAnalyzer
+from analyzers.anomaly_detector import AnomalyDetector
+from frame_processor import (
+    ACTIVITY_EVERY_N_FRAMES,
+    ANOMALY_COOLDOWN_SEC,
+    ANOMALY_WINDOW_SIZE,
+    apply_anomaly_cooldown,
+)
+
+
+def rescore_video(video_path: str, window_size: int = ANOMALY_WINDOW_SIZE, z_thresh: float = 3.0,
+                  enable_low: bool = True, every: int = ACTIVITY_EVERY_N_FRAMES, chunk: int = 64,
+                  progress: bool = True) -> dict:
+    """
+    Reavalia atividade e anomalias de movimento de um vídeo, sem faces nem
+    emoção (nenhuma chamada à API), para testar outros window_size/z_thresh.
+
+    Só os frames da cadência da atividade (frame % every == 0, como no
+    pipeline) são decodificados; os demais são avançados com grab(). Os
+    frames reduzidos vão em blocos de `chunk` para
+    ActivityAnalyzer.analyze_chunk() e a série inteira de motion_scores
+    para AnomalyDetector.update_batch(); o cooldown é o do pipeline. Com os
+    parâmetros padrão, atividades e anomalias saem iguais às de main.py.
+    """
+    cap = open_video(video_path)
+    props = get_video_props(cap)
+    fps = props.get("fps", 0) or 0
+    if fps <= 0:
+        fps = 30.0
+    total_frames = props.get("total_frames", 0) or 0
+
+    analyzer = ActivityAnalyzer()
+    sample_frames, labels, scores = [], [], []
+    block, n = None, 0
+
+    def flush():
+        nonlocal n
+        if n:
+            chunk_labels, chunk_scores = analyzer.analyze_chunk(block[:n])
+            labels.extend(chunk_labels.tolist())
+            scores.append(chunk_scores)
+            n = 0
+
+    frame_idx = 0
+    frame = None
+    try:
+        with tqdm(total=total_frames or None, desc="Reavaliando movimento", disable=not progress) as pbar:
+            while True:
+                frame_idx += 1
+                if frame_idx % every:
+                    if not cap.grab():
+                        break
+                    pbar.update(1)
+                    continue
+                ret, frame = cap.read(frame) if frame is not None else cap.read()
+                if not ret:
+                    break
+                pbar.update(1)
+
+                gray = analyzer.preprocess(frame)
+                if block is None or block.shape[1:] != gray.shape:
+                    # resolução nova: o bloco atual é processado antes (analyze_chunk reinicia o histórico)
+                    flush()
+                    block = np.empty((chunk,) + gray.shape, np.uint8)
+                block[n] = gray
+                n += 1
+                sample_frames.append(frame_idx)
+                if n == chunk:
+                    flush()
+            flush()
+    finally:
+        cap.release()
+
+    scores = np.concatenate(scores) if scores else np.zeros(0)
+    detector = AnomalyDetector(window_size=window_size, z_thresh=z_thresh, enable_low=enable_low)
+    batch = detector.update_batch(scores)
+
+    candidates = []
+    for i in np.flatnonzero(batch["flags"]):
+        candidates.append({
+            "frame": sample_frames[i],
+            "time_sec": sample_frames[i] / fps,
+            "type": "high_motion" if batch["flags"][i] > 0 else "low_motion",
+            "z": float(batch["z"][i]),
+            "motion": float(scores[i]),
+            "activity": labels[i],
+        })
+    anomalies = apply_anomaly_cooldown(candidates, int(fps * ANOMALY_COOLDOWN_SEC))
+
+    return {
+        "video": video_path,
+        "fps": fps,
+        "frames": frame_idx - 1,
+        "samples": len(sample_frames),
+        "params": {"window_size": window_size, "z_thresh": z_thresh, "enable_low": enable_low, "every": every},
+        "activities": dict(Counter(labels)),
+        "anomalies_count": len(anomalies),
+        "anomalies": anomalies,
+    }
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Reavalia atividade e anomalias de movimento de um vídeo (sem faces/API)")
+    p.add_argument("--video", required=True, help="Vídeo de entrada")
+    p.add_argument("--window_size", type=int, default=ANOMALY_WINDOW_SIZE,
+                   help="Amostras de atividade na janela das anomalias")
+    p.add_argument("--z_thresh", type=float, default=3.0, help="|z| mínimo para uma anomalia")
+    p.add_argument("--no_low", action="store_true", help="Ignora anomalias low_motion")
+    p.add_argument("--every", type=int, default=ACTIVITY_EVERY_N_FRAMES,
+                   help="Cadência da atividade (frames); o padrão é o do pipeline")
+    p.add_argument("--chunk", type=int, default=64, help="Frames por chamada de analyze_chunk")
+    p.add_argument("--out", default=None, help="Grava o resultado (JSON) neste arquivo em vez de imprimir")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = rescore_video(args.video, window_size=args.window_size, z_thresh=args.z_thresh,
+                           enable_low=not args.no_low, every=max(1, args.every), chunk=max(1, args.chunk))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Resultado salvo: {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import bisect
+from collections import deque
+
+
+class AdaptiveSampler:
+    """
+    Decide em quais frames uma análise periódica roda, no lugar de um
+    intervalo fixo (frame % N == 0).
+
+      - sem mudança: o intervalo cresce exponencialmente (x backoff) até
+        max_interval
+      - mudança relevante (sampled(changed=True) ou trigger()): o intervalo
+        volta para min_interval; trigger() ainda antecipa a próxima amostra
+        (respeitando min_interval desde a anterior)
+      - budget_per_minute: limite de amostras por minuto de vídeo (ex:
+        chamadas à API); fora do orçamento, due() devolve False
+
+    due() não altera o estado: pode ser consultado adiantado (leitura de
+    frames, busca do próximo frame necessário) em outra thread. A limpeza
+    da janela do orçamento e a contagem de frames negados ficam em
+    sampled(), na thread da análise.
+
+    stats() compara o total de amostras com a amostragem fixa a cada
+    `base_interval` frames sobre os mesmos frames.
+    """
+
+    def __init__(self, base_interval: int, min_interval: int, max_interval: int, fps: float,
+                 backoff: float = 2.0, budget_per_minute: int = None):
+        self.base_interval = base_interval
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.fps = fps if fps > 0 else 30.0
+        self.backoff = backoff
+        self.budget_per_minute = budget_per_minute
+
+        self.interval = float(min(max(base_interval, self.min_interval), self.max_interval))
+        self.next_frame = base_interval
+        self.last_sample = None
+        self._recent = deque()  # frames das amostras no último minuto de vídeo
+
+        self.first_frame = None
+        self.last_frame = None
+        self.samples = 0
+        self.triggers = 0
+        self.budget_denied = 0  # frames em que a amostra estava no prazo, mas fora do orçamento
+
+    def observe(self, frame_idx: int):
+        """Registra que o frame passou pelo processamento (base da comparação com a taxa fixa)."""
+        if self.first_frame is None:
+            self.first_frame = frame_idx
+        self.last_frame = frame_idx
+
+    def due(self, frame_idx: int) -> bool:
+        if frame_idx < self.next_frame:
+            return False
+        if self.budget_per_minute is not None and self._in_window(frame_idx) >= self.budget_per_minute:
+            return False
+        return True
+
+    def sampled(self, frame_idx: int, changed: bool = False, record: bool = True):
+        """
+        Chamado quando a análise roda no frame; changed = o resultado mudou de
+        forma relevante. record=False (warm-up) atualiza o estado sem contar.
+        """
+        if record:
+            self.samples += 1
+        if self.budget_per_minute is not None:
+            self.budget_denied += self._denied_before(frame_idx)
+            window = int(60 * self.fps)
+            while self._recent and self._recent[0] <= frame_idx - window:
+                self._recent.popleft()
+            self._recent.append(frame_idx)
+        self.last_sample = frame_idx
+
+        if changed:
+            self.interval = float(self.min_interval)
+        else:
+            self.interval = min(float(self.max_interval), self.interval * self.backoff)
+        self.next_frame = frame_idx + max(1, int(round(self.interval)))
+
+    def trigger(self, frame_idx: int):
+        """Mudança observada fora da análise (ex: faces): amostra assim que permitido."""
+        self.triggers += 1
+        self.interval = float(self.min_interval)
+        earliest = frame_idx if self.last_sample is None else self.last_sample + self.min_interval
+        self.next_frame = min(self.next_frame, max(frame_idx, earliest))
+
+    def _in_window(self, frame_idx: int) -> int:
+        """Amostras no minuto de vídeo que termina em frame_idx (_recent está em ordem)."""
+        return len(self._recent) - bisect.bisect_right(self._recent, frame_idx - int(60 * self.fps))
+
+    def _denied_before(self, frame_idx: int) -> int:
+        """
+        Frames entre next_frame e frame_idx em que o orçamento negou a
+        amostra: até a amostra que ocupa a vaga sair da janela de um minuto.
+        """
+        if len(self._recent) < self.budget_per_minute or frame_idx <= self.next_frame:
+            return 0
+        freed = self._recent[-self.budget_per_minute] + int(60 * self.fps)
+        return max(0, min(freed, frame_idx) - self.next_frame)
+
+    def stats(self) -> dict:
+        fixed = 0
+        if self.first_frame is not None:
+            fixed = self.last_frame // self.base_interval - (self.first_frame - 1) // self.base_interval
+        pending_denied = 0
+        if self.budget_per_minute is not None and self.last_frame is not None:
+            pending_denied = self._denied_before(self.last_frame + 1)
+        return {
+            "samples": self.samples,
+            "fixed_rate_samples": fixed,
+            "saved": fixed - self.samples,
+            "triggers": self.triggers,
+            # inclui os frames negados depois da última amostra
+            "budget_denied": self.budget_denied + pending_denied,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "budget_per_minute": self.budget_per_minute,
+        }
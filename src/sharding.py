@@ -0,0 +1,264 @@
+import shutil
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from frame_loop import FramePool, process_video_frames
+from writers import output_size, writer_options
+from io_video import open_video, get_video_props, make_writer, concat_videos
+from context import VideoAnalysisContext
+from event_sink import EventSink
+from timeline import TimelineWriter, merge_timelines
+from timing import merge_timings
+from analyzers.emotion_cache import EmotionCache
+from frame_processor import (
+    ANOMALY_COOLDOWN_SEC,
+    apply_anomaly_cooldown,
+    build_frame_processor,
+    warmup_frames,
+)
+
+
+def plan_segments(total_frames: int, workers: int, warmup: int,
+                  first_frame: int = 1, last_frame: int = None) -> list:
+    """
+    Divide os frames first_frame..last_frame (padrão: o vídeo todo) em
+    `workers` segmentos contíguos.
+    Cada segmento: {index, start, end, warmup_start} (índices 1-based,
+    start/end inclusivos). Sem last_frame, o último segmento vai até o fim
+    do arquivo (end=None), já que CAP_PROP_FRAME_COUNT pode ser impreciso.
+    """
+    last = last_frame if last_frame is not None else total_frames
+    count = last - first_frame + 1
+    workers = max(1, min(workers, count)) if count > 0 else 1
+    size = -(-count // workers) if count > 0 else 0
+
+    segments = []
+    for i in range(workers):
+        start = first_frame + i * size
+        if i == workers - 1:
+            end = last_frame
+        else:
+            end = min(last, first_frame - 1 + (i + 1) * size)
+        segments.append(
+            {
+                "index": i,
+                "start": start,
+                "end": end,
+                "warmup_start": max(1, start - warmup),
+            }
+        )
+    return segments
+
+
+def _run_segment(job: dict) -> dict:
+    """
+    Processa um segmento em um processo separado, com seus próprios
+    detectores/analyzers. Os frames de warm-up avançam o estado dos
+    analyzers sem registrar nada nem escrever no vídeo.
+    """
+    args, seg = job["args"], job["segment"]
+    fps, total_frames = job["fps"], job["total_frames"]
+
+    cap = open_video(args.video)
+    props = get_video_props(cap)
+    writer = None
+    if job["out_path"] is not None:
+        # mesmas opções do vídeo final: o processo principal só junta os arquivos (sem recodificar)
+        writer = make_writer(job["out_path"], fps, props["width"], props["height"],
+                             frame_offset=job["frame_offset"], **{**writer_options(args), "segment_sec": None})
+
+    # anomalias só viram eventos no processo principal, após o cooldown global
+    sink = EventSink(job["events_path"], flush_interval=args.events_flush_sec)
+    timeline = TimelineWriter(job["timeline_path"], fps)
+    context = VideoAnalysisContext(sink=sink, timeline=timeline)
+    processor = build_frame_processor(args, context, fps, total_frames)
+    processor.anomaly_candidates = []
+    processor.record_from = seg["start"]
+    processor.timeline = timeline
+    if job["results_path"] is not None:
+        processor.frame_results = open(job["results_path"], "w", encoding="utf-8")
+
+    first = seg["warmup_start"]
+    try:
+        # o último segmento não tem fim fixo: lê até o fim do arquivo
+        walked = process_video_frames(
+            cap=cap,
+            writer=writer,
+            fps=fps,
+            total_frames=None,
+            on_frame=processor,
+            needs_frame=processor.needs_frame if args.no_video else None,
+            on_skip=processor.skip,
+            first_frame=first,
+            last_frame=seg["end"],
+            progress=False,
+            timer=processor.timer,
+            pool=FramePool(),
+        )
+        processor.finish()
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        if processor.frame_results is not None:
+            processor.frame_results.close()
+        sink.close()
+        timeline.close()
+        context.sink = None  # o contexto volta ao processo principal (pickle)
+        context.timeline = None
+
+    cache = processor.emotion_analyzer.cache
+    return {
+        "index": seg["index"],
+        "start": seg["start"],
+        "end": first - 1 + walked,
+        "processed": max(0, walked - (seg["start"] - first)),
+        "context": context,
+        "anomaly_candidates": processor.anomaly_candidates,
+        "stats": processor.stats(),
+        "cache_entries": cache.entries() if cache is not None else None,
+    }
+
+
+def _merge_stats(items: list):
+    """Soma recursiva de dicts de estatísticas (valores não numéricos: o primeiro)."""
+    items = [i for i in items if i is not None]
+    if not items:
+        return None
+    if all(isinstance(i, dict) for i in items):
+        return {k: _merge_stats([i.get(k) for i in items]) for k in items[0]}
+    if all(isinstance(i, (int, float)) and not isinstance(i, bool) for i in items):
+        return sum(items)
+    return items[0]
+
+
+def process_video_sharded(args, fps: float, total_frames: int, width: int, height: int,
+                          first_frame: int = 1, last_frame: int = None, sink=None, timeline_path: str = None):
+    """
+    Processa o vídeo (ou o intervalo first_frame..last_frame) em
+    `args.workers` processos, um por segmento de tempo, e junta os
+    resultados. Retorna (processed_frames, context, stats).
+
+    Com `sink` (EventSink), os eventos de cada segmento são copiados para
+    ele em ordem, seguidos das anomalias aceitas naquele segmento. Com
+    `timeline_path`, os timelines dos segmentos são juntados nele, com as
+    anomalias aceitas marcadas.
+
+    As anomalias são decididas pelo z-score de cada segmento (janela
+    reconstruída no warm-up) e o cooldown é reaplicado sobre a sequência
+    completa de candidatas, então contagens e eventos coincidem com a
+    execução serial.
+
+    --adaptive_sampling e --dedup são recusados: o intervalo e o orçamento
+    dos amostradores e o frame de referência da deduplicação dependem de
+    todo o histórico anterior, não só dos frames de warm-up, então as
+    fronteiras entre segmentos mudariam as contagens.
+    """
+    if total_frames <= 0:
+        raise RuntimeError("Modo --workers exige um vídeo com total de frames conhecido")
+    if args.adaptive_sampling or args.dedup:
+        raise RuntimeError("--adaptive_sampling e --dedup não combinam com --workers (o estado deles depende "
+                           "de todo o vídeo anterior ao segmento e mudaria as contagens)")
+
+    segments = plan_segments(total_frames, args.workers, warmup_frames(args.face_detect_every),
+                             first_frame=first_frame, last_frame=last_frame)
+
+    out_dir = Path(args.out_video).parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    writer_stats = None
+    with tempfile.TemporaryDirectory(dir=out_dir, prefix=".segments_") as tmp:
+        jobs = [
+            {
+                "args": args,
+                "segment": seg,
+                "fps": fps,
+                "total_frames": total_frames,
+                "out_path": None if args.no_video else str(Path(tmp) / f"segment_{seg['index']:03d}.mp4"),
+                # frames do vídeo anotado antes deste segmento (fase da redução de fps)
+                "frame_offset": seg["start"] - segments[0]["start"],
+                "results_path": (
+                    str(Path(tmp) / f"segment_{seg['index']:03d}.jsonl") if args.frame_results else None
+                ),
+                "events_path": str(Path(tmp) / f"segment_{seg['index']:03d}.events.jsonl"),
+                "timeline_path": str(Path(tmp) / f"segment_{seg['index']:03d}.timeline.json"),
+            }
+            for seg in segments
+        ]
+
+        # spawn: cada processo inicializa MediaPipe/OpenAI do zero
+        with ProcessPoolExecutor(max_workers=len(jobs), mp_context=mp.get_context("spawn")) as ex:
+            results = sorted(ex.map(_run_segment, jobs), key=lambda r: r["index"])
+
+        if not args.no_video:
+            writer_stats = concat_videos([j["out_path"] for j in jobs], args.out_video, fps, width, height,
+                                         **writer_options(args))
+            writer_stats["frames_received"] = sum(r["processed"] for r in results)
+            writer_stats["bytes"] = output_size(writer_stats["paths"])
+
+        if args.frame_results:
+            Path(args.frame_results).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.frame_results, "w", encoding="utf-8") as out:
+                for j in jobs:
+                    with open(j["results_path"], "r", encoding="utf-8") as f:
+                        shutil.copyfileobj(f, out)
+
+        context = VideoAnalysisContext(sink=sink)
+        candidates = []
+        for r in results:
+            context.merge(r["context"])  # segmentos não registram anomalias (ver _run_segment)
+            candidates.extend(r["anomaly_candidates"])
+
+        accepted = apply_anomaly_cooldown(candidates, int(fps * ANOMALY_COOLDOWN_SEC))
+        pos = 0
+        for r, j in zip(results, jobs):
+            if sink is not None:
+                sink.append_file(j["events_path"])
+            while pos < len(accepted) and accepted[pos]["frame"] <= r["end"]:
+                context.register_anomaly(accepted[pos])
+                pos += 1
+
+        timeline_stats = None
+        if timeline_path is not None:
+            timeline_stats = merge_timelines([j["timeline_path"] for j in jobs], timeline_path, fps,
+                                             anomalies=accepted,
+                                             processed_frames=sum(r["processed"] for r in results))
+
+    stats = _merge_stats([r["stats"] for r in results])
+    if writer_stats is not None:
+        stats["writer"] = writer_stats
+    if timeline_stats is not None:
+        stats["timeline"] = timeline_stats
+    stats["timings"] = merge_timings([r["stats"]["timings"] for r in results])
+    tracking = stats["face_tracking"]
+    tracked_total = tracking["detections_run"] + tracking["frames_tracked"] + tracking["frames_held"]
+    tracking["detect_every"] = args.face_detect_every
+    tracking["detection_ratio"] = tracking["detections_run"] / tracked_total if tracked_total else 0.0
+    stats["analyzers"]["threads"] = args.analyzer_threads  # por processo, não soma
+
+    if args.emotion_cache or args.emotion_cache_path:
+        # o cache persistido recebe as entradas aprendidas em todos os segmentos
+        merged_cache = EmotionCache(
+            max_distance=args.emotion_cache_distance,
+            max_entries=args.emotion_cache_max_entries,
+            max_bytes=args.emotion_cache_max_bytes,
+            path=args.emotion_cache_path,
+        )
+        for r in results:
+            for key, emotion, conf in r["cache_entries"] or []:
+                merged_cache.put(key, emotion, conf)
+        merged_cache.save()
+
+        cache_stats = stats["emotion_cache"]
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        cache_stats["hit_rate"] = cache_stats["hits"] / lookups if lookups else 0.0
+        cache_stats["entries"] = len(merged_cache.entries())
+
+    stats["segments"] = [
+        {"index": r["index"], "start": r["start"], "end": r["end"], "processed": r["processed"]}
+        for r in results
+    ]
+
+    return sum(r["processed"] for r in results), context, stats
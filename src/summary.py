@@ -2,11 +2,20 @@ from collections import Counter
 
 
 def _top_k(counter_like, k=3):
+    # empates por rótulo: não depende da ordem de inserção (stream x timeline x segmentos)
     c = Counter(counter_like)
-    return c.most_common(k)
+    return sorted(c.items(), key=lambda item: (-item[1], item[0]))[:k]
 
 
-def build_summary(processed_frames: int, fps: float, emotions: dict, activities: dict, anomalies: list):
+def build_summary(processed_frames: int, fps: float, emotions: dict, activities: dict, anomalies: list,
+                  anomalies_count: int = None):
+    """
+    anomalies pode ser só o início da lista (exemplos); anomalies_count é o
+    total (padrão: len(anomalies)).
+    """
+    if anomalies_count is None:
+        anomalies_count = len(anomalies or [])
+
     duration_sec = (processed_frames / fps) if fps and fps > 0 else None
 
     top_emotions = _top_k(emotions, 3)
@@ -40,9 +49,9 @@ def build_summary(processed_frames: int, fps: float, emotions: dict, activities:
             + "."
         )
 
-    if anomalies:
+    if anomalies_count:
         parts.append(
-            f"Foram detectadas {len(anomalies)} anomalias de movimento (desvio do padrão recente). "
+            f"Foram detectadas {anomalies_count} anomalias de movimento (desvio do padrão recente). "
             + ("Exemplos: " + ", ".join(anomaly_points) + "." if anomaly_points else "")
         )
     else:
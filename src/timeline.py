@@ -0,0 +1,495 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from labels import ACTIVITY_LABELS, EMOTION_LABELS
+from summary import build_summary
+
+
+# uma linha por frame registrado (41 bytes, sem alinhamento)
+TIMELINE_DTYPE = np.dtype([
+    ("frame", "<i4"),
+    ("time_sec", "<f8"),
+    ("faces", "<u2"),            # número de faces no frame
+    ("x1", "<i2"), ("y1", "<i2"),  # maior caixa (-1 = sem face)
+    ("x2", "<i2"), ("y2", "<i2"),
+    ("motion", "<f4"),           # último motion_score (NaN = ainda nenhum)
+    ("activity", "i1"),          # código da atividade atual (-1 = nenhuma)
+    ("emotion", "i1"),           # código da emoção atual (-1 = nenhuma)
+    ("emotion_conf", "<f4"),
+    ("anomaly_z", "<f8"),        # z da anomalia registrada no frame (NaN = nenhuma; f8 = o mesmo z do relatório)
+    ("flags", "u1"),
+])
+
+# flags: o que foi registrado no contexto neste frame
+FLAG_ACTIVITY = 1      # amostra de atividade
+FLAG_EMOTION = 2       # emoção registrada (a da coluna emotion)
+FLAG_HIGH_MOTION = 4   # anomalia high_motion
+FLAG_LOW_MOTION = 8    # anomalia low_motion
+ANOMALY_FLAGS = {"high_motion": FLAG_HIGH_MOTION, "low_motion": FLAG_LOW_MOTION}
+
+
+def data_path(path) -> Path:
+    """O timeline é um .json (metadados) com as linhas em um .bin de mesmo nome."""
+    return Path(path).with_suffix(".bin")
+
+
+class TimelineWriter:
+    """
+    Grava o timeline colunar durante a análise: append(result) a cada
+    frame registrado (FrameProcessor._result) e activity()/emotion()/
+    anomaly() quando o contexto registra um evento (VideoAnalysisContext).
+
+    As linhas vão em blocos de `chunk_rows` para o .bin; a última fica em
+    memória até o próximo bloco, porque emoções assíncronas podem chegar
+    depois do frame (ex: em finish()). Rótulos viram códigos pelas tabelas
+    `labels` do .json (novos rótulos são acrescentados). Se mais de uma
+    emoção for registrada no mesmo frame, as anteriores vão para
+    `emotion_overflow` no .json, então as contagens continuam exatas.
+
+    resume (dict de position(), ex: de um checkpoint) reabre o .bin
+    descartando as linhas gravadas depois daquela posição.
+    """
+
+    def __init__(self, path: str, fps: float, chunk_rows: int = 4096, resume: dict = None):
+        self.path = Path(path)
+        self.data_path = data_path(path)
+        self.fps = fps
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._chunk = np.zeros(max(2, chunk_rows), dtype=TIMELINE_DTYPE)
+        self._n = 0        # linhas no bloco em memória
+        self._on_disk = 0  # 1: a primeira do bloco (a última do arquivo) já foi gravada
+        self._pending_flags = 0
+        self._pending_emotions = []
+        self._pending_z = np.nan
+
+        if resume is not None:
+            with open(self.data_path, "r+b") as f:
+                f.truncate(resume["rows"] * TIMELINE_DTYPE.itemsize)
+            self._f = open(self.data_path, "r+b")
+            self._f.seek(0, os.SEEK_END)
+            self.rows = resume["rows"]
+            self.labels = {k: list(v) for k, v in resume["labels"].items()}
+            self.emotion_overflow = [list(e) for e in resume["emotion_overflow"]]
+        else:
+            self._f = open(self.data_path, "w+b")
+            self.rows = 0
+            self.labels = {"activity": list(ACTIVITY_LABELS), "emotion": list(EMOTION_LABELS)}
+            self.emotion_overflow = []  # [frame, código, conf]
+        self._codes = {k: {label: i for i, label in enumerate(v)} for k, v in self.labels.items()}
+        self.write_sec = 0.0
+
+    # ------------------------------------------------------------------
+    # linhas
+    # ------------------------------------------------------------------
+    def append(self, result: dict):
+        t0 = time.perf_counter()
+        if self._n == len(self._chunk):
+            self._flush()
+        row = self._chunk[self._n]
+        self._n += 1
+        self.rows += 1
+
+        faces = result["faces"]
+        row["frame"] = result["frame"]
+        row["time_sec"] = result["time_sec"]
+        row["faces"] = len(faces)
+        if faces:
+            box = max(faces, key=lambda f: max(0, f["x2"] - f["x1"]) * max(0, f["y2"] - f["y1"]))
+            row["x1"], row["y1"], row["x2"], row["y2"] = box["x1"], box["y1"], box["x2"], box["y2"]
+        else:
+            row["x1"] = row["y1"] = row["x2"] = row["y2"] = -1
+        row["motion"] = np.nan if result["motion"] is None else result["motion"]
+        row["activity"] = self._code("activity", result["activity"])
+        row["emotion"] = self._code("emotion", result["emotion"])
+        row["emotion_conf"] = np.nan if result["emotion_conf"] is None else result["emotion_conf"]
+        row["anomaly_z"] = self._pending_z
+        row["flags"] = self._pending_flags
+
+        # emoções registradas antes da linha: a última é a da coluna emotion
+        for code, conf in self._pending_emotions[:-1]:
+            self.emotion_overflow.append([int(row["frame"]), code, conf])
+        self._pending_flags, self._pending_emotions, self._pending_z = 0, [], np.nan
+        self.write_sec += time.perf_counter() - t0
+
+    # ------------------------------------------------------------------
+    # eventos do contexto
+    # ------------------------------------------------------------------
+    def activity(self, frame_idx: int):
+        self._mark(frame_idx, FLAG_ACTIVITY)
+
+    def anomaly(self, event: dict):
+        self._mark(event["frame"], ANOMALY_FLAGS.get(event["type"], 0), z=event.get("z"))
+
+    def emotion(self, frame_idx: int, emotion: str, conf=None):
+        code = self._code("emotion", emotion)
+        conf = None if conf is None else float(conf)
+        if self._is_pending(frame_idx):
+            self._pending_flags |= FLAG_EMOTION
+            self._pending_emotions.append((code, conf))
+            return
+        row = self._last_row(frame_idx)
+        if row is None:
+            return
+        # chegou depois da linha do frame (ex: resposta assíncrona em finish())
+        if row["flags"] & FLAG_EMOTION:
+            self.emotion_overflow.append([int(row["frame"]), int(row["emotion"]),
+                                          None if np.isnan(row["emotion_conf"]) else float(row["emotion_conf"])])
+        row["flags"] |= FLAG_EMOTION
+        row["emotion"] = code
+        row["emotion_conf"] = np.nan if conf is None else conf
+        self._touch()
+
+    def _mark(self, frame_idx: int, flag: int, z=None):
+        if self._is_pending(frame_idx):
+            self._pending_flags |= flag
+            if z is not None:
+                self._pending_z = z
+            return
+        row = self._last_row(frame_idx)
+        if row is None:
+            return
+        row["flags"] |= flag
+        if z is not None:
+            row["anomaly_z"] = z
+        self._touch()
+
+    def _is_pending(self, frame_idx) -> bool:
+        # o evento é do próximo frame (a linha ainda não existe)
+        return self._n == 0 or frame_idx is None or frame_idx > self._chunk[self._n - 1]["frame"]
+
+    def _last_row(self, frame_idx):
+        if frame_idx == self._chunk[self._n - 1]["frame"]:
+            return self._chunk[self._n - 1]
+        print(f"[WARN] Timeline: evento do frame {frame_idx} chegou depois das linhas seguintes; ignorado")
+        return None
+
+    def _touch(self):
+        # a última linha já estava no disco (position()): regrava
+        if self._on_disk and self._n == 1:
+            self._f.seek(-TIMELINE_DTYPE.itemsize, os.SEEK_END)
+            self._f.write(self._chunk[self._n - 1:self._n].tobytes())
+            self._f.seek(0, os.SEEK_END)
+
+    def _code(self, kind: str, label) -> int:
+        if label is None:
+            return -1
+        codes = self._codes[kind]
+        if label not in codes:
+            codes[label] = len(self.labels[kind])
+            self.labels[kind].append(label)
+        return codes[label]
+
+    def _flush(self):
+        # grava as linhas do bloco que ainda não estão no disco; a última
+        # continua no início do bloco (ainda pode receber eventos)
+        if self._n == 0:
+            return
+        self._f.write(self._chunk[self._on_disk:self._n].tobytes())
+        self._chunk[0] = self._chunk[self._n - 1]
+        self._n = 1
+        self._on_disk = 1
+
+    # ------------------------------------------------------------------
+    # checkpoint / fim
+    # ------------------------------------------------------------------
+    def position(self) -> dict:
+        """Grava tudo no disco e devolve o estado para retomar (ver `resume`)."""
+        self._flush()
+        self._f.flush()
+        return {
+            "rows": self.rows,
+            "labels": {k: list(v) for k, v in self.labels.items()},
+            "emotion_overflow": [list(e) for e in self.emotion_overflow],
+        }
+
+    def close(self, processed_frames: int = None):
+        if self._f.closed:
+            return
+        self.position()
+        self._f.close()
+        write_timeline_meta(self.path, self.rows, self.fps, self.labels, self.emotion_overflow,
+                            processed_frames=processed_frames)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "rows": self.rows,
+            "bytes": self.rows * TIMELINE_DTYPE.itemsize,
+            "write_ms": 1000.0 * self.write_sec,
+        }
+
+
+def write_timeline_meta(path, rows: int, fps: float, labels: dict, emotion_overflow: list,
+                        processed_frames: int = None):
+    meta = {
+        "version": 1,
+        "data": data_path(path).name,
+        "rows": rows,
+        "fps": fps,
+        "processed_frames": rows if processed_frames is None else processed_frames,
+        "dtype": [[name, TIMELINE_DTYPE[name].str] for name in TIMELINE_DTYPE.names],
+        "flags": {"activity": FLAG_ACTIVITY, "emotion": FLAG_EMOTION, **ANOMALY_FLAGS},
+        "labels": labels,
+        "emotion_overflow": emotion_overflow,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def merge_timelines(paths: list, output_path: str, fps: float, anomalies: list = (),
+                    processed_frames: int = None) -> dict:
+    """
+    Junta timelines de segmentos consecutivos (modo --workers) em um só e
+    marca as anomalias aceitas no processo principal (após o cooldown).
+    Os códigos de rótulo de cada segmento são convertidos para os do
+    primeiro. Retorna as estatísticas no formato de TimelineWriter.stats().
+    """
+    parts = [Timeline.load(p, mmap=False) for p in paths]
+    labels = {k: list(v) for k, v in parts[0].meta["labels"].items()} if parts else {}
+    overflow = []
+    rows = []
+    for part in parts:
+        data = part.rows.copy()
+        for kind in ("activity", "emotion"):
+            remap = np.array([_add_label(labels[kind], name) for name in part.meta["labels"][kind]] + [-1],
+                             dtype=np.int8)
+            data[kind] = remap[data[kind]]  # -1 indexa o último (-1)
+        for frame, code, conf in part.meta["emotion_overflow"]:
+            overflow.append([frame, _add_label(labels["emotion"], part.meta["labels"]["emotion"][code]), conf])
+        rows.append(data)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=TIMELINE_DTYPE)
+
+    if len(anomalies):
+        frames = np.array([a["frame"] for a in anomalies])
+        idx = np.searchsorted(rows["frame"], frames)
+        for i, a in zip(idx, anomalies):
+            if i < len(rows) and rows["frame"][i] == a["frame"]:
+                rows["flags"][i] |= ANOMALY_FLAGS.get(a["type"], 0)
+                rows["anomaly_z"][i] = a["z"]
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    rows.tofile(data_path(output_path))
+    write_timeline_meta(output_path, len(rows), fps, labels, overflow, processed_frames=processed_frames)
+    return {"path": str(output_path), "rows": len(rows), "bytes": int(rows.nbytes), "write_ms": 0.0}
+
+
+def _add_label(labels: list, name: str) -> int:
+    if name not in labels:
+        labels.append(name)
+    return labels.index(name)
+
+
+# ----------------------------------------------------------------------
+# consulta
+# ----------------------------------------------------------------------
+class Timeline:
+    """
+    Leitura e consulta de um timeline (.json + .bin). As linhas ficam em
+    um array estruturado (memmap por padrão: só as colunas/trechos usados
+    saem do disco); filtros devolvem um novo Timeline sobre o subconjunto.
+
+        tl = Timeline.load("outputs/report.timeline.json")
+        tl.between(600, 720).motion_stats()
+        tl.with_faces(2).seconds()
+        summary_from_timeline(tl)
+    """
+
+    def __init__(self, rows, meta: dict):
+        self.rows = rows
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Timeline":
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        dtype = np.dtype([tuple(c) for c in meta["dtype"]])
+        data = Path(path).with_name(meta["data"])
+        if meta["rows"] == 0:
+            rows = np.zeros(0, dtype=dtype)
+        elif mmap:
+            rows = np.memmap(data, dtype=dtype, mode="r", shape=(meta["rows"],))
+        else:
+            rows = np.fromfile(data, dtype=dtype, count=meta["rows"])
+        return cls(rows, meta)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, column: str):
+        return self.rows[column]
+
+    @property
+    def fps(self) -> float:
+        return self.meta["fps"]
+
+    # filtros -----------------------------------------------------------
+    def between(self, start_sec: float = None, end_sec: float = None) -> "Timeline":
+        """Frames com start_sec <= time_sec <= end_sec (as linhas estão em ordem de tempo)."""
+        t = self.rows["time_sec"]
+        lo = 0 if start_sec is None else int(np.searchsorted(t, start_sec, side="left"))
+        hi = len(t) if end_sec is None else int(np.searchsorted(t, end_sec, side="right"))
+        return Timeline(self.rows[lo:hi], self.meta)
+
+    def where(self, mask) -> "Timeline":
+        return Timeline(self.rows[np.asarray(mask, dtype=bool)], self.meta)
+
+    def with_faces(self, min_faces: int = 1) -> "Timeline":
+        return self.where(self.rows["faces"] >= min_faces)
+
+    def with_activity(self, label: str) -> "Timeline":
+        return self.where(self.rows["activity"] == self._code("activity", label))
+
+    def with_emotion(self, label: str) -> "Timeline":
+        return self.where(self.rows["emotion"] == self._code("emotion", label))
+
+    def activity_samples(self) -> "Timeline":
+        """Só os frames em que a atividade foi analisada (motion medido neste frame)."""
+        return self.where(self.rows["flags"] & FLAG_ACTIVITY)
+
+    # agregações --------------------------------------------------------
+    def seconds(self) -> float:
+        return len(self.rows) / self.fps if self.fps else 0.0
+
+    def activity_counts(self) -> dict:
+        """Amostras de atividade por rótulo (como VideoAnalysisContext.activity_counts)."""
+        codes = self.rows["activity"][(self.rows["flags"] & FLAG_ACTIVITY) != 0]
+        return self._count("activity", codes)
+
+    def emotion_counts(self) -> dict:
+        """Emoções registradas por rótulo (como VideoAnalysisContext.emotion_counts)."""
+        codes = self.rows["emotion"][(self.rows["flags"] & FLAG_EMOTION) != 0]
+        counts = self._count("emotion", codes)
+        if self.meta["emotion_overflow"] and len(self.rows):
+            first, last = int(self.rows["frame"][0]), int(self.rows["frame"][-1])
+            frames = set(self.rows["frame"].tolist()) if len(self.rows) != last - first + 1 else None
+            names = self.meta["labels"]["emotion"]
+            for frame, code, _ in self.meta["emotion_overflow"]:
+                if first <= frame <= last and (frames is None or frame in frames):
+                    counts[names[code]] = counts.get(names[code], 0) + 1
+        return counts
+
+    def anomalies(self, limit: int = None) -> list:
+        flags = self.rows["flags"]
+        idx = np.flatnonzero(flags & (FLAG_HIGH_MOTION | FLAG_LOW_MOTION))
+        if limit is not None:
+            idx = idx[:limit]
+        names = self.meta["labels"]["activity"]
+        out = []
+        for i in idx:
+            r = self.rows[i]
+            out.append({
+                "frame": int(r["frame"]),
+                "time_sec": float(r["time_sec"]),
+                "type": "high_motion" if r["flags"] & FLAG_HIGH_MOTION else "low_motion",
+                "z": float(r["anomaly_z"]),
+                "motion": float(r["motion"]),
+                "activity": names[r["activity"]] if r["activity"] >= 0 else None,
+            })
+        return out
+
+    def anomalies_count(self) -> int:
+        return int(np.count_nonzero(self.rows["flags"] & (FLAG_HIGH_MOTION | FLAG_LOW_MOTION)))
+
+    def motion_stats(self) -> dict:
+        """motion_score nas amostras de atividade do trecho."""
+        motion = self.rows["motion"][(self.rows["flags"] & FLAG_ACTIVITY) != 0].astype(np.float64)
+        if len(motion) == 0:
+            return {"samples": 0, "mean": None, "max": None, "p95": None}
+        return {
+            "samples": int(len(motion)),
+            "mean": float(motion.mean()),
+            "max": float(motion.max()),
+            "p95": float(np.percentile(motion, 95)),
+        }
+
+    def face_stats(self) -> dict:
+        faces = self.rows["faces"]
+        return {
+            "frames_with_face": int(np.count_nonzero(faces)),
+            "total_face_detections": int(faces.sum(dtype=np.int64)),
+            "max_faces": int(faces.max()) if len(faces) else 0,
+        }
+
+    def aggregate(self) -> dict:
+        return {
+            "frames": len(self.rows),
+            "seconds": self.seconds(),
+            "start_sec": float(self.rows["time_sec"][0]) if len(self.rows) else None,
+            "end_sec": float(self.rows["time_sec"][-1]) if len(self.rows) else None,
+            **self.face_stats(),
+            "motion": self.motion_stats(),
+            "activities": self.activity_counts(),
+            "emotions": self.emotion_counts(),
+            "anomalies_count": self.anomalies_count(),
+        }
+
+    def _code(self, kind: str, label: str) -> int:
+        labels = self.meta["labels"][kind]
+        return labels.index(label) if label in labels else -2  # -2: nenhum frame
+
+    def _count(self, kind: str, codes) -> dict:
+        names = self.meta["labels"][kind]
+        counts = np.bincount(codes[codes >= 0].astype(np.int64), minlength=len(names))
+        return {names[i]: int(c) for i, c in enumerate(counts) if c}
+
+
+def summary_from_timeline(timeline) -> dict:
+    """
+    Mesmo resultado de build_summary na análise, calculado só a partir do
+    timeline (caminho do .json ou Timeline), sem reprocessar o vídeo.
+    """
+    if not isinstance(timeline, Timeline):
+        timeline = Timeline.load(timeline)
+    return build_summary(
+        processed_frames=timeline.meta["processed_frames"],
+        fps=timeline.fps,
+        emotions=timeline.emotion_counts(),
+        activities=timeline.activity_counts(),
+        anomalies=timeline.anomalies(limit=5),
+        anomalies_count=timeline.anomalies_count(),
+    )
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Consulta o timeline por frame de uma análise")
+    p.add_argument("timeline", help="Arquivo .timeline.json gerado pela análise")
+    p.add_argument("--start", type=float, default=None, help="Início do trecho (s)")
+    p.add_argument("--end", type=float, default=None, help="Fim do trecho (s)")
+    p.add_argument("--min_faces", type=int, default=None, help="Só frames com pelo menos N faces")
+    p.add_argument("--activity", default=None, help="Só frames com esta atividade atual")
+    p.add_argument("--emotion", default=None, help="Só frames com esta emoção atual")
+    p.add_argument("--anomalies", action="store_true", help="Lista as anomalias do trecho")
+    p.add_argument("--summary", action="store_true", help="Regenera o resumo (build_summary) do vídeo")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    timeline = Timeline.load(args.timeline)
+    if args.summary:
+        print(json.dumps(summary_from_timeline(timeline), ensure_ascii=False, indent=2))
+        return
+
+    tl = timeline.between(args.start, args.end)
+    if args.min_faces is not None:
+        tl = tl.with_faces(args.min_faces)
+    if args.activity:
+        tl = tl.with_activity(args.activity)
+    if args.emotion:
+        tl = tl.with_emotion(args.emotion)
+    result = tl.aggregate()
+    if args.anomalies:
+        result["anomalies"] = tl.anomalies()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
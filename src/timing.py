@@ -0,0 +1,181 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+
+# limites superiores dos buckets do histograma (segundos)
+BUCKETS_SEC = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    """Context manager reutilizável de um estágio (um por nome, sem reentrância)."""
+
+    __slots__ = ("_timer", "_name", "_t0")
+
+    def __init__(self, timer, name: str):
+        self._timer = timer
+        self._name = name
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._timer.record(self._name, time.perf_counter() - self._t0)
+        return False
+
+
+class StageTimer:
+    """
+    Latência por estágio (contagem, soma, máximo e histograma por buckets).
+
+        with timer.stage("face"):
+            faces = tracker.update(...)
+
+    Desligado (enabled=False), stage() devolve sempre o mesmo nullcontext e
+    record() retorna na hora, então a instrumentação pode ficar no código.
+    Cada nome de estágio deve ser medido por uma thread de cada vez com
+    stage(); de várias threads ao mesmo tempo, use record() com o tempo medido.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._spans = {}
+        self._stages = {}  # nome -> [count, total, max, buckets]
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        span = self._spans.get(name)
+        if span is None:
+            span = self._spans[name] = _Span(self, name)
+        return span
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            s = self._stages.get(name)
+            if s is None:
+                s = self._stages[name] = [0, 0.0, 0.0, [0] * (len(BUCKETS_SEC) + 1)]
+            s[0] += 1
+            s[1] += seconds
+            if seconds > s[2]:
+                s[2] = seconds
+            s[3][bisect.bisect_left(BUCKETS_SEC, seconds)] += 1
+
+    def report(self):
+        """Bloco `timings` do report.json (None se desligado)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            raw = {
+                name: {"count": c, "total_sec": total, "max_sec": mx, "buckets": list(buckets)}
+                for name, (c, total, mx, buckets) in self._stages.items()
+            }
+        return summarize_timings(raw)
+
+
+# instância desligada, usada quando nenhum timer é informado
+NULL_TIMER = StageTimer(enabled=False)
+
+
+def _bucket_quantile(buckets: list, count: int, q: float, max_sec: float):
+    # limite superior do bucket que contém o quantil (estimativa pelo histograma);
+    # no bucket de estouro (acima do último limite) o limite é o máximo observado
+    if count == 0:
+        return None
+    target = q * count
+    seen = 0
+    for i, c in enumerate(buckets[:len(BUCKETS_SEC)]):
+        seen += c
+        if seen >= target:
+            return BUCKETS_SEC[i]
+    return max_sec
+
+
+def summarize_timings(raw: dict) -> dict:
+    """Acrescenta médias e quantis estimados a {estágio: {count, total_sec, max_sec, buckets}}."""
+    out = {}
+    for name in sorted(raw):
+        s = raw[name]
+        count = s["count"]
+        p50 = _bucket_quantile(s["buckets"], count, 0.50, s["max_sec"])
+        p99 = _bucket_quantile(s["buckets"], count, 0.99, s["max_sec"])
+        out[name] = {
+            "count": count,
+            "total_sec": s["total_sec"],
+            "max_sec": s["max_sec"],
+            "mean_ms": 1000.0 * s["total_sec"] / count if count else None,
+            "p50_ms_le": 1000.0 * p50 if p50 is not None else None,
+            "p99_ms_le": 1000.0 * p99 if p99 is not None else None,
+            # amostras acima do último bucket: os quantis que caem nelas valem max_sec
+            "overflow": s["buckets"][-1] > 0,
+            "buckets": s["buckets"],
+        }
+    return out
+
+
+def merge_timings(reports: list):
+    """Junta blocos `timings` (ex: dos segmentos de --workers)."""
+    reports = [r for r in reports if r]
+    if not reports:
+        return None
+    raw = {}
+    for report in reports:
+        for name, s in report.items():
+            m = raw.setdefault(name, {"count": 0, "total_sec": 0.0, "max_sec": 0.0,
+                                      "buckets": [0] * (len(BUCKETS_SEC) + 1)})
+            m["count"] += s["count"]
+            m["total_sec"] += s["total_sec"]
+            m["max_sec"] = max(m["max_sec"], s["max_sec"])
+            m["buckets"] = [a + b for a, b in zip(m["buckets"], s["buckets"])]
+    return summarize_timings(raw)
+
+
+def _labels_text(labels: dict) -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return ",".join(f'{k}="{esc(v)}"' for k, v in labels.items())
+
+
+def prometheus_text(timings: dict, labels: dict = None) -> str:
+    """Histogramas no formato de exposição do Prometheus (buckets cumulativos)."""
+    metric = "video_analysis_stage_seconds"
+    lines = [
+        f"# HELP {metric} Latência por estágio do pipeline de análise de vídeo.",
+        f"# TYPE {metric} histogram",
+    ]
+    for name, s in (timings or {}).items():
+        base = {**(labels or {}), "stage": name}
+        cumulative = 0
+        for le, c in zip(list(BUCKETS_SEC) + ["+Inf"], s["buckets"]):
+            cumulative += c
+            le_text = le if isinstance(le, str) else repr(le)
+            lines.append(f"{metric}_bucket{{{_labels_text({**base, 'le': le_text})}}} {cumulative}")
+        lines.append(f"{metric}_sum{{{_labels_text(base)}}} {s['total_sec']!r}")
+        lines.append(f"{metric}_count{{{_labels_text(base)}}} {s['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: str, timings: dict, labels: dict = None) -> None:
+    """
+    Grava o textfile para o collector do node exporter. A escrita é atômica
+    (temporário + os.replace), como o collector exige.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(timings, labels))
+    os.replace(tmp, path)
@@ -0,0 +1,323 @@
+import math
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+# backends de codificação aceitos por make_writer (io_video)
+WRITER_BACKENDS = ("opencv", "ffmpeg")
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter (FourCC configurável; padrão mp4v)."""
+
+    def __init__(self, path: str, fps: float, width: int, height: int, fourcc: str = "mp4v"):
+        self.path = path
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Erro ao criar VideoWriter em: {path}")
+        self.frames = 0
+
+    def write(self, frame):
+        self._writer.write(frame)
+        self.frames += 1
+
+    def release(self):
+        self._writer.release()
+
+    def stats(self) -> dict:
+        return {"backend": "opencv", "frames": self.frames, "paths": [self.path]}
+
+
+class FFmpegWriter:
+    """
+    Envia os frames crus (bgr24) pelo stdin de um processo `ffmpeg` local,
+    que codifica com `codec`/`preset`/`crf` em `threads` threads (0 = o
+    ffmpeg decide). A codificação roda em outro processo, em paralelo.
+    """
+
+    def __init__(self, path: str, fps: float, width: int, height: int, codec: str = "libx264",
+                 preset: str = "veryfast", crf: int = 23, threads: int = 0, ffmpeg: str = "ffmpeg"):
+        binary = shutil.which(ffmpeg)
+        if binary is None:
+            raise RuntimeError(f"ffmpeg não encontrado ({ffmpeg}); instale-o ou use --writer opencv")
+
+        self.path = path
+        self.frame_bytes = width * height * 3
+        cmd = [
+            binary, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps}",
+            "-i", "-",
+            "-an", "-c:v", codec, "-preset", preset, "-crf", str(crf), "-threads", str(threads),
+            "-pix_fmt", "yuv420p",
+            path,
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.codec = codec
+        self.frames = 0
+
+    def write(self, frame):
+        if frame.nbytes != self.frame_bytes:
+            raise RuntimeError(f"Frame com tamanho inesperado para o ffmpeg: {frame.shape}")
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg encerrou durante a escrita: {self._stderr()}")
+        self.frames += 1
+
+    def release(self):
+        if self._proc.stdin is not None and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg falhou ao gerar {self.path}: {self._stderr()}")
+
+    def stats(self) -> dict:
+        return {"backend": "ffmpeg", "codec": self.codec, "frames": self.frames, "paths": [self.path]}
+
+    def _stderr(self) -> str:
+        try:
+            return self._proc.stderr.read().decode("utf-8", "replace").strip()[-500:]
+        except Exception:
+            return ""
+
+
+class ScaledWriter:
+    """
+    Reduz a saída antes de codificar: redimensiona para (width, height) e/ou
+    descarta frames para passar de `fps` para `out_fps` (decimação uniforme).
+    O writer interno deve ter sido criado com o tamanho e o fps de saída.
+
+    frame_offset: quantos frames do vídeo vieram antes deste writer (partes
+    de um mesmo vídeo, ver PartWriter e --workers); a decimação continua na
+    mesma fase, então as partes juntas têm os frames de um writer único.
+    """
+
+    def __init__(self, inner, fps: float, out_fps: float = None, size: tuple = None, frame_offset: int = 0):
+        self.inner = inner
+        self.size = size
+        self.ratio = min(1.0, out_fps / fps) if out_fps and fps > 0 else 1.0
+        self._acc = math.fmod(frame_offset * self.ratio, 1.0) if self.ratio < 1.0 else 0.0
+        self._buffer = None
+        self.received = 0
+
+    def write(self, frame):
+        self.received += 1
+        if self.ratio < 1.0:
+            # mantém um frame a cada 1/ratio, distribuídos uniformemente
+            self._acc += self.ratio
+            if self._acc < 1.0 - 1e-9:
+                return
+            self._acc -= 1.0
+        if self.size is not None and (frame.shape[1], frame.shape[0]) != self.size:
+            if self._buffer is None:
+                self._buffer = np.empty((self.size[1], self.size[0], 3), dtype=frame.dtype)
+            frame = cv2.resize(frame, self.size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        self.inner.write(frame)
+
+    def release(self):
+        self.inner.release()
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "frames_received": self.received,
+                "size": list(self.size) if self.size else None, "fps_ratio": self.ratio}
+
+
+class SegmentedWriter:
+    """
+    Divide a saída em arquivos de `segment_frames` frames cada:
+    <nome>_000.mp4, <nome>_001.mp4, ... `factory(path)` cria o writer de
+    cada arquivo.
+    """
+
+    def __init__(self, path: str, segment_frames: int, factory):
+        p = Path(path)
+        self.pattern = str(p.with_name(f"{p.stem}_{{:03d}}{p.suffix}"))
+        self.segment_frames = max(1, segment_frames)
+        self.factory = factory
+        self.paths = []
+        self._current = None
+        self._in_segment = 0
+        self._closed_stats = []
+
+    def write(self, frame):
+        if self._current is None or self._in_segment >= self.segment_frames:
+            self._rotate()
+        self._current.write(frame)
+        self._in_segment += 1
+
+    def release(self):
+        if self._current is not None:
+            self._current.release()
+            self._closed_stats.append(self._current.stats())
+            self._current = None
+
+    def stats(self) -> dict:
+        parts = self._closed_stats + ([self._current.stats()] if self._current is not None else [])
+        return {
+            "backend": parts[0]["backend"] if parts else None,
+            "frames": sum(s["frames"] for s in parts),
+            "paths": list(self.paths),
+            "segment_frames": self.segment_frames,
+        }
+
+    def _rotate(self):
+        self.release()
+        path = self.pattern.format(len(self.paths))
+        self.paths.append(path)
+        self._current = self.factory(path)
+        self._in_segment = 0
+
+
+class ThreadedWriter:
+    """
+    Codifica em uma thread própria, então o loop de frames não espera a
+    codificação. write() copia o frame para um buffer livre (o chamador
+    pode reaproveitar o frame em seguida); write_owned() recebe o próprio
+    frame, sem cópia, e chama done() na thread do writer depois da
+    codificação (ex: devolver o buffer ao FramePool, ver write_frame).
+    São no máximo `queue_size` frames na fila; com a fila cheia, a escrita
+    espera (backpressure). Erros da thread são relançados na próxima
+    escrita ou no release().
+    """
+
+    def __init__(self, inner, queue_size: int = 8):
+        self.inner = inner
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._free = queue.SimpleQueue()
+        self._error = None
+        self.waits = 0
+        self.copies = 0
+        self._thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        try:
+            buf = self._free.get_nowait()
+            if buf.shape != frame.shape:
+                buf = np.empty_like(frame)
+        except queue.Empty:
+            buf = np.empty_like(frame)
+        np.copyto(buf, frame)
+        self.copies += 1
+        self._put(buf, None)
+
+    def write_owned(self, frame, done):
+        self._put(frame, done)
+
+    def _put(self, frame, done):
+        if self._error is not None:
+            raise self._error
+        if self._queue.full():
+            self.waits += 1
+        self._queue.put((frame, done))
+
+    def release(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.inner.release()
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "threaded": True, "queue_waits": self.waits, "copies": self.copies}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, done = item
+            if self._error is None:
+                try:
+                    self.inner.write(frame)
+                except BaseException as e:
+                    self._error = e
+            if done is None:
+                self._free.put(frame)
+            else:
+                done()
+
+
+def write_frame(writer, frame, done):
+    """
+    Escreve `frame` e chama done() quando o buffer pode ser reaproveitado:
+    depois da codificação, na thread do writer, se ele aceita o frame sem
+    cópia (write_owned); senão, logo após write().
+    """
+    write_owned = getattr(writer, "write_owned", None)
+    if write_owned is not None:
+        write_owned(frame, done)
+    else:
+        writer.write(frame)
+        done()
+
+
+def create_writer(output_path: str, fps: float, width: int, height: int, backend: str = "opencv",
+                  codec: str = None, preset: str = "veryfast", crf: int = 23, threads: int = 0,
+                  out_width: int = None, out_fps: float = None, segment_sec: float = None,
+                  queue_size: int = 0, frame_offset: int = 0):
+    """
+    Monta o writer conforme as opções (ver make_writer em io_video):
+    backend -> redução de resolução/fps -> segmentação -> thread própria.
+    """
+    if backend not in WRITER_BACKENDS:
+        raise RuntimeError(f"Backend de vídeo desconhecido: {backend} (opções: {', '.join(WRITER_BACKENDS)})")
+
+    size, enc_fps = output_geometry(width, height, fps, out_width, out_fps)
+    enc_w, enc_h = size or (width, height)
+
+    def open_backend(path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if backend == "ffmpeg":
+            return FFmpegWriter(path, enc_fps, enc_w, enc_h, codec=codec or "libx264",
+                                preset=preset, crf=crf, threads=threads)
+        return OpenCVWriter(path, enc_fps, enc_w, enc_h, fourcc=codec or "mp4v")
+
+    if segment_sec:
+        writer = SegmentedWriter(output_path, int(round(segment_sec * enc_fps)), open_backend)
+    else:
+        writer = open_backend(output_path)
+
+    if size is not None or enc_fps < fps:
+        writer = ScaledWriter(writer, fps, out_fps=enc_fps, size=size, frame_offset=frame_offset)
+    if queue_size > 0:
+        writer = ThreadedWriter(writer, queue_size=queue_size)
+    return writer
+
+
+def output_geometry(width: int, height: int, fps: float, out_width: int = None, out_fps: float = None):
+    """(size, fps) do vídeo codificado; size=None mantém a resolução de entrada."""
+    size = None
+    if out_width and out_width < width:
+        # altura par: exigência do yuv420p no ffmpeg
+        size = (out_width - out_width % 2, int(round(height * out_width / width / 2)) * 2)
+    return size, (min(out_fps, fps) if out_fps else fps)
+
+
+def writer_options(args) -> dict:
+    """Opções de create_writer a partir da linha de comando (options.add_analysis_args)."""
+    return {
+        "backend": args.writer,
+        "codec": args.writer_codec,
+        "preset": args.writer_preset,
+        "crf": args.writer_crf,
+        "threads": args.writer_threads,
+        "out_width": args.out_width,
+        "out_fps": args.out_fps,
+        "segment_sec": 60.0 * args.segment_minutes if args.segment_minutes else None,
+        "queue_size": args.writer_queue,
+    }
+
+
+def output_size(paths: list) -> int:
+    """Soma do tamanho em bytes dos arquivos gerados (os que existirem)."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+# os módulos do projeto usam imports planos (src/ no sys.path), como em `python src/main.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from openai_stub import start_stub_server  # noqa: E402
+
+EMOTIONS = ("neutral", "happy", "surprise", "sad")
+FACE_SIZE = 24
+
+
+def face_box(i):
+    """Caixa (x1, y1) da face vermelha no frame i (None = sem face)."""
+    if 200 <= i < 260:
+        return None
+    return 40 + i // 10, 50 + (i // 45) % 3
+
+
+def make_video(path, n=600, w=192, h=144, fps=30.0):
+    """
+    Vídeo sintético (mp4v): fundo fixo com ruído, um bloco que anda sem
+    parar, rajadas de ruído (anomalias de movimento) e uma "face" vermelha
+    que some entre os frames 200 e 259 e muda de padrão a cada 60 frames.
+    """
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 90, size=(h, w, 3), dtype=np.uint8)
+    face = np.full((FACE_SIZE, FACE_SIZE, 3), 30, np.uint8)
+    face[..., 2] = rng.integers(170, 255, size=(FACE_SIZE, FACE_SIZE), dtype=np.uint8)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    for i in range(1, n + 1):
+        frame = background.copy()
+        x = (3 * i) % (w - 30)
+        frame[90:120, x:x + 30] = 220
+        if any(a <= i < a + 8 for a in (330, 450, 540)):
+            frame[10:130, 20:170] = rng.integers(0, 255, size=(120, 150, 3), dtype=np.uint8)
+        box = face_box(i)
+        if box is not None:
+            fx, fy = box
+            frame[fy:fy + FACE_SIZE, fx:fx + FACE_SIZE] = face
+            k = (i // 60) % 4
+            frame[fy + 4 + 4 * k:fy + 10 + 4 * k, fx + 6:fx + 18] = (30, 30, 120)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+class FakeFaceDetector:
+    """
+    Detector para os testes (sem MediaPipe): a face é a região vermelha do
+    frame, no formato de FaceDetector.detect. `crash_after` levanta
+    Interrupted nessa chamada (simula um processo interrompido).
+    """
+
+    detect_width = None
+
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.calls = 0
+
+    def detect(self, bgr_frame, features=None, rois=None):
+        self.calls += 1
+        if self.crash_after is not None and self.calls >= self.crash_after:
+            raise Interrupted(self.calls)
+        h, w = bgr_frame.shape[:2]
+        regions = rois if rois is not None else [(0, 0, w, h)]
+        faces = []
+        for x1, y1, x2, y2 in regions:
+            b, g, r = (bgr_frame[y1:y2, x1:x2, c].astype(np.int16) for c in range(3))
+            ys, xs = np.nonzero((r > 150) & (g < 100) & (b < 100))
+            if len(xs) >= 16:
+                faces.append({"x1": x1 + int(xs.min()), "y1": y1 + int(ys.min()),
+                              "x2": x1 + int(xs.max()) + 1, "y2": y1 + int(ys.max()) + 1, "score": 0.9})
+        return faces
+
+
+class Interrupted(Exception):
+    pass
+
+
+def emotion_by_content(req):
+    """reply_fn do stub: o rótulo depende só da imagem enviada (mesmo recorte, mesma resposta)."""
+    url = req["messages"][0]["content"][1]["image_url"]["url"]
+    digest = hashlib.sha1(url.encode("ascii")).digest()
+    return json.dumps({"emotion": EMOTIONS[digest[0] % len(EMOTIONS)], "confidence": 0.5 + digest[1] / 512})
+
+
+@pytest.fixture(scope="session")
+def synthetic_video(tmp_path_factory):
+    return make_video(tmp_path_factory.mktemp("video") / "synthetic.mp4")
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    server, base_url = start_stub_server(reply_fn=emotion_by_content)
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def run_args(video, out_dir, *extra):
+    """Opções de main.py para uma execução com saídas em out_dir."""
+    from main import parse_args
+
+    out_dir = Path(out_dir)
+    return parse_args(["--video", str(video), "--out_report", str(out_dir / "report.json"),
+                       "--out_video", str(out_dir / "annotated.mp4"), *map(str, extra)])
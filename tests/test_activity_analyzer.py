@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from analyzers.activity_analyzer import ActivityAnalyzer
+
+
+def frames(n, h=90, w=120, seed=0):
+    """BGR com blocos que se movem e encostam nas bordas de cima e de baixo (o caso da linha separadora)."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        f = np.full((h, w, 3), 90, np.uint8)
+        f += rng.integers(0, 12, size=(h, w, 1), dtype=np.uint8)  # ruído abaixo do limiar
+        x = (7 * i) % (w - 20)
+        # faixas de 2 linhas nas bordas: só sobrevivem à erosão por causa da borda da imagem
+        f[0:2, x:x + 20] = 250
+        f[h - 2:h, w - 20 - x:w - x] = 10
+        if i % 3 == 0:
+            f[30:60, 40:40 + (i % 40)] = 200    # movimento maior em parte dos frames
+        out.append(f)
+    return out
+
+
+def per_frame(analyzer, bgrs):
+    results = [analyzer.analyze(f) for f in bgrs]
+    return [label for label, _ in results], np.array([score for _, score in results])
+
+
+def chunked(analyzer, bgrs, sizes):
+    grays = np.stack([analyzer.preprocess(f) for f in bgrs])
+    labels, scores, start = [], [], 0
+    for size in sizes:
+        l, s = analyzer.analyze_chunk(grays[start:start + size])
+        labels += l.tolist()
+        scores.append(s)
+        start += size
+    assert start == len(bgrs)
+    return labels, np.concatenate(scores)
+
+
+@pytest.mark.parametrize("sizes", [[40], [1, 39], [7, 1, 13, 19], [2] * 20, [39, 1]])
+def test_chunk_matches_per_frame(sizes):
+    bgrs = frames(40)
+    ref, chunk = ActivityAnalyzer(), ActivityAnalyzer()
+    ref_labels, ref_scores = per_frame(ref, bgrs)
+    labels, scores = chunked(chunk, bgrs, sizes)
+
+    assert labels[0] == "still" and scores[0] == 0.0  # primeiro frame só inicializa o histórico
+    assert labels == ref_labels
+    np.testing.assert_array_equal(scores, ref_scores)
+    np.testing.assert_array_equal(chunk.prev_gray, ref.prev_gray)
+    assert len(set(ref_labels)) > 1  # a série passa por mais de uma categoria
+
+
+def test_chunk_continues_after_per_frame_calls():
+    bgrs = frames(30, seed=1)
+    ref, mixed = ActivityAnalyzer(), ActivityAnalyzer()
+    ref_labels, ref_scores = per_frame(ref, bgrs)
+
+    labels, scores = per_frame(mixed, bgrs[:11])
+    l, s = chunked(mixed, bgrs[11:], [19])
+    assert labels + l == ref_labels
+    np.testing.assert_array_equal(np.concatenate([scores, s]), ref_scores)
+
+
+def test_shape_change_restarts_history():
+    small, large = frames(12, seed=2), frames(12, h=120, w=160, seed=3)
+    ref, chunk = ActivityAnalyzer(), ActivityAnalyzer()
+    ref_labels, ref_scores = per_frame(ref, small + large)
+
+    labels_a, scores_a = chunked(chunk, small, [5, 7])
+    labels_b, scores_b = chunked(chunk, large, [12])
+    assert labels_b[0] == "still" and scores_b[0] == 0.0
+    assert labels_a + labels_b == ref_labels
+    np.testing.assert_array_equal(np.concatenate([scores_a, scores_b]), ref_scores)
+
+
+def test_empty_chunk_keeps_state():
+    analyzer = ActivityAnalyzer()
+    labels, scores = analyzer.analyze_chunk(np.empty((0, 90, 120), np.uint8))
+    assert len(labels) == 0 and len(scores) == 0
+    assert analyzer.prev_gray is None
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+
+import pytest
+
+from analyzer_graph import Analyzer, AnalyzerGraph, FrameState
+from conftest import FakeFaceDetector, run_args
+from main import analyze_video
+
+COMPARED = ("total_frames_analyzed", "frames_with_face_detected", "total_face_detections", "emotions",
+            "activities", "anomalies_count", "summary")
+
+
+class Recorder(Analyzer):
+    """Analyzer que registra início/fim de run() e apply(); `delay` segura o run() na thread."""
+
+    def __init__(self, name, requires=(), delay=0.0, log=None):
+        self.name, self.requires, self.delay, self.log = name, requires, delay, log
+        self.lock = threading.Lock()
+
+    def _record(self, event):
+        with self.lock:
+            self.log.append((event, self.name, threading.current_thread().name))
+
+    def run(self, processor, state):
+        self._record("run")
+        time.sleep(self.delay)
+        for dep in self.requires:
+            # a saída do analyzer requerido já está no estado do frame
+            assert dep in state.outputs
+        self._record("done")
+        return self.name
+
+    def apply(self, processor, state, output):
+        self._record("apply")
+
+
+def pipeline_graph(threads):
+    log = []
+    # face mais lenta que activity: no pool, activity termina primeiro
+    analyzers = [
+        Recorder("face", delay=0.05, log=log),
+        Recorder("emotion", requires=("face",), log=log),
+        Recorder("activity", delay=0.01, log=log),
+        Recorder("anomaly", requires=("activity",), log=log),
+    ]
+    return AnalyzerGraph(analyzers, threads=threads), log
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_dependents_run_after_their_requirements(threads):
+    graph, log = pipeline_graph(threads)
+    assert [[a.name for a in level] for level in graph.levels] == [["face", "activity"], ["emotion", "anomaly"]]
+
+    for frame_idx in range(1, 4):
+        del log[:]
+        graph.run(None, FrameState(None, frame_idx, frame_idx / 30.0, True, None))
+        order = [(event, name) for event, name, _ in log]
+        for dep, name in (("face", "emotion"), ("activity", "anomaly")):
+            assert order.index(("apply", dep)) < order.index(("run", name))
+        # os apply() rodam na thread do loop e na ordem do grafo
+        applies = [(name, thread) for event, name, thread in log if event == "apply"]
+        assert applies == [(name, threading.current_thread().name)
+                           for name in ("face", "activity", "emotion", "anomaly")]
+    graph.close()
+
+    run_threads = {name: thread for event, name, thread in log if event == "run"}
+    if threads:
+        assert run_threads["activity"].startswith("analyzer") and graph.parallel_levels == 6  # 2 níveis x 3 frames
+    else:
+        assert len(set(run_threads.values())) == 1 and graph.parallel_levels == 0
+
+
+def test_threads_give_same_per_frame_results(tmp_path, synthetic_video, openai_stub):
+    _, base_url = openai_stub
+    outputs = {}
+    for threads in (0, 2):
+        out_dir = tmp_path / f"threads{threads}"
+        report = analyze_video(run_args(synthetic_video, out_dir, "--openai_base_url", base_url, "--no-video",
+                                        "--analyzer_threads", threads, "--frame_results", out_dir / "frames.jsonl"),
+                               face_detector=FakeFaceDetector())
+        written = json.loads((out_dir / "report.json").read_text())
+        outputs[threads] = {
+            "report": {k: report[k] for k in COMPARED},
+            "anomalies": [(a["frame"], a["type"]) for a in written["anomalies"]],
+            "frame_results": (out_dir / "frames.jsonl").read_text(),
+        }
+        assert (report["analyzers"]["parallel_levels"] > 0) == bool(threads)
+
+    assert outputs[2] == outputs[0]
+    assert outputs[0]["anomalies"] and sum(outputs[0]["report"]["emotions"].values()) > 0
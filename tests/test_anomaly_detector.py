@@ -0,0 +1,137 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from analyzers.anomaly_detector import AnomalyDetector
+
+
+def reference_z(scores, window_size):
+    """Implementação original: cópia da janela (deque) e np.mean/np.std a cada update."""
+    hist = deque(maxlen=window_size)
+    out = np.full(len(scores), np.nan)
+    for i, s in enumerate(scores):
+        hist.append(float(s))
+        if len(hist) < max(15, window_size // 4):
+            continue
+        arr = np.array(hist, dtype=float)
+        std = float(arr.std())
+        out[i] = (s - float(arr.mean())) / (std if std > 1e-9 else 1e-9)
+    return out
+
+
+def flags_of(z, z_thresh):
+    flags = np.zeros(len(z), dtype=np.int8)
+    valid = ~np.isnan(z)
+    flags[valid & (z >= z_thresh)] = 1
+    flags[valid & (z <= -z_thresh)] = -1
+    return flags
+
+
+def streaming(scores, window_size, z_thresh):
+    """z de update() em todo frame (z_thresh=0 devolve o z de toda decisão) e os flags."""
+    det_z = AnomalyDetector(window_size=window_size, z_thresh=0.0)
+    det = AnomalyDetector(window_size=window_size, z_thresh=z_thresh)
+    z = np.full(len(scores), np.nan)
+    flags = np.zeros(len(scores), dtype=np.int8)
+    for i, s in enumerate(scores):
+        r = det_z.update(s)
+        if r is not None:
+            z[i] = r["z"]
+        r = det.update(s)
+        if r is not None:
+            flags[i] = 1 if r["type"] == "high_motion" else -1
+    return z, flags
+
+
+def series(seed, n=3000, offset=0.0, still=True):
+    rng = np.random.default_rng(seed)
+    scores = offset + rng.gamma(2.0, 0.004, size=n)
+    scores[rng.random(n) < 0.01] = offset + 0.2       # picos de movimento
+    if still:
+        scores[n // 2: n // 2 + 200] = offset         # trecho parado (std no piso)
+    return scores
+
+
+def assert_z_close(got, expected):
+    # somas acumuladas (batch) perdem alguns dígitos quando a std da janela é quase zero
+    assert np.array_equal(np.isnan(got), np.isnan(expected))
+    valid = ~np.isnan(expected)
+    diff = np.abs(got[valid] - expected[valid]) / np.maximum(1.0, np.abs(expected[valid]))
+    assert diff.max() < 1e-6
+
+
+@pytest.mark.parametrize("window_size", [20, 60, 97])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_streaming_and_batch_match_reference(window_size, seed):
+    scores = series(seed)
+    z_ref = reference_z(scores, window_size)
+    flags_ref = flags_of(z_ref, 3.0)
+    assert flags_ref.any()
+
+    z_stream, flags_stream = streaming(scores, window_size, 3.0)
+    assert_z_close(z_stream, z_ref)
+    assert np.array_equal(flags_stream, flags_ref)
+
+    batch = AnomalyDetector(window_size=window_size, z_thresh=3.0).update_batch(scores)
+    assert_z_close(batch["z"], z_ref)
+    assert np.array_equal(batch["flags"], flags_ref)
+
+
+def test_warmup_has_no_decision():
+    det = AnomalyDetector(window_size=60)
+    scores = series(3, n=100)
+    warmup = det.min_history - 1
+    assert all(det.update(s) is None for s in scores[:warmup])
+
+    batch = AnomalyDetector(window_size=60).update_batch(scores)
+    assert np.isnan(batch["z"][:warmup]).all()
+    assert not batch["flags"][:warmup].any()
+    assert not np.isnan(batch["z"][warmup:]).any()
+
+
+def test_window_smaller_than_min_history_never_decides():
+    scores = series(4, n=200)
+    det = AnomalyDetector(window_size=10)
+    assert all(det.update(s) is None for s in scores)
+    assert np.isnan(AnomalyDetector(window_size=10).update_batch(scores)["z"]).all()
+
+
+def test_resync_boundaries_with_large_offset():
+    # offset grande: o erro de arredondamento das somas incrementais apareceria sem o _resync
+    # (sem trecho parado: com std no piso, qualquer erro na média é multiplicado por 1e9)
+    window_size = 60
+    scores = series(5, n=20 * window_size + 7, offset=1000.0, still=False)
+    z_ref = reference_z(scores, window_size)
+    z_stream, flags = streaming(scores, window_size, 3.0)
+    assert np.array_equal(flags, flags_of(z_ref, 3.0))
+
+    around = np.array([k * window_size + d for k in range(1, 20) for d in (-1, 0, 1)])
+    assert_z_close(z_stream[around], z_ref[around])
+    assert_z_close(z_stream, z_ref)
+
+
+@pytest.mark.parametrize("split", [1, 14, 15, 59, 60, 61, 1000])
+def test_state_continues_between_update_and_batch(split):
+    window_size = 60
+    scores = series(6, n=1500)
+    z_ref = reference_z(scores, window_size)
+
+    # update() até `split`, depois update_batch() do resto
+    det = AnomalyDetector(window_size=window_size, z_thresh=0.0)
+    z = np.full(len(scores), np.nan)
+    for i, s in enumerate(scores[:split]):
+        r = det.update(s)
+        if r is not None:
+            z[i] = r["z"]
+    z[split:] = det.update_batch(scores[split:])["z"]
+    assert_z_close(z, z_ref)
+
+    # update_batch() em blocos e depois update() continua igual
+    det = AnomalyDetector(window_size=window_size, z_thresh=0.0)
+    z = np.concatenate([det.update_batch(scores[:split])["z"], np.full(len(scores) - split, np.nan)])
+    for i in range(split, len(scores)):
+        r = det.update(scores[i])
+        if r is not None:
+            z[i] = r["z"]
+    assert_z_close(z, z_ref)
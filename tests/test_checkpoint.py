@@ -0,0 +1,83 @@
+import gc
+import json
+from pathlib import Path
+
+import cv2
+import pytest
+
+from conftest import FakeFaceDetector, Interrupted, run_args
+from main import analyze_video
+
+COMPARED = ("total_frames_analyzed", "frames_with_face_detected", "total_face_detections", "emotions",
+            "activities", "anomalies_count", "summary", "face_tracking")
+
+
+def frame_count(path):
+    cap = cv2.VideoCapture(str(path))
+    count = 0
+    while cap.grab():
+        count += 1
+    cap.release()
+    return count
+
+
+def outputs(out_dir):
+    out_dir = Path(out_dir)
+    report = json.loads((out_dir / "report.json").read_text())
+    return {
+        "report": {k: report[k] for k in COMPARED},
+        "anomalies": report["anomalies"],
+        "emotion_requests": report["emotion_requests"]["requests"],
+        "emotion_cache": {k: report["emotion_cache"][k] for k in ("hits", "misses", "entries", "evictions")},
+        "events": (out_dir / "report.events.jsonl").read_text(),
+        "timeline": (out_dir / "report.timeline.bin").read_bytes(),
+        "frame_results": (out_dir / "frames.jsonl").read_text(),
+        "video_frames": frame_count(out_dir / "annotated.mp4"),
+    }
+
+
+@pytest.mark.parametrize("crash_at", [95, 400])
+def test_resume_matches_uninterrupted_run(tmp_path, synthetic_video, openai_stub, crash_at):
+    _, base_url = openai_stub
+    options = ["--openai_base_url", base_url, "--emotion_cache", "--writer_queue", "0"]
+
+    ref_dir = tmp_path / "ref"
+    analyze_video(run_args(synthetic_video, ref_dir, *options, "--frame_results", ref_dir / "frames.jsonl"),
+                  face_detector=FakeFaceDetector())
+
+    # checkpoint antes de cada frame e partes de 90 frames (3 s): a interrupção cai no meio de uma parte
+    run_dir = tmp_path / "run"
+    options += ["--frame_results", run_dir / "frames.jsonl", "--checkpoint_sec", "1e-9",
+                "--checkpoint_part_minutes", "0.05"]
+    with pytest.raises(Interrupted):
+        analyze_video(run_args(synthetic_video, run_dir, *options), face_detector=FakeFaceDetector(crash_at))
+    gc.collect()  # o que a execução interrompida deixou aberto é fechado antes da retomada
+    checkpoint = run_dir / "report.checkpoint"
+    assert checkpoint.exists() and (run_dir / "report.checkpoint.cache").exists()
+
+    report = analyze_video(run_args(synthetic_video, run_dir, *options, "--resume"),
+                           face_detector=FakeFaceDetector())
+    stats = report["checkpoint"]
+    assert stats["resumed_at"] == crash_at
+    assert stats["video_replayed"] == (crash_at - 1) % 90  # só a parte em andamento é refeita
+    assert stats["video_parts"] == 7  # 600 frames em partes de 90, e não uma por checkpoint
+    assert not checkpoint.exists() and not (run_dir / "report.checkpoint.cache").exists()
+
+    expected, resumed = outputs(ref_dir), outputs(run_dir)
+    assert resumed == expected
+    assert expected["video_frames"] == 600 and expected["emotion_cache"]["hits"] > 0
+
+
+def test_checkpoint_does_not_grow_with_cache(tmp_path, synthetic_video, openai_stub):
+    _, base_url = openai_stub
+    run_dir = tmp_path / "run"
+    options = ["--openai_base_url", base_url, "--emotion_cache", "--no-video", "--checkpoint_sec", "1e-9"]
+    with pytest.raises(Interrupted):
+        analyze_video(run_args(synthetic_video, run_dir, *options), face_detector=FakeFaceDetector(560))
+    gc.collect()
+
+    from checkpoint import load_checkpoint
+    state = load_checkpoint(str(run_dir / "report.checkpoint"), run_args(synthetic_video, run_dir, *options))
+    # só os contadores do cache ficam no checkpoint; as entradas estão no journal
+    assert set(state["state"]["emotion_cache"]) == {"hits", "misses", "evictions"}
+    assert state["cache_journal"] == (run_dir / "report.checkpoint.cache").stat().st_size
@@ -0,0 +1,153 @@
+import json
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from analyzers.emotion_analyzer_openai import EmotionAnalyzerOpenAI
+from conftest import emotion_by_content
+from openai_stub import start_stub_server
+
+
+class SlowReplies:
+    """
+    reply_fn do stub: responde como emotion_by_content, esperando `delays[i]`
+    segundos na i-ésima requisição (depois, `delay`), e registra o pico de
+    requisições simultâneas.
+    """
+
+    def __init__(self, delays=(), delay=0.0):
+        self.delays, self.delay = list(delays), delay
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, req):
+        with self.lock:
+            delay = self.delays[self.calls] if self.calls < len(self.delays) else self.delay
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(delay)
+            return emotion_by_content(req)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    servers = []
+
+    def start(replies):
+        server, base_url = start_stub_server(reply_fn=replies)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def crops(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, size=(40, 32, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def expected(crop):
+    """O que o stub responde para este recorte (mesmo JPEG que o analyzer envia)."""
+    url = f"data:image/jpeg;base64,{EmotionAnalyzerOpenAI._encode(crop)}"
+    data = json.loads(emotion_by_content({"messages": [{"content": [None, {"image_url": {"url": url}}]}]}))
+    return data["emotion"], data["confidence"]
+
+
+def test_timeout_is_retried(stub):
+    replies = SlowReplies(delays=[2.0])  # só a primeira passa do timeout
+    server, base_url = stub(replies)
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, timeout=0.3, max_retries=2, backoff_base=0.01)
+    crop = crops(1)[0]
+
+    assert analyzer.analyze(crop) == expected(crop)
+    assert analyzer.retries == 1 and server.requests == 2
+    assert analyzer.stats()["requests"] == 1  # a requisição lógica conta uma vez
+
+
+def test_timeout_gives_up_after_max_retries(stub):
+    replies = SlowReplies(delay=2.0)
+    server, base_url = stub(replies)
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, timeout=0.2, max_retries=2, backoff_base=0.01)
+
+    # síncrono e assíncrono: sem resposta, a amostra volta vazia em vez de travar
+    assert analyzer.analyze(crops(1)[0]) == (None, None)
+    assert analyzer.retries == 2 and server.requests == 3
+    future = analyzer.submit(crops(1, seed=1)[0])
+    assert future.result(timeout=10) == (None, None)
+    analyzer.close()
+
+
+def test_max_inflight_limits_concurrent_requests(stub):
+    replies = SlowReplies(delay=0.3)
+    _, base_url = stub(replies)
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=2)
+    faces = crops(5)
+
+    futures = [analyzer.submit(face) for face in faces]
+    # dois slots: os demais são descartados na hora, sem bloquear o loop
+    assert [f is not None for f in futures] == [True, True, False, False, False]
+    assert analyzer.stats()["dropped"] == 3
+
+    assert analyzer.drain(timeout=10) == [expected(faces[0]), expected(faces[1])]
+    # slots devolvidos: novos envios voltam a passar
+    assert analyzer.submit(faces[2]) is not None
+    assert analyzer.drain(timeout=10) == [expected(faces[2])]
+    assert replies.peak == 2
+    analyzer.close()
+
+
+def test_pending_requests_survive_checkpoint(stub):
+    replies = SlowReplies(delays=[0.0], delay=1.0)
+    server, base_url = stub(replies)
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=3)
+    faces = crops(3)
+
+    first = analyzer.submit(faces[0])
+    first.result(timeout=10)  # concluída, mas ainda não devolvida por poll()
+    analyzer.submit(faces[1])
+    analyzer.submit(faces[2])
+    # o checkpoint é um pickle: o estado tem que sobreviver a ele
+    state = pickle.loads(pickle.dumps(analyzer.pending_state()))
+    assert ["result" in entry for entry in state] == [True, False, False]
+    analyzer.close()  # processo interrompido
+
+    while replies.active:  # as requisições abandonadas terminam no servidor
+        time.sleep(0.05)
+    replies.delay, replies.peak = 0.2, 0
+    requests_before = server.requests
+    restored = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=1)
+    restored.restore_pending(state)  # mais pendentes que slots: espera um slot para cada uma
+    assert restored.submit(crops(1, seed=5)[0]) is None  # a última reenviada ainda ocupa o slot
+    # o resultado já recebido não é pedido de novo; as em andamento são reenviadas, em ordem
+    assert restored.drain(timeout=10) == [expected(face) for face in faces]
+    assert server.requests - requests_before == 2 and replies.peak == 1
+    restored.close()
+
+
+def test_pending_requests_without_client(stub, monkeypatch):
+    replies = SlowReplies(delay=1.0)
+    _, base_url = stub(replies)
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url)
+    analyzer.submit(crops(1)[0])
+    state = analyzer.pending_state()
+    analyzer.close()
+
+    # retomada sem chave da API: as pendentes viram amostras vazias, na mesma posição
+    monkeypatch.delenv("OPENAI_API_KEY")
+    restored = EmotionAnalyzerOpenAI(base_url=base_url)
+    restored.restore_pending([{"result": ["happy", 0.7]}] + state)
+    assert restored.poll() == [("happy", 0.7), (None, None)]
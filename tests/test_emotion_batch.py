@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pytest
+
+from analyzers.emotion_analyzer_openai import EmotionAnalyzerOpenAI
+from openai_stub import mosaic_reply_fn, start_stub_server
+
+EMOTIONS = ("neutral", "happy", "sad")
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    server, base_url = start_stub_server(reply_fn=mosaic_reply_fn(emotions=EMOTIONS))
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def crops(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, size=(60, 50, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def expected(n, batch):
+    # o stub responde o tile i do mosaico com EMOTIONS[i % 3]; recorte sozinho -> EMOTIONS[0]
+    labels = []
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        labels += [EMOTIONS[0]] if size == 1 else [EMOTIONS[i % len(EMOTIONS)] for i in range(size)]
+    return labels
+
+
+def test_async_batch_sends_one_request_per_full_batch(stub):
+    server, base_url = stub
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=4, batch_tiles=4,
+                                     async_batch=4, batch_wait=60.0)
+    for crop in crops(10):
+        assert analyzer.submit(crop) is not None
+    results = analyzer.drain()
+    analyzer.close()
+
+    assert [emotion for emotion, _ in results] == expected(10, 4)
+    assert server.requests == 3
+    assert analyzer.stats()["batch_requests"] == 3  # o último lote (2 recortes) também é mosaico
+    assert analyzer.submitted == 10 and analyzer.dropped == 0
+
+
+def test_incomplete_batch_waits_for_deadline(stub):
+    server, base_url = stub
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, batch_tiles=4, async_batch=4, batch_wait=0.2)
+    for crop in crops(2):
+        analyzer.submit(crop)
+    assert analyzer.poll() == []
+    assert server.requests == 0
+
+    time.sleep(0.25)
+    analyzer.poll()  # passou do prazo: envia o lote incompleto
+    results = analyzer.drain()
+    analyzer.close()
+    assert [emotion for emotion, _ in results] == expected(2, 4)
+    assert server.requests == 1
+
+
+def test_full_batch_without_slot_drops_new_crops(stub):
+    server, base_url = stub
+    server.latency = 0.3
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, max_in_flight=1, batch_tiles=2,
+                                     async_batch=2, batch_wait=60.0)
+    futures = [analyzer.submit(crop) for crop in crops(5)]
+    # 1º lote em andamento (único slot), 2º lote cheio esperando: o 5º recorte é descartado
+    assert [f is not None for f in futures] == [True, True, True, True, False]
+    assert analyzer.dropped == 1
+    results = analyzer.drain()
+    analyzer.close()
+    assert len(results) == 4 and all(emotion for emotion, _ in results)
+    assert server.requests == 2
+
+
+def test_pending_batch_survives_checkpoint(stub):
+    server, base_url = stub
+    analyzer = EmotionAnalyzerOpenAI(base_url=base_url, batch_tiles=4, async_batch=4, batch_wait=60.0)
+    for crop in crops(3):
+        analyzer.submit(crop)
+    state = analyzer.pending_state()
+    assert len(state) == 3 and all("request" in entry for entry in state)
+    assert server.requests == 0
+
+    resumed = EmotionAnalyzerOpenAI(base_url=base_url, batch_tiles=4, async_batch=4, batch_wait=60.0)
+    resumed.restore_pending(state)
+    results = resumed.drain()
+    resumed.close()
+    assert [emotion for emotion, _ in results] == expected(3, 4)
+    assert server.requests == 1
@@ -0,0 +1,26 @@
+import sys
+
+from analyzers.emotion_cache import EmotionCache
+
+
+def entry_size(key, emotion, conf):
+    return EmotionCache._NODE_OVERHEAD + sum(map(sys.getsizeof, (key, (emotion, conf), emotion, conf)))
+
+
+def test_bytes_track_entries():
+    cache = EmotionCache(max_entries=100, max_bytes=10 ** 9)
+    for key in range(50):
+        cache.put(key << 40, "happy" if key % 2 else "neutral", 0.5)
+    cache.put(3 << 40, "surprise", None)  # substitui uma entrada
+    assert cache.stats()["bytes"] == sum(entry_size(k, e, c) for k, e, c in cache.entries())
+
+
+def test_max_bytes_evicts_lru():
+    size = entry_size(1 << 40, "neutral", 0.5)
+    cache = EmotionCache(max_entries=1000, max_bytes=10 * size)
+    for key in range(1, 16):
+        cache.put(key << 40, "neutral", 0.5)
+    assert len(cache.entries()) == 10
+    assert cache.evictions == 5
+    assert [k >> 40 for k, _, _ in cache.entries()] == list(range(6, 16))
+    assert cache.stats()["bytes"] <= cache.max_bytes
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+from conftest import FACE_SIZE
+from detectors.face_tracker import FaceTracker
+
+W, H = 320, 240  # até work_width: o rastreamento roda na escala do frame
+
+
+class RecordingDetector:
+    """
+    Detector falso que registra cada chamada: ("full", None) ou ("roi", rois).
+    Cada região vermelha conexa é uma face (como FakeFaceDetector, mas com
+    várias faces por região).
+    """
+
+    detect_width = None
+
+    def __init__(self):
+        self.log = []
+
+    def detect(self, bgr_frame, features=None, rois=None):
+        self.log.append(("full", None) if rois is None else ("roi", list(rois)))
+        faces = []
+        for x1, y1, x2, y2 in rois if rois is not None else [(0, 0, W, H)]:
+            b, g, r = (bgr_frame[y1:y2, x1:x2, c].astype(np.int16) for c in range(3))
+            mask = ((r > 150) & (g < 100) & (b < 100)).astype(np.uint8)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            for x, y, w, h, area in stats[1:n]:
+                if area >= 16:
+                    faces.append({"x1": x1 + int(x), "y1": y1 + int(y), "x2": x1 + int(x + w),
+                                  "y2": y1 + int(y + h), "score": 0.9})
+        return faces
+
+
+def frame(*faces, seed=0):
+    """Fundo com ruído fixo e uma face vermelha com textura em cada (x1, y1)."""
+    rng = np.random.default_rng(seed)
+    img = rng.integers(40, 90, size=(H, W, 3), dtype=np.uint8)
+    texture = np.random.default_rng(1).integers(170, 255, size=(FACE_SIZE, FACE_SIZE), dtype=np.uint8)
+    for x, y in faces:
+        w, h = min(FACE_SIZE, W - x), min(FACE_SIZE, H - y)
+        img[y:y + h, x:x + w] = 30
+        img[y:y + h, x:x + w, 2] = texture[:h, :w]
+    return img
+
+
+def box(x, y):
+    return {"x1": x, "y1": y, "x2": min(W, x + FACE_SIZE), "y2": min(H, y + FACE_SIZE)}
+
+
+def run(tracker, frames):
+    """update() em cada (frame_idx, imagem); devolve {frame_idx: (faces, chamadas do detector)}."""
+    out = {}
+    for frame_idx, img in frames:
+        before = len(tracker.detector.log)
+        faces = tracker.update(img, frame_idx)
+        out[frame_idx] = (faces, [kind for kind, _ in tracker.detector.log[before:]])
+    return out
+
+
+def test_low_confidence_forces_detection():
+    frames = [(10, frame((100, 80))), (11, frame((103, 81))), (12, frame(seed=7)), (13, frame((150, 90))),
+              (20, frame((150, 90)))]
+
+    tracker = FaceTracker(RecordingDetector(), detect_every=10, min_track_confidence=0.6)
+    out = run(tracker, frames)
+    assert out[10][1] == ["full"] and out[10][0][0]["tracked"] is False
+    # frame intermediário com a face parecida: só rastreamento, sem detector
+    assert out[11][1] == [] and out[11][0][0]["tracked"] is True
+    assert {k: out[11][0][0][k] for k in ("x1", "y1", "x2", "y2")} == box(103, 81)
+    # a face sumiu: a confiança cai e a detecção roda fora da cadência
+    assert out[12] == ([], ["full"])
+    # sem faces rastreadas, nada a perder de confiança: a face nova espera o próximo frame-chave
+    assert out[13] == ([], [])
+    assert out[20][1] == ["full"] and out[20][0][0]["track_id"] == 2
+    assert tracker.stats()["detections_run"] == 3 and tracker.stats()["frames_tracked"] == 2
+
+    # com o limiar abaixo de qualquer correlação, o mesmo frame seria só rastreado
+    tracker = FaceTracker(RecordingDetector(), detect_every=10, min_track_confidence=-1.0)
+    assert run(tracker, frames[:3])[12][1] == []
+
+
+def test_boxes_are_clipped_to_the_frame():
+    corners = [(2, 3), (W - FACE_SIZE - 6, H - FACE_SIZE - 4)]
+    tracker = FaceTracker(RecordingDetector(), detect_every=1, roi_padding=0.5, full_sweep_every=30)
+    run(tracker, [(1, frame(*corners)), (2, frame(*corners))])
+
+    # caixa ampliada em 12 px (0.5 x 24) para cada lado, recortada nas bordas do frame
+    assert tracker.detector.log == [("full", None), ("roi", [(0, 0, 38, 39), (278, 200, W, H)])]
+
+    # rastreamento até a borda: a caixa devolvida não passa do último pixel
+    edge = FaceTracker(RecordingDetector(), detect_every=10, roi_padding=0.5)
+    out = run(edge, [(10, frame((W - FACE_SIZE, H - FACE_SIZE))), (11, frame((W - FACE_SIZE, H - FACE_SIZE)))])
+    tracked = out[11][0][0]
+    assert out[11][1] == [] and tracked["tracked"] is True
+    assert (tracked["x2"], tracked["y2"]) == (W - 1, H - 1)
+    assert all(f["x2"] <= W - 1 and f["y2"] <= H - 1 for f in edge.hold())
+
+
+def test_periodic_full_sweep_finds_new_faces():
+    tracker = FaceTracker(RecordingDetector(), detect_every=1, roi_padding=0.5, full_sweep_every=5)
+    frames = [(i, frame((60 + i, 60)) if i < 3 else frame((60 + i, 60), (220, 150))) for i in range(1, 13)]
+    out = run(tracker, frames)
+
+    # frame inteiro no início (sem faces) e a cada 5 frames; nos outros, só as ROIs
+    sweeps = [i for i in range(1, 13) if out[i][1] == ["full"]]
+    assert sweeps == [1, 6, 11] and all(out[i][1] == ["roi"] for i in range(1, 13) if i not in sweeps)
+    # a face que surge no frame 3 fora das ROIs só aparece na varredura seguinte
+    assert [len(out[i][0]) for i in range(1, 13)] == [1] * 5 + [2] * 7
+    assert tracker.stats()["full_sweeps"] == 3 and tracker.stats()["roi_detections"] == 9
+
+
+def test_empty_rois_fall_back_to_full_sweep():
+    tracker = FaceTracker(RecordingDetector(), detect_every=1, roi_padding=0.5, full_sweep_every=30)
+    # a face salta para longe da ROI: as regiões não acham nada e o frame inteiro é varrido
+    out = run(tracker, [(1, frame((20, 20))), (2, frame((250, 180)))])
+    assert out[2][1] == ["roi", "full"]
+    assert {k: out[2][0][0][k] for k in ("x1", "y1", "x2", "y2")} == box(250, 180)
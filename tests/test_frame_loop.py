@@ -0,0 +1,221 @@
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import frame_loop
+from frame_loop import FramePool, process_video_frames
+
+
+class Boom(Exception):
+    pass
+
+
+class FakeCap:
+    """cv2.VideoCapture falso: o frame i (1-based) traz i nos pixels; `fail_at` levanta Boom ao ler esse frame."""
+
+    def __init__(self, n=200, fail_at=None):
+        self.n, self.fail_at = n, fail_at
+        self.pos = 0
+        self.reads = 0
+
+    def _advance(self):
+        if self.pos >= self.n:
+            return False
+        self.pos += 1
+        if self.pos == self.fail_at:
+            raise Boom(self.pos)
+        return True
+
+    def read(self, buffer=None):
+        if not self._advance():
+            return False, None
+        self.reads += 1
+        frame = buffer if buffer is not None else np.empty((4, 4, 3), np.uint8)
+        frame[..., 0], frame[..., 1] = divmod(self.pos, 256)
+        return True, frame
+
+    def grab(self):
+        return self._advance()
+
+    def set(self, prop, value):
+        assert prop == cv2.CAP_PROP_POS_FRAMES
+        self.pos = int(value)
+        return True
+
+
+def index(frame):
+    return int(frame[0, 0, 0]) * 256 + int(frame[0, 0, 1])
+
+
+class FakeWriter:
+    def __init__(self, delay=0.0, fail_at=None):
+        self.delay, self.fail_at = delay, fail_at
+        self.written = []
+
+    def write(self, frame):
+        time.sleep(self.delay)
+        if len(self.written) + 1 == self.fail_at:
+            raise Boom(self.fail_at)
+        self.written.append(index(frame))
+
+
+class Analysis:
+    """on_frame falso: registra os índices, confere que os pixels são do frame certo e pode ser lento ou falhar."""
+
+    def __init__(self, cap, delay=0.0, fail_at=None):
+        self.cap, self.delay, self.fail_at = cap, delay, fail_at
+        self.seen = []
+        self.read_ahead = 0
+
+    def __call__(self, frame, frame_idx, time_sec):
+        assert index(frame) == frame_idx
+        self.read_ahead = max(self.read_ahead, self.cap.reads - len(self.seen))
+        time.sleep(self.delay)
+        if frame_idx == self.fail_at:
+            raise Boom(frame_idx)
+        self.seen.append(frame_idx)
+        return frame
+
+
+def run_pipeline(cap, on_frame, writer, **kwargs):
+    """Roda o pipeline em uma thread à parte: um join() travado vira falha do teste, não um teste parado."""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["processed"] = process_video_frames(cap, writer, 30.0, cap.n, on_frame, pipelined=True, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout=20)
+    assert not t.is_alive(), "pipeline travado"
+    # nenhum estágio fica para trás
+    assert not [s for s in threading.enumerate() if s.name in ("frame-reader", "frame-encoder")]
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["processed"]
+
+
+@pytest.mark.parametrize("use_pool", [False, True])
+def test_pipeline_preserves_frame_order(use_pool):
+    cap = FakeCap(300)
+    writer = FakeWriter(delay=0.0002)
+    analysis = Analysis(cap)
+    pool = FramePool() if use_pool else None
+
+    assert run_pipeline(cap, analysis, writer, queue_size=4, pool=pool) == 300
+    assert analysis.seen == list(range(1, 301))
+    assert writer.written == list(range(1, 301))
+    if use_pool:
+        # buffers limitados aos frames em trânsito (duas filas + um por estágio)
+        assert pool.stats()["buffers"] <= 2 * 4 + 4
+
+
+def test_pipeline_preserves_order_with_skipped_frames():
+    cap = FakeCap(300)
+    analysis = Analysis(cap)
+    skipped = []
+    walked = run_pipeline(cap, analysis, None, queue_size=3,
+                          needs_frame=lambda i: i % 7 == 0 or 100 <= i < 110,
+                          on_skip=lambda i, t: skipped.append(i), first_frame=20, last_frame=250)
+
+    assert walked == 231
+    assert analysis.seen == [i for i in range(20, 251) if i % 7 == 0 or 100 <= i < 110]
+    assert sorted(skipped + analysis.seen) == list(range(20, 251)) and skipped == sorted(skipped)
+
+
+@pytest.mark.parametrize("slow", ["analysis", "writer"])
+def test_pipeline_queues_stay_bounded(monkeypatch, slow):
+    peaks = []
+
+    class RecordingQueue(queue.Queue):
+        def __init__(self, maxsize=0):
+            super().__init__(maxsize)
+            self.peak = 0
+            peaks.append(self)
+
+        def put(self, item, block=True, timeout=None):
+            super().put(item, block, timeout)
+            self.peak = max(self.peak, self.qsize())
+
+    monkeypatch.setattr(frame_loop, "queue", SimpleNamespace(Queue=RecordingQueue, Full=queue.Full, Empty=queue.Empty))
+    cap = FakeCap(150)
+    analysis = Analysis(cap, delay=0.002 if slow == "analysis" else 0.0)
+    writer = FakeWriter(delay=0.002 if slow == "writer" else 0.0)
+
+    assert run_pipeline(cap, analysis, writer, queue_size=5) == 150
+    decode_q, encode_q = peaks
+    assert decode_q.maxsize == encode_q.maxsize == 5
+    assert decode_q.peak <= 5 and encode_q.peak <= 5
+    # o estágio lento segura o anterior: a fila antes dele enche, mas não passa do limite
+    assert (decode_q if slow == "analysis" else encode_q).peak == 5
+    # leitura adiantada: a fila de decode + o frame parado no put do leitor
+    # (+ a fila de encode e o frame em escrita, quando o writer é que segura)
+    assert analysis.read_ahead <= (5 + 1 if slow == "analysis" else 2 * 5 + 3)
+    assert writer.written == list(range(1, 151))
+
+
+@pytest.mark.parametrize("stage", ["reader", "on_frame", "encoder"])
+def test_pipeline_reraises_stage_errors(stage):
+    # o estágio seguinte é lento, então as filas estão cheias quando a falha acontece
+    cap = FakeCap(500, fail_at=120 if stage == "reader" else None)
+    analysis = Analysis(cap, delay=0.001 if stage == "reader" else 0.0, fail_at=120 if stage == "on_frame" else None)
+    writer = FakeWriter(delay=0.001, fail_at=120 if stage == "encoder" else None)
+
+    with pytest.raises(Boom) as excinfo:
+        run_pipeline(cap, analysis, writer, queue_size=4, pool=FramePool())
+    assert excinfo.value.args == (120,)
+    # a falha interrompe os outros estágios em vez de ler o vídeo até o fim
+    assert cap.pos < 500
+
+
+class CountingCap:
+    """cv2.VideoCapture que conta os saltos (set de CAP_PROP_POS_FRAMES)."""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(str(path))
+        self.seeks = 0
+
+    def read(self, buffer=None):
+        return self.cap.read(buffer) if buffer is not None else self.cap.read()
+
+    def grab(self):
+        return self.cap.grab()
+
+    def set(self, prop, value):
+        self.seeks += 1
+        return self.cap.set(prop, value)
+
+
+@pytest.mark.parametrize("first_frame,last_frame", [(1, 600), (100, 500)])
+def test_sparse_seek_visits_same_frames_as_grab(synthetic_video, first_frame, last_frame):
+    # frames usados em pares a cada 45 e alguns isolados: trechos sem uso de 1 a 43 frames
+    used = {i for i in range(1, 601) if i % 45 in (0, 1)} | {97, 300, 301, 333}
+
+    def walk(seek_gap):
+        cap = CountingCap(synthetic_video)
+        frames, skipped = [], []
+        walked = process_video_frames(cap, None, 30.0, 600, lambda f, i, t: frames.append((i, f.copy())),
+                                      needs_frame=used.__contains__, on_skip=lambda i, t: skipped.append(i),
+                                      first_frame=first_frame, last_frame=last_frame, seek_gap=seek_gap,
+                                      progress=False)
+        cap.cap.release()
+        return walked, frames, skipped, cap.seeks
+
+    walked, frames, skipped, seeks = walk(seek_gap=10)
+    ref_walked, ref_frames, ref_skipped, _ = walk(seek_gap=None)
+
+    assert seeks > 5  # os trechos longos foram de fato saltados
+    assert walked == ref_walked == last_frame - first_frame + 1
+    assert skipped == ref_skipped
+    assert [i for i, _ in frames] == [i for i, _ in ref_frames] == sorted(i for i in used if first_frame <= i <= last_frame)
+    # mesmos pixels: o salto cai no frame certo, não em um vizinho ou no keyframe anterior
+    for (i, frame), (_, ref) in zip(frames, ref_frames):
+        assert np.array_equal(frame, ref), f"frame {i}"
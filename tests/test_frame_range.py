@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from conftest import FakeFaceDetector, run_args
+from frame_processor import resolve_frame_range
+from main import analyze_video
+from timeline import Timeline
+
+
+def test_resolve_frame_range():
+    assert resolve_frame_range(None, None, 30.0, 600) == (1, 600)
+    assert resolve_frame_range(0.1, 0.2, 30.0, 600) == (3, 6)  # 0.1 * 30 = 3.0000000000000004
+    assert resolve_frame_range(9.5, 19, 30.0, 600) == (285, 570)
+    assert resolve_frame_range(5, 100, 30.0, 600) == (150, 600)
+    assert resolve_frame_range(5, None, 30.0, 0) == (150, None)
+    with pytest.raises(RuntimeError):
+        resolve_frame_range(10, 9, 30.0, 600)
+
+
+def rows(path):
+    # sem a emoção atual: o warm-up não chama a API, então ela só aparece no trecho a partir da
+    # primeira amostra dele (as contagens de emoção são comparadas abaixo)
+    return [{k: v for k, v in json.loads(line).items() if k not in ("emotion", "emotion_conf")}
+            for line in open(path, encoding="utf-8")]
+
+
+@pytest.mark.parametrize("start,end,extra", [
+    (9.5, 19, []),
+    (7, 12, []),
+    (2.5, None, []),
+    (9.5, 19, ["--face_detect_every", "7"]),  # o warm-up também precisa de um frame-chave de detecção
+])
+def test_window_matches_full_run(tmp_path, synthetic_video, openai_stub, start, end, extra):
+    _, base_url = openai_stub
+    options = ["--openai_base_url", base_url, "--no-video", *extra]
+
+    full_dir = tmp_path / "full"
+    analyze_video(run_args(synthetic_video, full_dir, *options, "--frame_results", full_dir / "frames.jsonl"),
+                  face_detector=FakeFaceDetector())
+
+    window = ["--start", start] + (["--end", end] if end is not None else [])
+    run_dir = tmp_path / "window"
+    report = analyze_video(run_args(synthetic_video, run_dir, *options, *window,
+                                    "--frame_results", run_dir / "frames.jsonl"),
+                           face_detector=FakeFaceDetector())
+    first, last = report["range"]["start_frame"], report["range"]["end_frame"]
+    assert report["total_frames_analyzed"] == last - first + 1
+
+    # o warm-up antes do início deixa o estado igual ao da execução completa naquele ponto
+    expected = [r for r in rows(full_dir / "frames.jsonl") if first <= r["frame"] <= last]
+    assert rows(run_dir / "frames.jsonl") == expected
+
+    # contagens do trecho = as da execução completa no mesmo trecho (pelo timeline dela)
+    full = Timeline.load(full_dir / "report.timeline.json").between(first / 30.0, last / 30.0).aggregate()
+    assert full["frames"] == report["total_frames_analyzed"]
+    assert full["frames_with_face"] == report["frames_with_face_detected"]
+    assert full["total_face_detections"] == report["total_face_detections"]
+    assert full["activities"] == report["activities"] and full["emotions"] == report["emotions"]
+    assert full["anomalies_count"] == report["anomalies_count"]
+    anomalies = json.loads((run_dir / "report.json").read_text())["anomalies"]
+    assert [a["frame"] for a in anomalies] == [a["frame"] for a in Timeline.load(
+        full_dir / "report.timeline.json").between(first / 30.0, last / 30.0).anomalies()]
@@ -0,0 +1,73 @@
+import copy
+from collections import deque
+
+import pytest
+
+from sampling import AdaptiveSampler
+
+
+class ReferenceBudget:
+    """Orçamento da versão original: due() limpava a janela e contava a negação no próprio frame."""
+
+    def __init__(self, budget, fps):
+        self.budget, self.window = budget, int(60 * fps)
+        self.recent = deque()
+        self.denied = 0
+
+    def allows(self, frame_idx):
+        while self.recent and self.recent[0] <= frame_idx - self.window:
+            self.recent.popleft()
+        if len(self.recent) >= self.budget:
+            self.denied += 1
+            return False
+        return True
+
+
+def run(sampler, frames, lookahead=0, changes=()):
+    """Loop da análise: consulta due() uma vez por frame (e `lookahead` frames adiante, como o leitor)."""
+    sampled = []
+    for f in frames:
+        for ahead in range(1, lookahead + 1):
+            sampler.due(f + ahead)
+        sampler.observe(f)
+        if sampler.due(f):
+            sampler.sampled(f, changed=f in changes)
+            sampled.append(f)
+    return sampled
+
+
+@pytest.mark.parametrize("budget,changes", [(3, ()), (5, set(range(0, 4000, 7))), (1, {100, 900})])
+def test_budget_matches_reference(budget, changes):
+    fps = 10.0
+    sampler = AdaptiveSampler(5, 2, 40, fps, budget_per_minute=budget)
+    ref = ReferenceBudget(budget, fps)
+    ref_sampler = AdaptiveSampler(5, 2, 40, fps)  # mesma cadência, orçamento na referência
+
+    expected = []
+    for f in range(4000):
+        ref_sampler.observe(f)
+        if ref_sampler.due(f) and ref.allows(f):
+            ref_sampler.sampled(f, changed=f in changes)
+            ref.recent.append(f)
+            expected.append(f)
+
+    assert run(sampler, range(4000), changes=changes) == expected
+    assert sampler.stats()["budget_denied"] == ref.denied
+    assert sampler.stats()["samples"] == len(expected)
+
+
+def test_due_is_pure():
+    sampler = AdaptiveSampler(5, 2, 40, 10.0, budget_per_minute=2)
+    run(sampler, range(50))
+    before = copy.deepcopy(sampler.__dict__)
+    for f in range(50, 2000):
+        sampler.due(f)
+    assert sampler.__dict__ == before
+
+
+def test_lookahead_does_not_change_decisions():
+    plain = AdaptiveSampler(5, 2, 40, 10.0, budget_per_minute=4)
+    ahead = AdaptiveSampler(5, 2, 40, 10.0, budget_per_minute=4)
+    changes = set(range(0, 3000, 11))
+    assert run(plain, range(3000), changes=changes) == run(ahead, range(3000), lookahead=700, changes=changes)
+    assert plain.stats() == ahead.stats()
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from conftest import run_args
+from main import analyze_video
+
+COMPARED = ("total_frames_analyzed", "frames_with_face_detected", "total_face_detections", "emotions",
+            "activities", "anomalies_count")
+
+
+def counts(out_dir):
+    report = json.loads((out_dir / "report.json").read_text())
+    anomalies = [(a["frame"], a["type"]) for a in report["anomalies"]]
+    return {k: report[k] for k in COMPARED}, anomalies
+
+
+@pytest.mark.parametrize("flag", ["--adaptive_sampling", "--dedup"])
+def test_history_dependent_options_are_rejected(tmp_path, synthetic_video, flag):
+    with pytest.raises(RuntimeError, match="--workers"):
+        analyze_video(run_args(synthetic_video, tmp_path, "--no-video", "--workers", "3", flag))
+
+
+@pytest.mark.parametrize("extra", [[], ["--face_detect_every", "7"], ["--start", "9.5", "--end", "19"]])
+def test_workers_match_serial_run(tmp_path, synthetic_video, openai_stub, extra):
+    pytest.importorskip("mediapipe")  # cada segmento monta o próprio FaceDetector
+    _, base_url = openai_stub
+    options = ["--no-video", "--openai_base_url", base_url, *extra]
+
+    analyze_video(run_args(synthetic_video, tmp_path / "serial", *options))
+    report = analyze_video(run_args(synthetic_video, tmp_path / "sharded", *options, "--workers", "3"))
+
+    assert len(report["segments"]) == 3
+    serial, sharded = counts(tmp_path / "serial"), counts(tmp_path / "sharded")
+    assert sharded == serial
+    assert serial[1]  # as anomalias caem em segmentos diferentes
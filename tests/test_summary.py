@@ -0,0 +1,9 @@
+from summary import build_summary
+
+
+def test_top_k_ties_do_not_depend_on_insertion_order():
+    a = build_summary(300, 30.0, {"sad": 2, "happy": 5, "neutral": 2, "fear": 2}, {"parado": 4, "andando": 4}, [])
+    b = build_summary(300, 30.0, {"fear": 2, "neutral": 2, "happy": 5, "sad": 2}, {"andando": 4, "parado": 4}, [])
+    assert a == b
+    assert a["top_emotions"] == [("happy", 5), ("fear", 2), ("neutral", 2)]
+    assert a["top_activities"] == [("andando", 4), ("parado", 4)]
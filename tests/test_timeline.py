@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from conftest import FakeFaceDetector, run_args
+from main import analyze_video
+from timeline import Timeline, summary_from_timeline
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+def test_summary_from_timeline_matches_report(tmp_path, synthetic_video, openai_stub):
+    _, base_url = openai_stub
+    report = analyze_video(run_args(synthetic_video, tmp_path, "--openai_base_url", base_url, "--no-video"),
+                           face_detector=FakeFaceDetector())
+    written = json.loads((tmp_path / "report.json").read_text())
+    timeline = Timeline.load(report["timeline"]["path"])
+
+    assert summary_from_timeline(timeline) == report["summary"]
+    # o z gravado é o mesmo do relatório, não uma versão arredondada
+    assert [(a["frame"], a["type"], a["time_sec"], a["z"]) for a in timeline.anomalies()] == \
+        [(a["frame"], a["type"], a["time_sec"], a["z"]) for a in written["anomalies"]]
+    aggregate = timeline.aggregate()
+    assert aggregate["emotions"] == report["emotions"] and aggregate["activities"] == report["activities"]
+    assert aggregate["frames_with_face"] == report["frames_with_face_detected"]
+    assert report["anomalies_count"] == 3
+
+
+def test_query_tool_does_not_import_analyzers():
+    code = ("import sys; import timeline; "
+            "print(sorted(m for m in ('openai', 'cv2', 'analyzers') if m in sys.modules))")
+    # sem PYTHONPATH: só o que o próprio timeline.py importa
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
@@ -0,0 +1,26 @@
+import json
+
+from timing import BUCKETS_SEC, StageTimer, merge_timings, summarize_timings
+
+
+def test_overflow_quantile_is_max_and_valid_json():
+    timer = StageTimer()
+    timer.record("emotion", 0.002)
+    for _ in range(3):
+        timer.record("emotion", 42.0)  # acima do último bucket (10 s)
+    timings = timer.report()
+    s = timings["emotion"]
+    assert s["overflow"] is True
+    assert s["p99_ms_le"] == 42000.0 and s["p50_ms_le"] == 42000.0
+    # sem Infinity/NaN: o relatório é JSON estrito
+    json.dumps(timings, allow_nan=False)
+    assert merge_timings([timings, timings])["emotion"]["p99_ms_le"] == 42000.0
+
+
+def test_quantiles_inside_buckets():
+    buckets = [0] * (len(BUCKETS_SEC) + 1)
+    buckets[3] = 99  # <= 1 ms
+    buckets[9] = 1   # <= 100 ms
+    s = summarize_timings({"read": {"count": 100, "total_sec": 0.2, "max_sec": 0.09, "buckets": buckets}})["read"]
+    assert s["p50_ms_le"] == 1.0 and s["p99_ms_le"] == 1.0
+    assert s["overflow"] is False
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from frame_loop import FramePool
+from writers import ThreadedWriter, write_frame
+
+
+class SlowWriter:
+    def __init__(self):
+        self.seen = []
+
+    def write(self, frame):
+        time.sleep(0.001)
+        self.seen.append(int(frame[0, 0, 0]))
+
+    def release(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def test_threaded_writer_takes_pool_buffers_without_copy():
+    inner, pool = SlowWriter(), FramePool()
+    writer = ThreadedWriter(inner, queue_size=4)
+    for i in range(60):
+        buf = pool.acquire()
+        if buf is None:
+            buf = np.empty((4, 4, 3), np.uint8)
+        buf[:] = i
+        # o buffer só volta ao pool (e é sobrescrito) depois de codificado
+        write_frame(writer, buf, lambda b=buf: pool.release(b))
+    writer.release()
+
+    assert inner.seen == list(range(60))
+    assert writer.stats()["copies"] == 0
+    assert pool.stats()["buffers"] <= 4 + 2  # fila + frame na thread do writer + frame do loop
+
+
+def test_write_copies_for_callers_that_reuse_the_frame():
+    inner = SlowWriter()
+    writer = ThreadedWriter(inner, queue_size=4)
+    frame = np.empty((4, 4, 3), np.uint8)
+    for i in range(20):
+        frame[:] = i
+        writer.write(frame)
+    writer.release()
+    assert inner.seen == list(range(20))
+    assert writer.stats()["copies"] == 20
+
+
+def test_write_frame_without_thread_releases_after_write():
+    inner, released = SlowWriter(), []
+    frame = np.zeros((4, 4, 3), np.uint8)
+    write_frame(inner, frame, lambda: released.append(len(inner.seen)))
+    assert released == [1]